@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import pandas
+import plotly.graph_objects
+
+from src.loader import load_experiment
+from src.lib import tcp_periodic_timeline
+from src.lib import with_descriptions
+
+#################################################################
+# Per-flow feature plot: one Scatter trace per periodic bin (the
+# former implementation, reproduced below) against the single
+# Scattergl trace built by tcp_periodic_timeline. The longest flow
+# of the experiment is replicated in time to emulate longer flows.
+#
+# Usage: python -m bench.periodic_feature [experiment folder]
+#################################################################
+
+FEATURE = "s_app_byts"
+SCALES  = [1, 10, 100]
+
+def legacy_feature_figure(select: pandas.DataFrame, feature: str):
+
+    select = with_descriptions(select, periodic=True)
+    figure = plotly.graph_objects.Figure()
+    for i, record in select.iterrows():
+        trace = plotly.graph_objects.Scatter(x=[record["ts"], record["te"]], y=[record[feature], record[feature]],
+                                             line=dict(color="rgba(0, 128, 0, 0.6)", width=2),
+                                             name=record["info"], hoverinfo="text",
+                                             text=record["info"])
+        figure.add_trace(trace)
+    return figure
+
+def replicate_flow(select: pandas.DataFrame, scale: int) -> pandas.DataFrame:
+
+    # Append copies of the flow one after the other
+    span = select["te"].max() - select["ts"].min()
+    copies = []
+    for k in range(scale):
+        copy = select.copy()
+        copy["ts"] = copy["ts"] + k * span
+        copy["te"] = copy["te"] + k * span
+        copies.append(copy)
+    return pandas.concat(copies, ignore_index=True)
+
+def measure(build):
+    start = time.perf_counter()
+    figure = build()
+    elapsed = time.perf_counter() - start
+    return len(figure.data), elapsed, len(figure.to_json())
+
+def main():
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop",
+                                                             "1mbits", "experiment-0")
+    _, tcp_periodic, bot_complete = load_experiment(path)
+
+    # The flow with the largest number of bins
+    id = tcp_periodic["id"].value_counts().index[0]
+    flow = tcp_periodic.loc[tcp_periodic["id"] == id]
+
+    print(f"{'bins':>8} {'path':>8} {'traces':>8} {'build [s]':>10} {'json [KB]':>10}")
+    for scale in SCALES:
+        select = replicate_flow(flow, scale)
+        token = select["token"].iloc[0]
+
+        for name, build in [("legacy", lambda: legacy_feature_figure(select, FEATURE)),
+                            ("webgl",  lambda: tcp_periodic_timeline(select, bot_complete, token=token, id=id, feature=FEATURE))]:
+            traces, elapsed, size = measure(build)
+            print(f"{len(select):>8} {name:>8} {traces:>8} {elapsed:>10.3f} {size / 1024:>10.1f}")
+
+if __name__ == "__main__":
+    main()
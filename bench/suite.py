@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import pandas
+import plotly
+import plotly.io
+import plotly.graph_objects
+
+from bench.synthetic import generate_experiment
+from bench.synthetic import SOURCE
+from src.loader import read_experiment
+from src.lib import prepare_tcp_complete
+from src.lib import prepare_tcp_periodic
+from src.lib import tcp_complete_timeline
+from src.lib import tcp_periodic_timeline
+from src.index import FlowIndex
+from src.index import sort_flows
+
+#################################################################
+# Hot paths of the portal on synthetic experiments of increasing
+# size (see bench/synthetic.py). Every case reports wall time,
+# peak memory traced by tracemalloc (numpy and pandas buffers,
+# not the pyarrow memory pool) and, for figures, the size of the
+# serialized JSON. One JSON object per case is written, so that
+# results of different commits can be compared.
+#
+# Usage: python -m bench.suite [--scales 1 10 100 1000] [--output results.jsonl]
+#################################################################
+
+SCALES = [1, 10, 100, 1000]
+
+def measure(case: str, scale: int, run) -> dict:
+
+    # Tracing slows allocations down: the peak is taken on a first run,
+    # which also warms up imports and caches, and the time on a second one
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+
+    record = dict(case=case, scale=scale, seconds=round(elapsed, 6), peak_bytes=peak)
+    if isinstance(result, plotly.graph_objects.Figure):
+        record["json_bytes"] = len(plotly.io.to_json(result, validate=False))
+        record["traces"] = len(result.data)
+    elif isinstance(result, pandas.DataFrame):
+        record["rows"] = len(result)
+    return record
+
+def run_scale(path: str, scale: int):
+
+    # Loading of the three .csv files (as in data_over_tcp)
+    frames = {}
+    def load():
+        frames["complete"], frames["periodic"], frames["bot"] = read_experiment(path)
+        return frames["complete"]
+    yield measure("read_experiment", scale, load)
+
+    tcp_complete, tcp_periodic, bot_complete = frames["complete"], frames["periodic"], frames["bot"]
+
+    def prepare_complete():
+        prepare_tcp_complete(complete=tcp_complete)
+        return tcp_complete
+    def prepare_periodic():
+        prepare_tcp_periodic(periodic=tcp_periodic)
+        return tcp_periodic
+
+    yield measure("prepare_tcp_complete", scale, prepare_complete)
+    yield measure("prepare_tcp_periodic", scale, prepare_periodic)
+
+    for feature in (None, "s_app_byts", "c_app_byts"):
+        yield measure(f"tcp_complete_timeline[{feature}]", scale,
+                      lambda: tcp_complete_timeline(tcp_complete=tcp_complete, bot_complete=bot_complete, feature=feature))
+
+    tcp_periodic = sort_flows(tcp_periodic)
+    index = FlowIndex(tcp_complete, tcp_periodic)
+
+    # The token with the most bins, and its longest flow
+    token = tcp_periodic["token"].value_counts().index[0]
+    id = index.token_bins(token)["id"].value_counts().index[0]
+
+    yield measure("tcp_periodic_timeline[token]", scale,
+                  lambda: tcp_periodic_timeline(tcp_periodic=tcp_periodic, bot_complete=bot_complete,
+                                                token=token, id=None, feature=None, index=index))
+    yield measure("tcp_periodic_timeline[id]", scale,
+                  lambda: tcp_periodic_timeline(tcp_periodic=tcp_periodic, bot_complete=bot_complete,
+                                                token=token, id=id, feature="s_app_byts", index=index))
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the portal on synthetic experiments")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--data",   default=os.path.join(tempfile.gettempdir(), "portal-bench"))
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    environment = dict(python=platform.python_version(), pandas=pandas.__version__, plotly=plotly.__version__)
+    output = open(args.output, "a") if args.output is not None else sys.stdout
+
+    for scale in args.scales:
+        path = generate_experiment(os.path.join(args.data, f"scale-{scale}"), scale, source=args.source)
+        for record in run_scale(path, scale):
+            output.write(json.dumps({**record, **environment}) + "\n")
+            output.flush()
+
+    if output is not sys.stdout:
+        output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import argparse
+import numpy
+import pandas
+
+from src.loader import TCP_COMPLETE
+from src.loader import TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+from src.loader import read_frame
+
+#################################################################
+# Synthetic experiments with the schema of the derived .csv files.
+# A bundled experiment is replicated <scale> times: every copy is
+# a different client (10.x.y.z) whose flows are shifted by a small
+# random offset, so that the number of flows and bins grows with
+# the scale while the duration of the experiment does not.
+#
+# Usage: python -m bench.synthetic --scale 10 --output /tmp/exp-10
+#################################################################
+
+SOURCE = os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop", "1mbits", "experiment-0")
+
+# Largest shift of a copy (milliseconds)
+JITTER = 2000.0
+
+def client_ips(copies: numpy.ndarray) -> numpy.ndarray:
+    return numpy.array([f"10.{(k >> 16) & 255}.{(k >> 8) & 255}.{k & 255}" for k in copies.tolist()], dtype=object)
+
+def replicate(frame: pandas.DataFrame, scale: int, shifts: numpy.ndarray) -> pandas.DataFrame:
+
+    # Copy k of row i is row k * len(frame) + i
+    copies = numpy.repeat(numpy.arange(scale), len(frame))
+    result = pandas.DataFrame({c: numpy.tile(frame[c].to_numpy(), scale) for c in frame.columns})
+
+    if scale > 1:
+        result["c_ip"] = client_ips(numpy.arange(scale))[copies]
+        result["id"] = result["c_ip"] + "#" + result["c_pt"].astype(str) + "#" + result["s_ip"] + "#" + result["s_pt"].astype(str)
+        result["ts"] = result["ts"] + shifts[copies]
+        result["te"] = result["te"] + shifts[copies]
+    return result
+
+def generate_experiment(output: str, scale: int, source: str = SOURCE, seed: int = 0) -> str:
+
+    # Generated experiments are reused across runs
+    if all(os.path.exists(os.path.join(output, name)) for name in (TCP_COMPLETE, TCP_PERIODIC, BOT_COMPLETE)):
+        return output
+
+    os.makedirs(output, exist_ok=True)
+
+    # The same client has the same shift in both tables
+    shifts = numpy.random.default_rng(seed).uniform(0, JITTER, scale)
+    shifts[0] = 0.0
+
+    for name in (TCP_COMPLETE, TCP_PERIODIC):
+        frame = replicate(read_frame(os.path.join(source, name)), scale, shifts)
+        frame.to_csv(os.path.join(output, name), sep=" ", index=False, chunksize=1 << 16)
+
+    # The bot actions are the ones of the source experiment
+    read_frame(os.path.join(source, BOT_COMPLETE)).to_csv(os.path.join(output, BOT_COMPLETE), sep=" ", index=False)
+    return output
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic experiment")
+    parser.add_argument("--scale",  type=int, default=10)
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed",   type=int, default=0)
+    args = parser.parse_args()
+
+    print(generate_experiment(args.output, args.scale, source=args.source, seed=args.seed))
+
+if __name__ == "__main__":
+    main()
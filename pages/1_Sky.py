@@ -1,10 +1,35 @@
 import os
+import math
 import pandas
 import streamlit
-from src.lib import prepare_tcp_complete
-from src.lib import prepare_tcp_periodic
-from src.lib import tcp_complete_timeline
-from src.lib import tcp_periodic_timeline
+from src.loader import load_experiment
+from src.loader import load_index
+from src.loader import load_resolutions
+from src.loader import load_udp_index
+from src.loader import INDEX_COLUMNS
+from src.catalog import list_experiments
+from src.catalog import DATA_FOLDER
+from src.figures import complete_timeline
+from src.figures import periodic_timeline
+from src.figures import phases_chart
+from src.figures import throughput_chart
+from src.figures import connections_chart
+from src.figures import delivery_chart
+from src.figures import dns_latency_chart
+from src.figures import PHASE_COLUMNS
+from src.phases import phase_volumes
+from src.throughput import STEPS
+from src.delivery import DELIVERY_VALUES
+from src.dns import token_latency
+from src.chunks import flow_chunks
+from src.profiler import start_run
+from src.profiler import end_run
+from src.profiler import profiled_fragment
+from src.profiler import stage
+from src.profiler import plotly_chart
+
+# Partial reruns (named experimental_fragment up to streamlit 1.36)
+fragment = getattr(streamlit, "fragment", None) or streamlit.experimental_fragment
 
 def generate_header(page: str):
     page = "token_section.html"
@@ -16,112 +41,238 @@ def generate_header(page: str):
 
 def data_over_tcp(path: str):
 
-    tcp_complete_frame = pandas.read_csv(os.path.join(path, "log_tcp_complete.csv"), delimiter= " ") 
-    tcp_periodic_frame = pandas.read_csv(os.path.join(path, "log_tcp_periodic.csv"), delimiter= " ") 
-    bot_complete_frame = pandas.read_csv(os.path.join(path, "streambot_trace.csv"),  delimiter= " ") 
-
     ###############################
-    # Prepare each pandas Dataframe
+    # Load (or reuse) the experiment
     ###############################
 
-    prepare_tcp_complete(complete=tcp_complete_frame)
-    prepare_tcp_periodic(periodic=tcp_periodic_frame)
+    with stage("load_experiment"):
+        tcp_complete_frame, tcp_periodic_frame, bot_complete_frame = load_experiment(path=path, columns=PHASE_COLUMNS)
+    with stage("load_index"):
+        load_index(path=path, columns=INDEX_COLUMNS)
 
     generate_header(page="token_section.html")
 
+    ################################
+    # Time window (in seconds)
+    ################################
+    end = int(math.ceil(max(tcp_complete_frame["te"].max(), bot_complete_frame["from"].max()) / 1000))
+    help = """
+        Narrow the time window to inspect single
+        flows and bins when the experiment is large
+        (wider windows are shown as aggregated heatmaps)
+    """
+    lo, hi = streamlit.slider("Finestra temporale (secondi)", min_value=0, max_value=end, value=(0, end), help=help)
+    window = None if (lo, hi) == (0, end) else (lo * 1000, hi * 1000)
+
     ################################
     # General view of all TCP flows
     ################################
-    streamlit.plotly_chart(figure_or_data=tcp_complete_timeline(tcp_complete=tcp_complete_frame,  
-                                                                bot_complete=bot_complete_frame, feature=None))
+    plotly_chart(figure_or_data=complete_timeline(path=path, feature=None, window=window))
     
     ################################
     # Volumes view of all TCP flows
     ################################
     col1, col2 = streamlit.columns(2)
     with col1:
-        streamlit.plotly_chart(figure_or_data=tcp_complete_timeline(tcp_complete=tcp_complete_frame, 
-                                                                    bot_complete=bot_complete_frame, feature="s_app_byts"))
+        plotly_chart(figure_or_data=complete_timeline(path=path, feature="s_app_byts", window=window))
+    with col2:
+        plotly_chart(figure_or_data=complete_timeline(path=path, feature="c_app_byts", window=window))
+
+    # Connections open at the same time
+    plotly_chart(figure_or_data=connections_chart(path=path, window=window))
+    streamlit.markdown("---")
+
+    ################################
+    # Traffic of each bot phase
+    ################################
+    col1, col2 = streamlit.columns(2)
+    with col1:
+        plotly_chart(figure_or_data=phases_chart(path=path, value="s_bitrate"))
+    with col2:
+        plotly_chart(figure_or_data=phases_chart(path=path, value="c_bitrate"))
+    with streamlit.expander("Volumi per fase e token"):
+        streamlit.dataframe(phase_volumes(tcp_periodic_frame, bot_complete_frame), hide_index=True)
+    streamlit.markdown("---")
+
+    ################################
+    # Throughput on a fixed grid
+    ################################
+    help = """
+        Width of the time grid the bytes of the
+        periodic bins are redistributed onto
+    """
+    step = STEPS[streamlit.selectbox("Passo della serie temporale", options=list(STEPS), index=1, help=help)]
+    col1, col2 = streamlit.columns(2)
+    with col1:
+        plotly_chart(figure_or_data=throughput_chart(path=path, step=step, window=window))
     with col2:
-        streamlit.plotly_chart(figure_or_data=tcp_complete_timeline(tcp_complete=tcp_complete_frame, 
-                                                                    bot_complete=bot_complete_frame, feature="c_app_byts"))
+        plotly_chart(figure_or_data=throughput_chart(path=path, step=step, by="token", window=window))
     streamlit.markdown("---")
 
-    options = list(set(tcp_complete_frame["token"]))
+    ################################
+    # Retransmissions and out-of-order
+    ################################
+    col1, col2 = streamlit.columns(2)
+    with col1:
+        value = streamlit.selectbox("Colore della mappa", options=list(DELIVERY_VALUES))
+    with col2:
+        by = streamlit.selectbox("Righe della mappa", options=["token", "id"])
+    plotly_chart(figure_or_data=delivery_chart(path=path, value=value, by=by, window=window))
+    streamlit.markdown("---")
+
+    ################################
+    # DNS resolution before connect
+    ################################
+    plotly_chart(figure_or_data=dns_latency_chart(path=path))
+    with streamlit.expander("Latenza DNS per token e per flusso"):
+        resolutions = load_resolutions(path=path)
+        streamlit.dataframe(token_latency(resolutions), hide_index=True)
+        streamlit.dataframe(resolutions, hide_index=True)
+    streamlit.markdown("---")
+
+    drill_down(path=path, window=window, step=step)
+    return window
+
+
+# Only this section reruns when the token or the flow changes (the overview above does not)
+@fragment
+@profiled_fragment
+def drill_down(path: str, window: tuple[int, int] | None, step: float):
+
+    index = load_index(path=path, columns=INDEX_COLUMNS)
+
+    options = index.tokens
     tk = streamlit.selectbox("Seleziona qui il token da filtrare", options)
 
-    ids = list(set(tcp_complete_frame.loc[tcp_complete_frame["token"] == tk]["id"]))
-    mapping = {id: id.replace("#", " ") for id in ids}
-    options = list(mapping.values())
+    options = index.flow_labels(tk)
     id = streamlit.selectbox("Seleziona qui il flusso da analizzare", options)
-    id = {v: k for k, v in mapping.items()}[id]
+    id = index.ids[id]
 
     ################################
     # Periodic view of a given id
     ################################
-    streamlit.plotly_chart(figure_or_data=tcp_periodic_timeline(tcp_periodic=tcp_periodic_frame, 
-                                                                bot_complete=bot_complete_frame, token=tk, id=None, feature=None))
+    plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=None, feature=None, window=window))
+    plotly_chart(figure_or_data=connections_chart(path=path, token=tk, window=window))
+
+    col1, col2 = streamlit.columns(2)
+    with col1:
+        plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=id, feature="s_app_byts", window=window))
+    with col2:
+        plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=id, feature="c_app_byts", window=window))
+    with streamlit.expander("Chunk di download del flusso"):
+        streamlit.dataframe(flow_chunks(path=path, id=id), hide_index=True)
 
+    # Downlink and uplink throughput of the token and of the flow
     col1, col2 = streamlit.columns(2)
     with col1:
-        streamlit.plotly_chart(figure_or_data=tcp_periodic_timeline(tcp_periodic=tcp_periodic_frame, 
-                                                                    bot_complete=bot_complete_frame, token=tk, id=id, feature="s_app_byts"))
+        plotly_chart(figure_or_data=throughput_chart(path=path, step=step, token=tk, window=window))
     with col2:
-        streamlit.plotly_chart(figure_or_data=tcp_periodic_timeline(tcp_periodic=tcp_periodic_frame, 
-                                                                    bot_complete=bot_complete_frame, token=tk, id=id, feature="c_app_byts"))
+        plotly_chart(figure_or_data=throughput_chart(path=path, step=step, id=id, window=window))
     streamlit.markdown("---")
 
 
-def main():
+def data_over_udp(path: str, window: tuple[int, int] | None):
 
-    streamlit.set_page_config(layout="wide")
+    streamlit.markdown("### Traffico UDP/QUIC")
 
-    ########################
-    # Header
-    ########################
-    streamlit.markdown("## Analisi traffico applicativo Sky")
+    ################################
+    # General view of all UDP flows
+    ################################
+    plotly_chart(figure_or_data=complete_timeline(path=path, feature=None, window=window, transport="udp"))
 
-    device = "data/sky/desktop"
-    folder = os.path.join(os.path.dirname(__file__), "..", device)
+    col1, col2 = streamlit.columns(2)
+    with col1:
+        plotly_chart(figure_or_data=complete_timeline(path=path, feature="s_app_byts", window=window, transport="udp"))
+    with col2:
+        plotly_chart(figure_or_data=complete_timeline(path=path, feature="c_app_byts", window=window, transport="udp"))
+    streamlit.markdown("---")
 
-    options = dict()
+    udp_drill_down(path=path, window=window)
 
-    for qos in os.listdir(folder):
-        options[qos] = [exp for exp in os.listdir(os.path.join(folder, qos))]
 
-    col1, col2 = streamlit.columns(2)
+@fragment
+@profiled_fragment
+def udp_drill_down(path: str, window: tuple[int, int] | None):
+
+    index = load_udp_index(path=path, columns=INDEX_COLUMNS)
+    if not index.tokens:
+        streamlit.caption("_No UDP flows_")
+        return
 
-    ############################################################
-    # Select among available QoS testbed conditions
-    ############################################################
+    tk = streamlit.selectbox("Seleziona qui il token UDP/QUIC da filtrare", index.tokens)
+    plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=None, feature=None, window=window, transport="udp"))
 
+    id = streamlit.selectbox("Seleziona qui il flusso UDP/QUIC da analizzare", index.flow_labels(tk))
+    id = index.ids[id]
+
+    col1, col2 = streamlit.columns(2)
     with col1:
-        help = """
-            Select here the QoS condition you like
-            the most, in order to inspect differences 
-            on volume, bitrate in each flow
-        """
-        qos = streamlit.selectbox(label="QoS setup selection",
-                           options=list(options.keys()), help=help)
+        plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=id, feature="s_app_byts", window=window, transport="udp"))
+    with col2:
+        plotly_chart(figure_or_data=periodic_timeline(path=path, token=tk, id=id, feature="c_app_byts", window=window, transport="udp"))
+    streamlit.markdown("---")
+
+
+def main():
+
+    streamlit.set_page_config(layout="wide")
+    start_run(page="sky")
+    try:
+        ########################
+        # Header
+        ########################
+        streamlit.markdown("## Analisi traffico applicativo Sky")
+
+        # Experiments come from the catalog manifest (no folder walk)
+        experiments = list_experiments(service="sky", device="desktop")
+
+        options = dict()
+
+        for qos, group in experiments.groupby("qos", sort=True):
+            options[qos] = group["experiment"].tolist()
+
+        col1, col2 = streamlit.columns(2)
+
+        ############################################################
+        # Select among available QoS testbed conditions
+        ############################################################
+
+        with col1:
+            help = """
+                Select here the QoS condition you like
+                the most, in order to inspect differences 
+                on volume, bitrate in each flow
+            """
+            qos = streamlit.selectbox(label="QoS setup selection",
+                               options=list(options.keys()), help=help)
         
-    ############################################################
-    # Select among available experiments for that QoS condition
-    ############################################################
+        ############################################################
+        # Select among available experiments for that QoS condition
+        ############################################################
 
-    with col2:
-        help = """
-            Select here the experiment you like the
-            most, according to the previous selection
-            of QoS condition
-        """
-        num = streamlit.selectbox(label="Experiment selection",
-                           options=list(options[qos]),  help=help)
+        with col2:
+            help = """
+                Select here the experiment you like the
+                most, according to the previous selection
+                of QoS condition
+            """
+            num = streamlit.selectbox(label="Experiment selection",
+                               options=list(options[qos]),  help=help)
     
-    streamlit.markdown(f"#### Current selection")
-    streamlit.caption(f"_Dataset_: :blue[{qos}] and experiment :green[{num}]")
-    streamlit.markdown("---")
+        streamlit.markdown(f"#### Current selection")
+        streamlit.caption(f"_Dataset_: :blue[{qos}] and experiment :green[{num}]")
+
+        entry = experiments.loc[(experiments["qos"] == qos) & (experiments["experiment"] == num)].iloc[0]
+        span = f"{entry['span'] / 1000:.0f} s" if pandas.notna(entry["span"]) else "n/a"
+        streamlit.caption(f"_Flows_: {entry['flows']}, _bins_: {entry['bins']}, _duration_: {span}, "
+                          f"_actions_: {', '.join(a for a in entry['actions'] if a not in ('origin', 'sniffer-on', 'sniffer-off'))}")
+        streamlit.markdown("---")
 
-    data_over_tcp(path=os.path.join(folder, qos, num))
+        path = os.path.join(DATA_FOLDER, entry["path"])
+        window = data_over_tcp(path=path)
+        data_over_udp(path=path, window=window)
+    finally:
+        end_run()
     
 
 main()
@@ -0,0 +1,116 @@
+import streamlit
+import plotly.express
+from src.summary import summarize_archive
+from src.sketches import sketch_archive
+from src.sketches import sketch_cdf
+from src.sketches import sketch_quantiles
+from src.sketches import METRICS
+from src.profiler import start_run
+from src.profiler import end_run
+from src.profiler import stage
+from src.profiler import plotly_chart
+
+# Axis titles of the distributions
+METRIC_TITLES = {"duration": "Flow duration [ms]", "bytes": "Downlink bytes per flow", "throughput": "Bin throughput [bit/s]"}
+
+# Phases of the bot that are not about the content being played
+SETUP_PHASES = ("origin", "sniffer-on", "net-starts", "app-starts", "skygo-on")
+
+def qos_box(frame, y: str, title: str):
+    figure = plotly.express.box(data_frame=frame, x="qos", y=y, color="service", points="all",
+                                hover_data=["experiment"], category_orders={"qos": sorted(frame["qos"].unique())})
+    figure.update_layout(title=title, height=450)
+    return figure
+
+def main():
+
+    streamlit.set_page_config(layout="wide")
+    start_run(page="summary")
+    try:
+        ########################
+        # Header
+        ########################
+        streamlit.markdown("## Confronto tra condizioni QoS")
+
+        with stage("summarize_archive"), streamlit.spinner("Aggregating experiments..."):
+            tables, errors = summarize_archive()
+
+        experiments, tokens, phases = tables["experiment"], tables["tokens"], tables["phases"]
+        if errors:
+            streamlit.caption("_Skipped_: " + ", ".join(f"{key} ({error})" for key, error in sorted(errors.items())))
+        streamlit.markdown("---")
+
+        ############################################################
+        # Whole experiments
+        ############################################################
+        col1, col2 = streamlit.columns(2)
+        with col1:
+            plotly_chart(figure_or_data=qos_box(experiments, y="s_bitrate", title="Average downlink bitrate [bit/s]"))
+        with col2:
+            plotly_chart(figure_or_data=qos_box(experiments, y="rxt_ratio", title="Retransmitted packets ratio"))
+
+        col1, col2 = streamlit.columns(2)
+        with col1:
+            plotly_chart(figure_or_data=qos_box(experiments, y="flows", title="TCP flows per experiment"))
+        with col2:
+            plotly_chart(figure_or_data=qos_box(experiments, y="s_app_pkts", title="Downlink packets per experiment"))
+        streamlit.markdown("---")
+
+        ############################################################
+        # Bot phases and tokens of a service
+        ############################################################
+        help = """
+            Select here the service whose bot phases
+            and tokens are compared across QoS setups
+        """
+        service = streamlit.selectbox(label="Service selection", options=sorted(experiments["service"].unique()), help=help)
+
+        select = phases.loc[(phases["service"] == service) & ~phases["phase"].isin(SETUP_PHASES)]
+        figure = plotly.express.box(data_frame=select, x="phase", y="s_bitrate", color="qos", points="all",
+                                    hover_data=["experiment"], category_orders={"qos": sorted(select["qos"].unique())})
+        figure.update_layout(title="Downlink bitrate per bot phase [bit/s]", height=500)
+        plotly_chart(figure_or_data=figure)
+
+        # Tokens with the most downlink bytes, averaged over the experiments of each QoS
+        select = tokens.loc[tokens["service"] == service]
+        volume = select.groupby(["qos", "token"], as_index=False)[["s_app_byts", "rxt_ratio", "flows"]].mean()
+        top = select.groupby("token")["s_app_byts"].sum().nlargest(15).index
+        figure = plotly.express.bar(data_frame=volume.loc[volume["token"].isin(top)], x="token", y="s_app_byts", color="qos",
+                                    barmode="group", hover_data=["flows", "rxt_ratio"],
+                                    category_orders={"token": list(top), "qos": sorted(volume["qos"].unique())})
+        figure.update_layout(title="Downlink bytes per token (mean over experiments)", height=500)
+        plotly_chart(figure_or_data=figure)
+
+        streamlit.dataframe(experiments.loc[experiments["service"] == service], hide_index=True)
+        streamlit.markdown("---")
+
+        ############################################################
+        # Distributions over every experiment (from the sketches)
+        ############################################################
+        with stage("sketch_archive"), streamlit.spinner("Merging the distribution sketches..."):
+            sketch, _ = sketch_archive()
+        sketch = sketch.loc[sketch["service"] == service]
+
+        col1, col2 = streamlit.columns(2)
+        with col1:
+            metric = streamlit.selectbox(label="Distribution", options=list(METRICS), format_func=METRIC_TITLES.get)
+        with col2:
+            # Tokens with the most values first
+            options = sketch.loc[sketch["metric"] == metric].groupby("token")["count"].sum().sort_values(ascending=False).index
+            token = streamlit.selectbox(label="Token", options=["All tokens"] + list(options))
+
+        select = sketch.loc[(sketch["metric"] == metric) & ((sketch["token"] == token) | (token == "All tokens"))]
+        cdf = sketch_cdf(select, by=["qos"])
+        figure = plotly.express.line(data_frame=cdf, x="value", y="cdf", color="qos", line_shape="hv", log_x=True,
+                                     category_orders={"qos": sorted(cdf["qos"].unique())})
+        figure.update_layout(title=f"CDF of {METRIC_TITLES[metric].lower()} ({token.lower() if token == 'All tokens' else token})", height=500)
+        figure.update_xaxes(title=METRIC_TITLES[metric])
+        plotly_chart(figure_or_data=figure)
+        streamlit.dataframe(sketch_quantiles(select, by=["qos"]), hide_index=True)
+    finally:
+        end_run()
+
+
+# Guarded: the workers of the process pool import this script again (as __mp_main__)
+if __name__ == "__main__":
+    main()
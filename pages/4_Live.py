@@ -0,0 +1,83 @@
+import os
+import streamlit
+from src.catalog import experiment_folders
+from src.catalog import DATA_FOLDER
+from src.lib import tcp_complete_timeline
+from src.live import live_experiment
+from src.throughput import throughput_figure
+from src.profiler import start_run
+from src.profiler import end_run
+from src.profiler import profiled_fragment
+from src.profiler import plotly_chart
+
+# Partial reruns (named experimental_fragment up to streamlit 1.36)
+fragment = getattr(streamlit, "fragment", None) or streamlit.experimental_fragment
+
+# Seconds between two refreshes, and the span of the recent flows (milliseconds)
+REFRESH = 2
+RECENT  = 120_000
+
+@fragment(run_every=REFRESH)
+@profiled_fragment
+def live_view(path: str):
+
+    live = live_experiment(path)
+    rows = live.refresh()
+
+    if live.origin is None:
+        streamlit.caption("_Waiting for the origin of the bot trace..._")
+        return
+
+    # Running values of the follower: a refresh costs the new lines only
+    bot_complete = live.frame("bot_complete")
+    now = live.now
+
+    col1, col2, col3, col4 = streamlit.columns(4)
+    col1.metric("Complete flows", live.counts["tcp_complete"])
+    col2.metric("Periodic bins", live.counts["tcp_periodic"], delta=rows or None)
+    col3.metric("Elapsed", f"{now / 1000:.0f} s")
+    col4.metric("Last action", live.last_action or "-")
+
+    ################################
+    # Throughput (accumulated grid)
+    ################################
+    times, curves = live.throughput.curves(end=now)
+    plotly_chart(figure_or_data=throughput_figure(times, curves, live.throughput.step, bot_complete), name="live_throughput")
+
+    ################################
+    # Flows completed recently
+    ################################
+    recent = live.recent_flows(since=now - RECENT)
+    if len(recent) and len(bot_complete):
+        window = (max(0, now - RECENT), now)
+        plotly_chart(figure_or_data=tcp_complete_timeline(recent, bot_complete, feature=None, window=window), name="live_flows")
+
+
+def main():
+
+    streamlit.set_page_config(layout="wide")
+    start_run(page="live")
+    try:
+        ########################
+        # Header
+        ########################
+        streamlit.markdown("## Esperimento in corso")
+
+        # The most recently modified experiment first (the one being captured)
+        folders = sorted(experiment_folders(DATA_FOLDER), key=os.path.getmtime, reverse=True)
+        help = """
+            Select here the experiment being captured: the
+            Tstat logs and the bot trace are followed while
+            they grow, only the new lines are read
+        """
+        path = streamlit.selectbox(label="Experiment selection", options=folders, help=help,
+                                   format_func=lambda p: os.path.relpath(p, DATA_FOLDER))
+        streamlit.markdown("---")
+
+        if path is not None:
+            live_view(path=path)
+    finally:
+        end_run()
+
+
+main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import glob
+import pandas
+
+from src.lib import tcp_description
+from src.lib import tcp_descriptions
+
+#################################################################
+# Verify that the columnar hover text (tcp_descriptions) matches,
+# character by character, the row-wise reference (tcp_description)
+# on every experiment found under the data folder.
+#
+# Usage: python -m scripts.check_descriptions [data folder]
+#################################################################
+
+def check_frame(frame: pandas.DataFrame, periodic: bool) -> int:
+
+    expected = frame.apply(lambda record: tcp_description(record, periodic=periodic), axis=1)
+    obtained = tcp_descriptions(frame, periodic=periodic)
+
+    mismatch = expected != obtained
+    for i in frame.index[mismatch][:3]:
+        print(f"    row {i}:\n      expected {expected[i]!r}\n      obtained {obtained[i]!r}")
+
+    return int(mismatch.sum())
+
+def main():
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "data")
+    errors = 0
+
+    for path in sorted(glob.glob(os.path.join(folder, "*", "*", "*", "*"))):
+        for name, periodic in [("log_tcp_complete.csv", False), ("log_tcp_periodic.csv", True)]:
+            frame = pandas.read_csv(os.path.join(path, name), delimiter=" ")
+            if not {"ts", "te", "token"}.issubset(frame.columns):
+                print(f"SKIP {os.path.relpath(path, folder)}/{name} (legacy column names)")
+                continue
+            count = check_frame(frame, periodic=periodic)
+            print(f"{'OK  ' if count == 0 else 'FAIL'} {os.path.relpath(path, folder)}/{name} ({len(frame)} rows, {count} mismatches)")
+            errors += count
+
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
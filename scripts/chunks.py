@@ -0,0 +1,53 @@
+import os
+import argparse
+import multiprocessing
+import concurrent.futures
+import pandas
+
+from src.chunks import compute_chunks
+from src.catalog import load_catalog
+from src.catalog import DATA_FOLDER
+
+#################################################################
+# Detect the download chunks of every flow of the archive (see
+# src/chunks.py). Tables already computed for the current files
+# are read back, so only new or changed experiments are processed.
+#
+# Usage: python -m scripts.chunks [--data data] [--workers N]
+#################################################################
+
+def process(path: str) -> dict:
+
+    try:
+        table = compute_chunks(path)
+    except KeyError as e:
+        return dict(error=f"missing column {e}")
+
+    # Video flows: the ones with more than a chunk
+    flows = table.groupby("id", sort=False)["chunk"].max()
+    video = table.loc[table["id"].isin(flows.index[flows > 0])]
+    return dict(chunks=len(table), flows=int((flows > 0).sum()), size=video["bytes"].median(),
+                gap=video["gap"].median(), bitrate=video["bitrate"].median())
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Detect the download chunks of every experiment")
+    parser.add_argument("--data",    default=DATA_FOLDER)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.data)
+
+    # Spawned workers, as for the summaries
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        results = dict(zip(catalog, pool.map(process, [os.path.join(args.data, key) for key in catalog])))
+
+    for key, result in sorted(results.items()):
+        if "error" in result:
+            print(f"FAIL {key} ({result['error']})")
+    table = pandas.DataFrame([dict(experiment=key, **result) for key, result in sorted(results.items()) if "error" not in result])
+    print(table.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import glob
+import argparse
+
+from src.store import ingest_experiment
+from src.store import is_ingested
+
+#################################################################
+# Convert every experiment of the data folder into the Parquet
+# store (see src/store.py). Experiments whose tables are newer
+# than their CSV files are skipped, unless --force is given.
+#
+# Usage: python -m scripts.ingest [--data data] [--store store] [--force]
+#################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Ingest experiments into the Parquet store")
+    parser.add_argument("--data",  default=os.path.join(os.path.dirname(__file__), "..", "data"))
+    parser.add_argument("--store", default=os.path.join(os.path.dirname(__file__), "..", "store"))
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(args.data, "*", "*", "*", "*"))):
+        service, device, qos, experiment = os.path.relpath(path, args.data).split(os.sep)
+
+        if not args.force and is_ingested(path, args.store, service, device, qos, experiment):
+            print(f"SKIP {service}/{device}/{qos}/{experiment} (up to date)")
+            continue
+
+        try:
+            ingest_experiment(path, args.store, service, device, qos, experiment)
+            print(f"OK   {service}/{device}/{qos}/{experiment}")
+        except (ValueError, FileNotFoundError) as e:
+            print(f"FAIL {service}/{device}/{qos}/{experiment} ({e})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import glob
+import pandas
+
+from src.loader import read_experiment
+from src.loader import load_experiment
+from src.lib import prepare_tcp_complete
+from src.lib import prepare_tcp_periodic
+from src.lib import tcp_descriptions
+from src.schema import memory_usage
+
+#################################################################
+# Memory of every loaded frame, with the default pandas dtypes and
+# the descriptions kept as a column (the former layout), against
+# the frames served by load_experiment (compact schema, see
+# src/schema.py, descriptions generated when drawing).
+#
+# Usage: python -m scripts.memory_report [data folder]
+#################################################################
+
+def default_frames(path: str):
+
+    tcp_complete, tcp_periodic, bot_complete = read_experiment(path)
+    prepare_tcp_complete(complete=tcp_complete)
+    prepare_tcp_periodic(periodic=tcp_periodic)
+    tcp_complete["info"] = tcp_descriptions(tcp_complete, periodic=False)
+    tcp_periodic["info"] = tcp_descriptions(tcp_periodic, periodic=True)
+    return tcp_complete, tcp_periodic, bot_complete
+
+def main():
+
+    data = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "data")
+
+    rows = []
+    for path in sorted(glob.glob(os.path.join(data, "*", "*", "*", "*"))):
+        name = os.path.relpath(path, data)
+        try:
+            before = default_frames(path)
+            after  = load_experiment(path)
+        except KeyError as e:
+            print(f"SKIP {name} (legacy column names: {e})")
+            continue
+
+        for frame, b, a in zip(("tcp_complete", "tcp_periodic", "bot_complete"), before, after):
+            rows.append(dict(experiment=name, frame=frame, rows=len(a),
+                             before_kb=memory_usage(b) / 1024, after_kb=memory_usage(a) / 1024))
+
+    report = pandas.DataFrame(rows)
+    report["ratio"] = report["after_kb"] / report["before_kb"]
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+    total = report.groupby("frame")[["before_kb", "after_kb"]].sum()
+    total["ratio"] = total["after_kb"] / total["before_kb"]
+    print()
+    print(total.to_string(float_format=lambda v: f"{v:.2f}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import argparse
+
+from src.sketches import sketch_archive
+from src.sketches import sketch_quantiles
+from src.catalog import DATA_FOLDER
+
+#################################################################
+# Compute (or update) the distribution sketches of the archive
+# shown by the summary page (see src/sketches.py), and print the
+# percentiles of every metric per service and QoS.
+#
+# Usage: python -m scripts.sketches [--data data] [--workers N]
+#################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Sketch the distributions of the archive")
+    parser.add_argument("--data",    default=DATA_FOLDER)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    sketch, errors = sketch_archive(data=args.data, workers=args.workers)
+
+    for key, error in sorted(errors.items()):
+        print(f"FAIL {key} ({error})")
+    print(sketch_quantiles(sketch, by=["metric", "service", "qos"]).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import argparse
+
+from src.summary import summarize_archive
+from src.catalog import DATA_FOLDER
+
+#################################################################
+# Compute (or refresh) the per-experiment summaries shown by the
+# summary page (see src/summary.py). Only experiments whose files
+# changed since the last run are computed.
+#
+# Usage: python -m scripts.summarize [--data data] [--workers N]
+#################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Summarize every experiment of the archive")
+    parser.add_argument("--data",    default=DATA_FOLDER)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    tables, errors = summarize_archive(data=args.data, workers=args.workers)
+
+    for key, error in sorted(errors.items()):
+        print(f"FAIL {key} ({error})")
+    print(tables["experiment"].to_string(index=False))
+
+if __name__ == "__main__":
+    main()
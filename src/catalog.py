@@ -0,0 +1,179 @@
+import os
+import json
+import glob
+import hashlib
+import threading
+import pandas
+import watchdog.events
+import watchdog.observers
+
+from src.loader import TCP_COMPLETE
+from src.loader import TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+from src.loader import RAW_TCP_COMPLETE
+from src.loader import RAW_TCP_PERIODIC
+
+#################################################################
+# Catalog of the experiments found under the data folder
+# (data/<service>/<device>/<qos>/<experiment>). For each one the
+# manifest keeps the size and modification time of its files,
+# the number of flows and bins, the time span and the bot actions,
+# so that the pages can list experiments without walking the
+# folder or opening any CSV. The manifest is written to disk and
+# refreshed incrementally: only experiments whose files changed
+# (as reported by a watchdog observer) are scanned again. Every
+# data folder has its own catalog, manifest and observer.
+#
+#   .cache/catalog.json               the default data folder
+#   .cache/catalog-<folder key>.json  any other one
+#################################################################
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "data")
+MANIFEST    = os.path.join(os.path.dirname(__file__), "..", ".cache", "catalog.json")
+
+FILES = (TCP_COMPLETE, TCP_PERIODIC, BOT_COMPLETE, RAW_TCP_COMPLETE, RAW_TCP_PERIODIC)
+
+# Catalogs of this process by data folder, shared by every session
+catalogs = dict()
+lock = threading.Lock()
+
+def count_rows(path: str) -> int:
+
+    # Lines after the header, without parsing them
+    count = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            count += block.count(b"\n")
+    return max(count - 1, 0)
+
+def file_stamps(path: str) -> dict:
+    stamps = {}
+    for name in FILES:
+        target = os.path.join(path, name)
+        if os.path.exists(target):
+            stat = os.stat(target)
+            stamps[name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+def scan_experiment(data: str, path: str) -> dict:
+
+    service, device, qos, experiment = os.path.relpath(path, data).split(os.sep)
+    stamps = file_stamps(path)
+
+    # Flows and bins come from the .csv files, or from the raw logs they are derived from
+    complete = TCP_COMPLETE if TCP_COMPLETE in stamps else RAW_TCP_COMPLETE
+    periodic = TCP_PERIODIC if TCP_PERIODIC in stamps else RAW_TCP_PERIODIC
+
+    entry = dict(service=service, device=device, qos=qos, experiment=experiment,
+                 path=os.path.relpath(path, data), files=stamps,
+                 flows=count_rows(os.path.join(path, complete)) if complete in stamps else None,
+                 bins=count_rows(os.path.join(path, periodic)) if periodic in stamps else None,
+                 span=None, actions=[])
+
+    if BOT_COMPLETE in stamps:
+        bot = pandas.read_csv(os.path.join(path, BOT_COMPLETE), delimiter=" ")
+        entry["actions"] = bot["action"].tolist()
+        if "from" in bot.columns:
+            entry["span"] = float(bot["from"].max() - bot["from"].min())
+
+    return entry
+
+def experiment_folders(data: str) -> list[str]:
+    return sorted(p for p in glob.glob(os.path.join(data, "*", "*", "*", "*")) if os.path.isdir(p))
+
+def refresh(catalog: dict, data: str, folders: list[str]) -> bool:
+
+    # Scan again the folders whose files are not the ones in the catalog
+    changed = False
+    for path in folders:
+        key = os.path.relpath(path, data)
+        if not os.path.isdir(path):
+            changed |= catalog.pop(key, None) is not None
+        elif key not in catalog or catalog[key]["files"] != file_stamps(path):
+            catalog[key] = scan_experiment(data, path)
+            changed = True
+    return changed
+
+def write_manifest(catalog: dict, manifest: str):
+
+    # Write to a temporary file first, so readers never see a partial manifest
+    os.makedirs(os.path.dirname(manifest), exist_ok=True)
+    partial = f"{manifest}.{os.getpid()}.tmp"
+    with open(partial, "w") as f:
+        json.dump(catalog, f, indent=1)
+    os.replace(partial, manifest)
+
+def read_manifest(manifest: str) -> dict:
+    try:
+        with open(manifest, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+class ExperimentWatcher(watchdog.events.FileSystemEventHandler):
+
+    def __init__(self, data: str, state: dict):
+        self.data  = data
+        self.state = state
+
+    def on_any_event(self, event):
+
+        # Any change below data/<service>/<device>/<qos>/<experiment> marks that experiment
+        for target in (event.src_path, getattr(event, "dest_path", "")):
+            parts = os.path.relpath(target, self.data).split(os.sep) if target else []
+            if len(parts) >= 4 and parts[0] != "..":
+                with lock:
+                    self.state["dirty"].add(os.path.join(self.data, *parts[:4]))
+            elif 0 < len(parts) < 4 and parts[0] != "..":
+                # A whole service/device/qos folder: rescan everything
+                with lock:
+                    self.state["dirty"].add(None)
+
+def start_observer(data: str, state: dict):
+    try:
+        observer = watchdog.observers.Observer()
+        observer.schedule(ExperimentWatcher(data, state), data, recursive=True)
+        observer.daemon = True
+        observer.start()
+        return observer
+    except OSError:
+        # No file system notifications: the catalog is checked on every load
+        return None
+
+def manifest_path(data: str) -> str:
+    if data == os.path.abspath(DATA_FOLDER):
+        return MANIFEST
+    key = hashlib.sha1(data.encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(MANIFEST), f"catalog-{key}.json")
+
+def load_catalog(data: str = DATA_FOLDER, manifest: str | None = None) -> dict:
+
+    data = os.path.abspath(data)
+    manifest = manifest or manifest_path(data)
+    with lock:
+        state = catalogs.setdefault(data, dict(catalog=None, dirty=set(), observer=None))
+        if state["catalog"] is None or state["observer"] is None:
+            # First load in this process: check every experiment against the manifest
+            catalog = read_manifest(manifest) if state["catalog"] is None else state["catalog"]
+            folders = experiment_folders(data)
+            stale = set(catalog) - {os.path.relpath(p, data) for p in folders}
+            changed = refresh(catalog, data, folders + [os.path.join(data, key) for key in stale])
+            if state["catalog"] is None:
+                state["observer"] = start_observer(data, state)
+            state["catalog"] = catalog
+        else:
+            dirty, state["dirty"] = state["dirty"], set()
+            folders = experiment_folders(data) + list(state["catalog"].keys()) if None in dirty else sorted(dirty)
+            folders = [p if os.path.isabs(p) else os.path.join(data, p) for p in folders]
+            changed = refresh(state["catalog"], data, folders)
+
+        if changed:
+            write_manifest(state["catalog"], manifest)
+        return state["catalog"]
+
+def list_experiments(service: str, device: str, data: str = DATA_FOLDER) -> pandas.DataFrame:
+
+    catalog = load_catalog(data)
+    frame = pandas.DataFrame([e for e in catalog.values() if e["service"] == service and e["device"] == device],
+                             columns=["service", "device", "qos", "experiment", "path", "flows", "bins", "span", "actions"])
+    return frame.sort_values(by=["qos", "experiment"], ignore_index=True)
@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import functools
+import numpy
+import pandas
+
+from src.index import row_ranges
+from src.loader import load_experiment
+from src.loader import experiment_stamps
+from src.loader import CACHE_SIZE
+from src.shared import source_version
+
+#################################################################
+# ON/OFF download chunks of the flows. On the periodic bins of a
+# flow (sorted by time), a bin is ON when the server sent at least
+# CHUNK_BYTES; consecutive ON bins are one chunk unless there is
+# an idle time longer than CHUNK_GAP between them. Runs are found
+# with a cumulative sum over the run starts and aggregated with
+# bincount, for all the flows of an experiment at once. Chunk
+# tables are stored on disk per experiment (sorted by flow, so
+# the chunks of a flow are a slice, see src.index).
+#
+#   .cache/chunks/<experiment key>-<version key>.parquet
+#################################################################
+
+CHUNKS_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "chunks")
+VERSION = source_version(("chunks.py", "loader.py", "index.py", "tstat.py"))
+
+# A bin is ON from this number of server bytes
+CHUNK_BYTES = 1000
+
+# Idle time (milliseconds) that splits two chunks
+CHUNK_GAP = 500
+
+CHUNK_COLUMNS = ["token", "id", "chunk", "start", "end", "bytes", "bins", "duration", "gap", "bitrate"]
+
+def detect_chunks(tcp_periodic: pandas.DataFrame, threshold: float = CHUNK_BYTES, gap: float = CHUNK_GAP) -> pandas.DataFrame:
+
+    # tcp_periodic sorted by (token, id, ts), as the loader gives it
+    on = tcp_periodic["s_app_byts"].to_numpy(dtype=float) >= threshold
+    if not on.any():
+        return pandas.DataFrame(columns=CHUNK_COLUMNS)
+
+    rows  = numpy.flatnonzero(on)
+    ids   = pandas.factorize(tcp_periodic["id"].to_numpy(dtype=object)[rows])[0]
+    ts    = tcp_periodic["ts"].to_numpy(dtype=float)[rows]
+    te    = tcp_periodic["te"].to_numpy(dtype=float)[rows]
+    byts  = tcp_periodic["s_app_byts"].to_numpy(dtype=float)[rows]
+
+    # A run starts at the first ON bin of a flow, after an OFF bin or after an idle time
+    after_off = numpy.r_[True, numpy.diff(rows) > 1]
+    new_flow  = numpy.r_[True, ids[1:] != ids[:-1]]
+    idle      = numpy.r_[True, ts[1:] - te[:-1] > gap]
+    starts    = after_off | new_flow | idle
+    run = numpy.cumsum(starts) - 1
+    first = numpy.flatnonzero(starts)
+
+    table = pandas.DataFrame({
+        "token": tcp_periodic["token"].to_numpy(dtype=object)[rows][first],
+        "id":    tcp_periodic["id"].to_numpy(dtype=object)[rows][first],
+        "start": numpy.minimum.reduceat(ts, first),
+        "end":   numpy.maximum.reduceat(te, first),
+        "bytes": numpy.bincount(run, weights=byts),
+        "bins":  numpy.bincount(run),
+    })
+
+    # Chunk number within its flow, and the idle time since the previous chunk of the flow
+    flow_first = numpy.r_[True, table["id"].to_numpy()[1:] != table["id"].to_numpy()[:-1]]
+    index = numpy.arange(len(table))
+    table.insert(2, "chunk", index - numpy.maximum.accumulate(numpy.where(flow_first, index, 0)))
+    table["duration"] = table["end"] - table["start"]
+    table["gap"] = numpy.where(flow_first, numpy.nan, table["start"] - numpy.r_[numpy.nan, table["end"].to_numpy()[:-1]])
+    table["bitrate"] = numpy.divide(table["bytes"] * 8, table["duration"] / 1000,
+                                    out=numpy.full(len(table), numpy.nan), where=table["duration"].to_numpy() > 0)
+    return table
+
+def chunks_path(path: str, stamps: tuple, folder: str = CHUNKS_FOLDER) -> str:
+    key   = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    stamp = hashlib.sha1(json.dumps([stamps, VERSION]).encode()).hexdigest()[:16]
+    return os.path.join(folder, f"{key}-{stamp}.parquet")
+
+def compute_chunks(path: str, folder: str = CHUNKS_FOLDER) -> pandas.DataFrame:
+
+    # Read back when this version of the experiment was already processed (by the pages or by a batch job)
+    path = os.path.abspath(path)
+    target = chunks_path(path, experiment_stamps(path), folder)
+    if os.path.exists(target):
+        return pandas.read_parquet(target)
+
+    _, tcp_periodic, _ = load_experiment(path=path, columns=("token", "id", "ts", "te", "s_app_byts"))
+    table = detect_chunks(tcp_periodic)
+
+    os.makedirs(folder, exist_ok=True)
+    partial = f"{target}.{os.getpid()}.tmp"
+    table.to_parquet(partial, index=False)
+    os.replace(partial, target)
+    return table
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_chunks(path: str, stamps: tuple):
+    table = compute_chunks(path)
+    return table, row_ranges(table["id"])
+
+def flow_chunks(path: str, id: str) -> pandas.DataFrame:
+
+    # Chunks of a single flow (a slice of the table of its experiment)
+    path = os.path.abspath(path)
+    table, ranges = _load_chunks(path, experiment_stamps(path))
+    a, b = ranges.get(id, (0, 0))
+    return table.iloc[a:b]
@@ -0,0 +1,80 @@
+import numpy
+import pandas
+import plotly.graph_objects
+
+from src.lib import add_bot_markers
+
+#################################################################
+# Number of TCP connections open at the same time. Every flow of
+# log_tcp_complete is an opening event at ts (+1) and a closing
+# event at te (-1): once the events are sorted, the running sum is
+# the count of open connections, so the cost is O(n log n) with no
+# loop over the flows. With groups (e.g. tokens) the events are
+# sorted by group first and each group restarts from zero.
+#################################################################
+
+def open_connections(ts: numpy.ndarray, te: numpy.ndarray, groups: numpy.ndarray | None = None):
+
+    # -> (group, time, open) at every time the count changes
+    if len(ts) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0), numpy.zeros(0, dtype=numpy.int64)
+    groups = numpy.zeros(len(ts), dtype=numpy.int64) if groups is None else numpy.asarray(groups, dtype=numpy.int64)
+    times  = numpy.concatenate([ts, te]).astype(float)
+    steps  = numpy.concatenate([numpy.ones(len(ts), dtype=numpy.int64), -numpy.ones(len(te), dtype=numpy.int64)])
+    owners = numpy.concatenate([groups, groups])
+
+    # Openings before closings at the same time: a flow with ts == te is counted once
+    order  = numpy.lexsort((-steps, times, owners))
+    times, steps, owners = times[order], steps[order], owners[order]
+
+    counts = numpy.cumsum(steps)
+    first  = numpy.flatnonzero(numpy.r_[True, owners[1:] != owners[:-1]])
+    counts -= numpy.repeat(counts[first] - steps[first], numpy.diff(numpy.r_[first, len(counts)]))
+
+    # Only the last event of each (group, time) is kept
+    last = numpy.r_[(owners[1:] != owners[:-1]) | (times[1:] != times[:-1]), True]
+    return owners[last], times[last], counts[last]
+
+def connection_counts(tcp_complete: pandas.DataFrame, by: str | None = None) -> pandas.DataFrame:
+
+    # Open connections over time, overall or for each value of a column (flows without it are "unknown")
+    ts = tcp_complete["ts"].to_numpy(dtype=float)
+    te = tcp_complete["te"].to_numpy(dtype=float)
+    if by is None:
+        _, times, counts = open_connections(ts, te)
+        return pandas.DataFrame({"time": times, "open": counts})
+
+    codes, names = pandas.factorize(tcp_complete[by].astype(object).fillna("unknown"))
+    owners, times, counts = open_connections(ts, te, codes)
+    return pandas.DataFrame({by: numpy.asarray(names, dtype=object)[owners], "time": times, "open": counts})
+
+def connections_timeline(tcp_complete: pandas.DataFrame, bot_complete: pandas.DataFrame, token: str | None = None,
+                         window: tuple[float, float] | None = None) -> plotly.graph_objects.Figure:
+
+    # All the flows, or those of a token, as a single step trace
+    if token is not None:
+        tcp_complete = tcp_complete.loc[tcp_complete["token"] == token]
+    counts = connection_counts(tcp_complete)
+
+    # Starts from zero at the first event (an empty trace without flows)
+    times, y = counts["time"].to_numpy(dtype=float), counts["open"].to_numpy()
+    if len(times):
+        times, y = numpy.r_[times[:1], times], numpy.r_[0, y]
+    x = pandas.to_datetime(times, unit="ms", origin="unix")
+
+    figure = plotly.graph_objects.Figure(plotly.graph_objects.Scattergl(x=x, y=y, mode="lines", line=dict(shape="hv", width=1.5),
+                                                                        name=token or "all",
+                                                                        hovertemplate="%{x|%M:%S.%L}<br>%{y} open<extra></extra>"))
+
+    figure.update_layout(height=450, title=f"Open TCP connections ({token or 'all tokens'})")
+    figure.update_xaxes(gridwidth=0.03, title="Time (minutes:seconds)", showgrid=True, tickformat="%M:%S",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    figure.update_yaxes(gridwidth=0.03, title="# Connections", showgrid=True, rangemode="tozero",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+
+    # The counts are computed on every flow, the window only narrows the axis
+    if window is not None:
+        figure.update_xaxes(range=[pandas.to_datetime(w, unit="ms", origin="unix") for w in window])
+
+    add_bot_markers(figure, bot_complete, window=window)
+    return figure
@@ -0,0 +1,90 @@
+import numpy
+import pandas
+import plotly.express
+import plotly.graph_objects
+
+from src.lib import lod_grid
+from src.lib import add_bot_markers
+from src.lib import LOD_TIME_BINS
+from src.lib import LOD_ROW_BINS
+
+#################################################################
+# Delivery problems over time: retransmitted bytes and the share
+# of retransmitted or out-of-order packets, as one heatmap with
+# time on the x axis and tokens or flows on the y axis. The
+# counters of the periodic bins are binned on the (row x time)
+# grid of lib.lod_grid, so the figure is a single trace whatever
+# the number of flows; ratios are the ratio of the binned sums.
+#################################################################
+
+# Colour -> (numerator, denominator); no denominator is a plain sum
+DELIVERY_VALUES = {
+    "s_rxt_byts": ("s_rxt_byts", None),
+    "rxt_ratio":  ("s_rxt_pkts", "s_all_pkts"),
+    "ooo_ratio":  ("s_ooo_pkts", "s_all_pkts"),
+}
+
+def delivery_rows(tcp_periodic: pandas.DataFrame, by: str):
+
+    # Tokens from the largest downlink volume, flows in order of start
+    if by == "token":
+        labels = tcp_periodic["token"].astype(object).fillna("unknown")
+        order  = tcp_periodic.groupby(labels)["s_app_byts"].sum().sort_values(ascending=False, kind="stable").index
+    else:
+        labels = tcp_periodic["id"].astype(object)
+        order  = tcp_periodic.groupby(labels)["ts"].min().sort_values(kind="stable").index
+    return pandas.Categorical(labels, categories=order).codes, list(order)
+
+def delivery_grid(tcp_periodic: pandas.DataFrame, rows: numpy.ndarray, value: str, start: float, end: float,
+                  time_bins: int = LOD_TIME_BINS, row_bins: int = LOD_ROW_BINS):
+
+    ts = tcp_periodic["ts"].to_numpy(dtype=float)
+    te = tcp_periodic["te"].to_numpy(dtype=float)
+    numerator, denominator = DELIVERY_VALUES[value]
+
+    grid, edges, group = lod_grid(ts, te, rows, tcp_periodic[numerator].to_numpy(dtype=float), start, end, time_bins, row_bins)
+    if denominator is None:
+        return grid, edges, group
+
+    # Cells without packets are left empty
+    total, _, _ = lod_grid(ts, te, rows, tcp_periodic[denominator].to_numpy(dtype=float), start, end, time_bins, row_bins)
+    ratio = numpy.divide(grid, total, out=numpy.full(grid.shape, numpy.nan), where=total > 0)
+    return numpy.minimum(ratio, 1.0), edges, group
+
+def delivery_heatmap(tcp_periodic: pandas.DataFrame, bot_complete: pandas.DataFrame, value: str = "s_rxt_byts",
+                     by: str = "token", window: tuple[float, float] | None = None) -> plotly.graph_objects.Figure:
+
+    start, end = window if window is not None else (min(tcp_periodic["ts"].min(), bot_complete["from"].min()),
+                                                    max(tcp_periodic["te"].max(), bot_complete["from"].max()))
+    rows, labels = delivery_rows(tcp_periodic, by)
+
+    # One row per token; flows are grouped when there are too many of them
+    row_bins = max(len(labels), 1) if by == "token" else LOD_ROW_BINS
+    grid, edges, group = delivery_grid(tcp_periodic, rows, value, start, end, row_bins=row_bins)
+
+    x = pandas.to_datetime((edges[:-1] + edges[1:]) / 2, unit="ms", origin="unix")
+    if group == 1:
+        y = labels[:grid.shape[0]]
+    else:
+        y = [f"{labels[i]} (+{min(group, len(labels) - i) - 1})" for i in range(0, grid.shape[0] * group, group)]
+    if by == "id":
+        y = [label.replace("#", " ") for label in y]
+
+    # Bytes are counts: integers keep the serialized figure small
+    if DELIVERY_VALUES[value][1] is None:
+        grid, hover = numpy.rint(grid).astype(numpy.int64), "%{z:.0f}"
+    else:
+        hover = "%{z:.2%}"
+
+    figure = plotly.graph_objects.Figure(plotly.graph_objects.Heatmap(z=grid, x=x, y=y, colorscale=plotly.express.colors.sequential.Reds,
+                                                                      colorbar=dict(title=value), hoverongaps=False,
+                                                                      hovertemplate=f"%{{x|%M:%S}}<br>%{{y}}<br>{value}: {hover}<extra></extra>"))
+
+    figure.update_layout(height=max(450, min(20 * len(y), 900)), title=f"{value} per {'token' if by == 'token' else 'flow'}")
+    figure.update_xaxes(gridwidth=0.03, title="Time (minutes:seconds)", showgrid=True, tickformat="%M:%S",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    figure.update_yaxes(title="Token" if by == "token" else "Connection Id", autorange="reversed", type="category",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+
+    add_bot_markers(figure, bot_complete, window=window)
+    return figure
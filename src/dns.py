@@ -0,0 +1,79 @@
+import numpy
+import pandas
+import plotly.express
+
+#################################################################
+# Join of the DNS resolutions (log_dns_complete) onto the TCP
+# flows. Every answer becomes (client, answer IP, hostname,
+# request and response time); each flow takes the last answer
+# for its (c_ip, s_ip) received before it opened (ts), with a
+# sorted merge_asof instead of a lookup per flow. The hostname
+# is the name asked by the client, before any CNAME.
+#################################################################
+
+RESOLUTION_COLUMNS = ["c_ip", "s_ip", "hostname", "dns_request", "dns_response", "ttl"]
+RESOLUTION_TYPES   = {"c_ip": object, "s_ip": object, "hostname": object, "dns_request": float, "dns_response": float, "ttl": float}
+
+def dns_resolutions(dns_complete: pandas.DataFrame) -> pandas.DataFrame:
+
+    # Without any line (no log, or its header only) the columns are typed all the same: merge_asof needs float times
+    if len(dns_complete) == 0:
+        return pandas.DataFrame(columns=RESOLUTION_COLUMNS).astype(RESOLUTION_TYPES)
+
+    requests = dns_complete.loc[dns_complete["entry"] == "REQ", ["c_ip", "c_port", "trans_id", "time", "query"]]
+    answers  = dns_complete.loc[dns_complete["entry"] == "RESP", ["c_ip", "c_port", "trans_id", "time", "answer", "ttl"]]
+
+    # Each answer belongs to the last request of its transaction (ids are reused over time)
+    table = pandas.merge_asof(answers.sort_values(by="time", kind="stable"),
+                              requests.sort_values(by="time", kind="stable").rename(columns={"time": "dns_request"}),
+                              left_on="time", right_on="dns_request", by=["c_ip", "c_port", "trans_id"], direction="backward")
+
+    table = table.rename(columns={"answer": "s_ip", "query": "hostname", "time": "dns_response"})
+    table["hostname"] = table["hostname"].str.rstrip(".")
+    return table[RESOLUTION_COLUMNS].reset_index(drop=True)
+
+def attach_resolutions(tcp_complete: pandas.DataFrame, resolutions: pandas.DataFrame) -> pandas.DataFrame:
+
+    # -> one row per flow (same order): the resolution of its server and the DNS-to-connect latency
+    flows = pandas.DataFrame({"id": tcp_complete["id"].astype(object).to_numpy(),
+                              "token": tcp_complete["token"].astype(object).to_numpy(),
+                              "c_ip": tcp_complete["c_ip"].astype(object).to_numpy(),
+                              "s_ip": tcp_complete["s_ip"].astype(object).to_numpy(),
+                              "ts": tcp_complete["ts"].to_numpy(dtype=float),
+                              "row": numpy.arange(len(tcp_complete))})
+
+    right = resolutions.astype({"c_ip": object, "s_ip": object}).sort_values(by="dns_response", kind="stable")
+    table = pandas.merge_asof(flows.sort_values(by="ts", kind="stable"), right, left_on="ts", right_on="dns_response",
+                              by=["c_ip", "s_ip"], direction="backward")
+
+    table["dns_duration"] = table["dns_response"] - table["dns_request"]
+    table["dns_latency"]  = table["ts"] - table["dns_response"]
+
+    # Past the TTL the client may have resolved the name again (from its own cache)
+    table["dns_expired"] = table["dns_latency"] > table["ttl"] * 1000
+
+    return table.sort_values(by="row").drop(columns="row").reset_index(drop=True)
+
+def token_latency(flows: pandas.DataFrame) -> pandas.DataFrame:
+
+    # Per token: flows with and without a resolution, and the distribution of the latency
+    grouped = flows.groupby("token", sort=False)
+    table = pandas.DataFrame({"flows": grouped.size(), "resolved": grouped["dns_response"].count()})
+    for q in (0.5, 0.9):
+        table[f"latency_p{int(q * 100)}"] = grouped["dns_latency"].quantile(q)
+    table["duration_p50"] = grouped["dns_duration"].quantile(0.5)
+    return table.reset_index().sort_values(by="flows", ascending=False, kind="stable", ignore_index=True)
+
+def latency_chart(flows: pandas.DataFrame):
+
+    # Only the flows opened after a resolution of their server
+    data = flows.dropna(subset=["dns_latency"])
+    order = data["token"].value_counts().index
+    figure = plotly.express.strip(data_frame=data, x="token", y="dns_latency", color="dns_expired",
+                                  hover_data=["id", "hostname", "dns_duration"], category_orders={"token": list(order)},
+                                  height=500)
+    figure.update_layout(title="DNS response to TCP connect [ms]")
+    figure.update_yaxes(title="Latency [ms]", type="log",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    figure.update_xaxes(title="Token", title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    return figure
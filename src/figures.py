@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import plotly
+import plotly.io
+import plotly.graph_objects
+
+from src.loader import experiment_stamps
+from src.loader import load_experiment
+from src.loader import load_index
+from src.loader import load_resolutions
+from src.loader import load_udp
+from src.loader import load_udp_index
+from src.lib import tcp_complete_timeline
+from src.lib import tcp_periodic_timeline
+from src.phases import phase_volumes
+from src.phases import phase_chart
+from src.phases import PHASE_COUNTERS
+from src.throughput import throughput_timeline
+from src.concurrency import connections_timeline
+from src.delivery import delivery_heatmap
+from src.dns import latency_chart
+from src.chunks import flow_chunks
+from src.profiler import profiled
+from src.shared import source_version
+
+#################################################################
+# Figures are stored on disk as plotly JSON, so a view that has
+# already been built (by any session) is read back instead of
+# being computed again. The key is made of the experiment folder,
+# the modification times of its files, the version of the code
+# that draws the figures and the parameters of the view. The
+# folder is bounded in size: the least recently used figures are
+# removed first.
+#################################################################
+
+CACHE_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "figures")
+CACHE_BYTES  = 512 << 20
+
+# Any change to the code that builds the figures (or to plotly) is a new version
+VERSION = plotly.__version__ + "-" + source_version(("figures.py", "lib.py", "phases.py", "throughput.py", "concurrency.py", "delivery.py", "dns.py", "chunks.py", "index.py", "loader.py", "schema.py", "shared.py", "tstat.py"))
+
+def figure_key(path: str, view: str, params: dict) -> str:
+    path = os.path.abspath(path)
+    key  = json.dumps([VERSION, path, experiment_stamps(path), view, params], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def evict(folder: str, limit: int):
+
+    # The modification time of a figure is its last use
+    entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in os.scandir(folder) if e.name.endswith(".json")]
+    size = sum(s for _, s, _ in entries)
+    for _, s, path in sorted(entries):
+        if size <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= s
+
+def cached_figure(path: str, view: str, params: dict, build, folder: str = CACHE_FOLDER,
+                  limit: int = CACHE_BYTES) -> plotly.graph_objects.Figure:
+
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, figure_key(path, view, params) + ".json")
+
+    try:
+        with open(target, "r") as f:
+            figure = plotly.io.from_json(f.read())
+        os.utime(target)
+        return figure
+    except (FileNotFoundError, ValueError):
+        pass
+
+    figure = build()
+
+    # Write to a temporary file first, so readers never see a partial figure
+    partial = f"{target}.{os.getpid()}.tmp"
+    with open(partial, "w") as f:
+        f.write(plotly.io.to_json(figure, validate=False))
+    os.replace(partial, target)
+
+    evict(folder, limit)
+    return figure
+
+#################################################################
+# Cached views of an experiment (the frames are loaded on a miss,
+# with only the columns of the flows and bins each view draws)
+#################################################################
+
+# The timelines, with the fields of their hover text (UDP flows have no ACKs)
+TIMELINE_COLUMNS = ("token", "id", "ts", "te", "ts_datetime", "te_datetime", "size", "proto", "c_ip", "s_ip", "c_pt", "s_pt",
+                    "c_app_byts", "s_app_byts", "c_app_pkts", "s_app_pkts", "c_ack_pkts", "s_ack_pkts", "c_pure_ack_pkts", "s_pure_ack_pkts")
+
+PHASE_COLUMNS       = ("token", "ts", "te") + tuple(PHASE_COUNTERS)
+THROUGHPUT_COLUMNS  = ("token", "id", "ts", "te", "c_app_byts", "s_app_byts")
+CONNECTION_COLUMNS  = ("token", "ts", "te")
+DELIVERY_COLUMNS    = ("token", "id", "ts", "te", "s_app_byts", "s_rxt_byts", "s_rxt_pkts", "s_ooo_pkts", "s_all_pkts")
+
+def load_flows(path: str, transport: str, columns: tuple):
+
+    # Complete flows, periodic bins and index of either transport (the bot trace is the same)
+    _, _, bot_complete = load_experiment(path=path, columns=columns)
+    if transport == "udp":
+        udp_complete, udp_periodic = load_udp(path=path, columns=columns)
+        return udp_complete, udp_periodic, bot_complete, load_udp_index(path=path, columns=columns)
+    tcp_complete, tcp_periodic, _ = load_experiment(path=path, columns=columns)
+    return tcp_complete, tcp_periodic, bot_complete, load_index(path=path, columns=columns)
+
+@profiled
+def complete_timeline(path: str, feature: str | None, window: tuple[float, float] | None = None, transport: str = "tcp"):
+
+    def build():
+        complete, _, bot_complete, _ = load_flows(path, transport, TIMELINE_COLUMNS)
+        return tcp_complete_timeline(tcp_complete=complete, bot_complete=bot_complete, feature=feature, window=window)
+
+    return cached_figure(path, "tcp_complete_timeline", dict(feature=feature, window=window, transport=transport), build)
+
+@profiled
+def periodic_timeline(path: str, token: str, id: str | None, feature: str | None,
+                      window: tuple[float, float] | None = None, transport: str = "tcp"):
+
+    def build():
+        _, periodic, bot_complete, index = load_flows(path, transport, TIMELINE_COLUMNS)
+        # Download chunks are overlaid on the bytes of a single TCP flow
+        chunks = flow_chunks(path=path, id=id) if id is not None and transport == "tcp" and feature == "s_app_byts" else None
+        return tcp_periodic_timeline(tcp_periodic=periodic, bot_complete=bot_complete, token=token, id=id,
+                                     feature=feature, window=window, index=index, chunks=chunks)
+
+    return cached_figure(path, "tcp_periodic_timeline", dict(token=token, id=id, feature=feature, window=window,
+                                                             transport=transport), build)
+
+@profiled
+def phases_chart(path: str, value: str):
+
+    def build():
+        _, tcp_periodic, bot_complete = load_experiment(path=path, columns=PHASE_COLUMNS)
+        return phase_chart(phase_volumes(tcp_periodic, bot_complete), value=value)
+
+    return cached_figure(path, "phase_chart", dict(value=value), build)
+
+@profiled
+def throughput_chart(path: str, step: float, token: str | None = None, id: str | None = None,
+                     by: str | None = None, window: tuple[float, float] | None = None):
+
+    def build():
+        _, tcp_periodic, bot_complete = load_experiment(path=path, columns=THROUGHPUT_COLUMNS)
+        index = load_index(path=path, columns=THROUGHPUT_COLUMNS)
+        # All the bins, those of a token or those of a flow
+        bins = index.flow_bins(id) if id is not None else (index.token_bins(token) if token is not None else tcp_periodic)
+        return throughput_timeline(tcp_periodic=bins, bot_complete=bot_complete, step=step, by=by, window=window)
+
+    return cached_figure(path, "throughput_timeline", dict(step=step, token=token, id=id, by=by, window=window), build)
+
+@profiled
+def connections_chart(path: str, token: str | None = None, window: tuple[float, float] | None = None):
+
+    def build():
+        tcp_complete, _, bot_complete = load_experiment(path=path, columns=CONNECTION_COLUMNS)
+        return connections_timeline(tcp_complete=tcp_complete, bot_complete=bot_complete, token=token, window=window)
+
+    return cached_figure(path, "connections_timeline", dict(token=token, window=window), build)
+
+@profiled
+def delivery_chart(path: str, value: str, by: str, window: tuple[float, float] | None = None):
+
+    def build():
+        _, tcp_periodic, bot_complete = load_experiment(path=path, columns=DELIVERY_COLUMNS)
+        return delivery_heatmap(tcp_periodic=tcp_periodic, bot_complete=bot_complete, value=value, by=by, window=window)
+
+    return cached_figure(path, "delivery_heatmap", dict(value=value, by=by, window=window), build)
+
+@profiled
+def dns_latency_chart(path: str):
+
+    def build():
+        return latency_chart(load_resolutions(path=path))
+
+    return cached_figure(path, "latency_chart", dict(), build)
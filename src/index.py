@@ -0,0 +1,56 @@
+import numpy
+import pandas
+
+#################################################################
+# Token/flow index of a loaded experiment. The periodic bins are
+# sorted by (token, id, ts), so the bins of a token or of a flow
+# are a contiguous range of rows: selecting them is a slice of
+# the frame instead of a boolean scan of the whole column.
+#################################################################
+
+SORTING = ["token", "id", "ts"]
+
+def sort_flows(tcp_periodic: pandas.DataFrame) -> pandas.DataFrame:
+
+    # Bins without a token (flows missing from log_tcp_complete) go last
+    return tcp_periodic.sort_values(by=SORTING, kind="stable", na_position="last", ignore_index=True)
+
+def row_ranges(values: pandas.Series) -> dict:
+
+    # Sorted column -> {value: (first row, last row + 1)}, missing values are not indexed
+    values = values.to_numpy(dtype=object)
+    if len(values) == 0:
+        return dict()
+    starts = numpy.flatnonzero(numpy.concatenate([[True], values[1:] != values[:-1]]))
+    stops  = numpy.append(starts[1:], len(values))
+    return {values[a]: (a, b) for a, b in zip(starts.tolist(), stops.tolist()) if not pandas.isna(values[a])}
+
+class FlowIndex:
+
+    def __init__(self, tcp_complete: pandas.DataFrame, tcp_periodic: pandas.DataFrame):
+
+        # tcp_periodic must already be sorted by sort_flows()
+        self.tcp_periodic = tcp_periodic
+        self.token_rows = row_ranges(tcp_periodic["token"])
+        self.id_rows    = row_ranges(tcp_periodic["id"])
+
+        # Flows of each token, in order of start
+        flows = tcp_complete.loc[tcp_complete["token"].notna(), ["token", "id", "ts"]].sort_values(by="ts", kind="stable")
+        self.token_ids = {token: list(dict.fromkeys(ids)) for token, ids in flows.groupby("token", sort=True, observed=True)["id"]}
+        self.tokens = list(self.token_ids.keys())
+
+        # Flow identifiers as they are displayed ("#" -> " ") and back
+        ids = pandas.unique(pandas.concat([tcp_complete["id"], tcp_periodic["id"]], ignore_index=True))
+        self.labels = dict(zip(ids, pandas.Series(ids, dtype=object).str.replace("#", " ", regex=False)))
+        self.ids = {label: id for id, label in self.labels.items()}
+
+    def token_bins(self, token: str) -> pandas.DataFrame:
+        a, b = self.token_rows.get(token, (0, 0))
+        return self.tcp_periodic.iloc[a:b]
+
+    def flow_bins(self, id: str) -> pandas.DataFrame:
+        a, b = self.id_rows.get(id, (0, 0))
+        return self.tcp_periodic.iloc[a:b]
+
+    def flow_labels(self, token: str) -> list[str]:
+        return [self.labels[id] for id in self.token_ids.get(token, [])]
@@ -1,8 +1,13 @@
+import re
+import string
 import pandas
 import numpy
 import plotly.express
 import plotly.graph_objects
 
+from src.index import FlowIndex
+from src.profiler import profiled
+
 def bytes_to_human_readable(b):
 
     for u in ['B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB', 'ZB', 'YB']:
@@ -120,35 +125,397 @@ def tcp_description(record: dict, periodic: bool) -> str:
                 f"Span [secnds]: {secnds_span:4.2f}<br>"
                 f"Span [mintes]: {minuts_span:4.2f}<br>"
                 
-                f"Application Token: <b>{app_token}</b><br>")      
+                f"Application Token: <b>{app_token}</b><br>")
 
-def prepare_tcp_complete(complete: pandas.DataFrame):
+BYTES_UNITS   = ['B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB', 'ZB', 'YB']
+BITRATE_UNITS = ['bps', 'Kbps', 'Mbps', 'Gbps', 'Tbps', 'Pbps', 'Ebps', 'Zbps', 'Ybps']
+
+CENTS = numpy.array([f"{i:02d}" for i in range(100)], dtype=object)
+
+def format_fixed(values: numpy.ndarray, spec: str = ".2f") -> numpy.ndarray:
+
+    # Columnar f"{v:.2f}" (any spec with 2 decimals): values are rounded to cents with integer arithmetic,
+    # while the few that are not finite, too large or too close to a rounding
+    # tie to be decided safely are still formatted by Python
+    values = numpy.asarray(values, dtype=numpy.float64)
+    scaled = numpy.abs(values) * 100
+
+    with numpy.errstate(invalid="ignore"):
+        cents = numpy.rint(scaled)
+        exact = numpy.isfinite(scaled) & (scaled < 2**50) & (numpy.abs(numpy.abs(scaled - cents) - 0.5) > numpy.spacing(scaled))
+
+    cents = numpy.where(exact, cents, 0).astype(numpy.int64)
+    text  = numpy.where(numpy.signbit(values), "-", "").astype(object) + format_plain(cents // 100) + "." + CENTS[cents % 100]
+    text[~exact] = [format(v, spec) for v in values[~exact].tolist()]
+
+    return text
+
+def format_plain(values: pandas.Series | numpy.ndarray) -> numpy.ndarray:
+
+    # Columnar f"{v}": columns are highly repetitive (addresses, ports,
+    # tokens, small counters) so only the distinct values are formatted
+    codes, uniques = pandas.factorize(values)
+    text = numpy.array(list(map(str, uniques.tolist())) + [""], dtype=object)[codes]
 
-    # Generate a description for each flow
-    complete["info"] = complete.apply(lambda record: tcp_description(record, periodic=False), axis=1)
+    # Missing values (None and NaN are merged by factorize) keep their own text
+    missing = codes < 0
+    text[missing] = list(map(str, numpy.asarray(values, dtype=object)[missing].tolist()))
+
+    # Categorical strings hold NaN where the file had no value (read as None)
+    if isinstance(values.dtype, pandas.CategoricalDtype):
+        text[missing] = "None"
+
+    return text
+
+def scale_to_units(values: numpy.ndarray, base: float, units: list[str]):
+
+    # Same successive divisions as the scalar helpers, so that the
+    # scaled values are bit-for-bit identical to theirs
+    scaled  = numpy.array(values, dtype=numpy.float64)
+    index   = numpy.full(len(scaled), len(units))
+    pending = numpy.ones(len(scaled), dtype=bool)
+
+    for i in range(len(units)):
+        done = pending & (scaled < base)
+        index[done] = i
+        pending &= ~done
+        scaled[pending] /= base
+
+    return scaled, index
+
+def bytes_to_human_readable_array(b: numpy.ndarray) -> numpy.ndarray:
+
+    scaled, index = scale_to_units(b, base=1024, units=BYTES_UNITS)
+    text = format_fixed(scaled) + " " + numpy.array(BYTES_UNITS + [""], dtype=object)[index]
+
+    # Values that never fall below 1024 (or NaN) are returned as None by the scalar helper
+    text[index == len(BYTES_UNITS)] = "None"
+    return text
+
+def bitrate_to_human_readable_array(b: numpy.ndarray, milliseconds: numpy.ndarray) -> numpy.ndarray:
+
+    b = numpy.asarray(b, dtype=numpy.float64)
+    milliseconds = numpy.asarray(milliseconds)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        bps = (b * 8) / (milliseconds / 1000.0)
+
+    # Past the last unit the scalar helper keeps dividing and sticks to Ybps
+    scaled, index = scale_to_units(bps, base=1000, units=BITRATE_UNITS)
+    text = format_fixed(scaled) + " " + numpy.array(BITRATE_UNITS + ["Ybps"], dtype=object)[index]
+
+    text[milliseconds == 0] = "0 bps"
+    return text
+
+def compile_template(template: str):
+
+    # Turn a "{name}" template into a positional "%s" one (much cheaper to fill
+    # row by row) along with the ordered list of the names it refers to
+    parts = list(string.Formatter().parse(template))
+    names = [name for _, name, _, _ in parts if name is not None]
+    return "".join(text.replace("%", "%%") + ("%s" if name is not None else "") for text, name, _, _ in parts), names
+
+TCP_COMPLETE_TEXT = (
+    "<b>Client</b> <br>"
+    "IP Address:  {c_ip}<br>"
+    "Port Number: {c_pt}<br>"
+    "Application Bytes: {c_app_byts} B ~ {c_app_human}<br>"
+    "Application Pakts: {c_app_pkts}<br>"
+    "Pure ACKs:  {c_pure_ack_pkts}<br>"
+    "     ACKs:  {c_ack_pkts}<br>"
+    "--------------------------<br>"
+
+    "<b>Server</b> <br>"
+    "IP Address:  {s_ip}<br>"
+    "Port Number: {s_pt}<br>"
+    "Application Bytes: {s_app_byts} B ~ {s_app_human}<br>"
+    "Application Pakts: {s_app_pkts}<br>"
+    "Pure ACKs:  {s_pure_ack_pkts} <br>"
+    "     ACKs:  {s_ack_pkts}<br>"
+    "--------------------------<br>"
+
+    "<b>Timing</b> <br>"
+    "Start  [millis]: {ts}<br>"
+    "Finish [millis]: {te}<br>"
+    "Span [millis]: {millis_span}<br>"
+    "Span [secnds]: {secnds_span}<br>"
+    "Span [mintes]: {minuts_span}<br>"
+
+    "Application Proto: {proto}<br>"
+    "Application Token: <b>{token}</b><br>")
+
+TCP_PERIODIC_TEXT = (
+    "<b>Client</b> <br>"
+    "IP Address:  {c_ip}<br>"
+    "Port Number: {c_pt}<br>"
+    "Application Bytes: {c_app_byts} B ~ {c_app_human}<br>"
+    "Application Rate:  {c_app_rate}<br>"
+    "Application Pakts: {c_app_pkts}<br>"
+    "Pure ACKs:  {c_pure_ack_pkts}<br>"
+    "     ACKs:  {c_ack_pkts}<br>"
+    "--------------------------<br>"
+
+    "<b>Server</b> <br>"
+    "IP Address:  {s_ip}<br>"
+    "Port Number: {s_pt}<br>"
+    "Application Bytes: {s_app_byts} B ~ {s_app_human}<br>"
+    "Application Rate:  {s_app_rate}<br>"
+    "Application Pakts: {s_app_pkts}<br>"
+    "Pure ACKs:  {s_pure_ack_pkts} <br>"
+    "     ACKs:  {s_ack_pkts}<br>"
+    "--------------------------<br>"
+
+    "<b>Timing</b> <br>"
+    "Start  [millis]: {ts}<br>"
+    "Finish [millis]: {te}<br>"
+    "Span [millis]: {millis_span}<br>"
+    "Span [secnds]: {secnds_span}<br>"
+    "Span [mintes]: {minuts_span}<br>"
+
+    "Application Token: <b>{token}</b><br>")
+
+TCP_COMPLETE_TEMPLATE = compile_template(TCP_COMPLETE_TEXT)
+TCP_PERIODIC_TEMPLATE = compile_template(TCP_PERIODIC_TEXT)
+
+# UDP flows have the same fields but the ACKs (see tstat.UDP_COMPLETE_COLUMNS)
+UDP_COMPLETE_TEXT = re.sub(r"(Pure)? +ACKs: +\{\w+\} ?<br>", "", TCP_COMPLETE_TEXT)
+UDP_PERIODIC_TEXT = re.sub(r"(Pure)? +ACKs: +\{\w+\} ?<br>", "", TCP_PERIODIC_TEXT)
+
+UDP_COMPLETE_TEMPLATE = compile_template(UDP_COMPLETE_TEXT)
+UDP_PERIODIC_TEMPLATE = compile_template(UDP_PERIODIC_TEXT)
+
+# Fields of the periodic text that stay the same along a flow
+FLOW_FIELDS = ["c_ip", "s_ip", "c_pt", "s_pt", "token"]
+
+# The other fields, as (numeric column of customdata, d3 format, unit) for a plotly hovertemplate
+BIN_FIELDS = {
+    "ts": ("ts", ".2f", ""), "te": ("te", ".2f", ""),
+    "millis_span": ("millis_span", ".2f", ""), "secnds_span": ("secnds_span", ".2f", ""), "minuts_span": ("minuts_span", ".2f", ""),
+    "c_app_byts": ("c_app_byts", ".2f", ""), "c_app_human": ("c_app_byts", ".3s", "B"), "c_app_rate": ("c_app_rate", ".3s", "bps"),
+    "s_app_byts": ("s_app_byts", ".2f", ""), "s_app_human": ("s_app_byts", ".3s", "B"), "s_app_rate": ("s_app_rate", ".3s", "bps"),
+    "c_app_pkts": ("c_app_pkts", "d", ""), "s_app_pkts": ("s_app_pkts", "d", ""),
+    "c_ack_pkts": ("c_ack_pkts", "d", ""), "s_ack_pkts": ("s_ack_pkts", "d", ""),
+    "c_pure_ack_pkts": ("c_pure_ack_pkts", "d", ""), "s_pure_ack_pkts": ("s_pure_ack_pkts", "d", ""),
+}
+
+def tcp_descriptions(frame: pandas.DataFrame, periodic: bool) -> pandas.Series:
+
+    # Columnar counterpart of tcp_description: every field is formatted
+    # on whole columns, then each row is filled by a single "%" operation
+    ts = frame["ts"].to_numpy()
+    te = frame["te"].to_numpy()
+
+    ts_secnds = ts // 1000
+    te_secnds = te // 1000
+
+    fields = {
+        "ts": format_fixed(ts, spec="2.2f"),
+        "te": format_fixed(te, spec="2.2f"),
+        "millis_span": format_fixed(te - ts, spec="4.2f"),
+        "secnds_span": format_fixed(te_secnds - ts_secnds, spec="4.2f"),
+        "minuts_span": format_fixed(te_secnds // 60 - ts_secnds // 60, spec="4.2f"),
+        "c_app_human": bytes_to_human_readable_array(frame["c_app_byts"].to_numpy()),
+        "s_app_human": bytes_to_human_readable_array(frame["s_app_byts"].to_numpy()),
+    }
+
+    udp = "c_ack_pkts" not in frame.columns
+    for column in ["c_ip", "s_ip", "c_pt", "s_pt", "token", "c_app_pkts", "s_app_pkts"] + \
+                  ([] if udp else ["c_ack_pkts", "s_ack_pkts", "c_pure_ack_pkts", "s_pure_ack_pkts"]):
+        fields[column] = format_plain(frame[column])
+
+    if periodic:
+        template, names = UDP_PERIODIC_TEMPLATE if udp else TCP_PERIODIC_TEMPLATE
+        fields["c_app_byts"] = format_fixed(frame["c_app_byts"].to_numpy(), spec="4.2f")
+        fields["s_app_byts"] = format_fixed(frame["s_app_byts"].to_numpy(), spec="4.2f")
+        fields["c_app_rate"] = bitrate_to_human_readable_array(frame["c_app_byts"].to_numpy(), frame["size"].to_numpy())
+        fields["s_app_rate"] = bitrate_to_human_readable_array(frame["s_app_byts"].to_numpy(), frame["size"].to_numpy())
+    else:
+        template, names = UDP_COMPLETE_TEMPLATE if udp else TCP_COMPLETE_TEMPLATE
+        fields["c_app_byts"] = format_plain(frame["c_app_byts"])
+        fields["s_app_byts"] = format_plain(frame["s_app_byts"])
+        fields["proto"] = format_plain(frame["proto"])
+
+    return pandas.Series([template % values for values in zip(*[fields[name] for name in names])],
+                         index=frame.index, dtype=object)
+
+def flow_hover(frame: pandas.DataFrame):
+
+    # The periodic text of the bins of one flow as a plotly hovertemplate: the fields of
+    # the flow are written once in the template, those of the bins are numeric columns
+    # of customdata (much lighter than one text per bin)
+    ts = frame["ts"].to_numpy(dtype=float)
+    te = frame["te"].to_numpy(dtype=float)
+    size = frame["size"].to_numpy(dtype=float)
+
+    columns = {"ts": ts, "te": te, "millis_span": te - ts,
+               "secnds_span": te // 1000 - ts // 1000, "minuts_span": te // 1000 // 60 - ts // 1000 // 60}
+    udp = "c_ack_pkts" not in frame.columns
+    for column, _, _ in BIN_FIELDS.values():
+        if column in frame.columns:
+            columns[column] = frame[column].to_numpy(dtype=float)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        for side in ("c", "s"):
+            columns[f"{side}_app_rate"] = numpy.where(size > 0, columns[f"{side}_app_byts"] * 8 / (size / 1000), 0.0)
+
+    names = list(columns)
+    flow  = {name: str(frame[name].iloc[0]) if len(frame) else "" for name in FLOW_FIELDS}
+    parts = []
+    for text, name, _, _ in string.Formatter().parse(UDP_PERIODIC_TEXT if udp else TCP_PERIODIC_TEXT):
+        parts.append(text)
+        if name in flow:
+            parts.append(flow[name])
+        elif name is not None:
+            column, spec, unit = BIN_FIELDS[name]
+            parts.append(f"%{{customdata[{names.index(column)}]:{spec}}}{unit}")
+
+    return "".join(parts) + "<extra></extra>", numpy.column_stack([columns[name] for name in names])
+
+@profiled
+def with_descriptions(frame: pandas.DataFrame, periodic: bool) -> pandas.DataFrame:
+
+    # Descriptions are generated for the rows being drawn only (they would
+    # otherwise be the largest column of the frames kept in memory)
+    return frame.assign(info=tcp_descriptions(frame, periodic=periodic))
+
+def prepare_tcp_complete(complete: pandas.DataFrame):
 
     # Generate a date-time object from timestamps
     complete["ts_datetime"] = pandas.to_datetime(arg=complete["ts"], unit="ms", origin="unix")  # ts (start of the flow)
     complete["te_datetime"] = pandas.to_datetime(arg=complete["te"], unit="ms", origin="unix")  # te (end of the flow)
 
+@profiled
 def prepare_tcp_periodic(periodic: pandas.DataFrame):
 
-    # Generate a description for each flow
-    periodic["info"] = periodic.apply(lambda record: tcp_description(record, periodic=True), axis=1)
-
     # Generate a date-time object from timestamps
     periodic["ts_datetime"] = pandas.to_datetime(arg=periodic["ts"], unit="ms", origin="unix")  # ts (start of the flow)
     periodic["te_datetime"] = pandas.to_datetime(arg=periodic["te"], unit="ms", origin="unix")  # te (end of the flow)
 
+def add_bot_markers(figure: plotly.graph_objects.Figure, bot_complete: pandas.DataFrame, 
+                    datetime: bool = True, window: tuple[float, float] | None = None):
+
+    # Restrict the actions to the plotted time window (in milliseconds)
+    if window is not None:
+        bot_complete = bot_complete.loc[(bot_complete["from"] >= window[0]) & (bot_complete["from"] <= window[1])]
+
+    xs = pandas.to_datetime(bot_complete["from"], unit="ms", origin="unix") if datetime else bot_complete["from"]
+
+    # Dotted line for each action
+    shapes = [dict(type="line", 
+                   x0=x0, y0=0, 
+                   x1=x0, y1=1, yref="paper",
+                   line=dict(color="red", width=0.4, dash="dot")) for x0 in xs]
+
+    # Annotation at the top and at the bottom
+    annotations = [dict(x=x0, y=y, yref="paper",
+                        text=action,
+                        showarrow=False,
+                        arrowhead=2, 
+                        ax=0, 
+                        ay=ay, 
+                        textangle=90,
+                        xanchor="left" if y == 1  else "right",
+                        yanchor="top"  if y == 1  else "bottom", 
+                        font=dict(family="Courier New", size=10, color="black", weight="bold")) 
+                   for x0, action in zip(xs, bot_complete["action"]) for y, ay in [(1, -40), (0, 40)]]
+
+    # A single layout update: add_shape/add_annotation validate the layout on every call
+    figure.update_layout(shapes=list(figure.layout.shapes) + shapes, 
+                         annotations=list(figure.layout.annotations) + annotations)
+
+# Above this number of bars, timelines are drawn as an aggregated heatmap
+LOD_THRESHOLD = 2000
+LOD_TIME_BINS = 400
+LOD_ROW_BINS  = 200
+
+def select_window(frame: pandas.DataFrame, window: tuple[float, float] | None) -> pandas.DataFrame:
+
+    # Rows overlapping the time window (in milliseconds)
+    if window is None:
+        return frame
+    return frame.loc[(frame["te"] >= window[0]) & (frame["ts"] <= window[1])]
+
+def lod_grid(ts: numpy.ndarray, te: numpy.ndarray, rows: numpy.ndarray, values: numpy.ndarray, 
+             start: float, end: float, time_bins: int = LOD_TIME_BINS, row_bins: int = LOD_ROW_BINS):
+
+    # Every [ts, te] interval spreads its value uniformly over time, and is
+    # accumulated onto a (row group x time bin) grid without Python loops
+    end   = max(end, start + 1.0)
+    width = (end - start) / time_bins
+    rows  = numpy.asarray(rows, dtype=numpy.int64)
+    group = max(1, -(-(int(rows.max()) + 1) // row_bins)) if len(rows) else 1
+    nrows = (int(rows.max()) // group + 1) if len(rows) else 1
+
+    r = rows // group
+    a = numpy.clip(ts, start, end)
+    b = numpy.clip(te, start, end)
+    ia = numpy.minimum(((a - start) // width).astype(numpy.int64), time_bins - 1)
+    ib = numpy.minimum(((b - start) // width).astype(numpy.int64), time_bins - 1)
+
+    duration = te - ts
+    rate = numpy.divide(values, duration, out=numpy.zeros(len(values)), where=duration > 0)
+
+    def accumulate(mask, cols, weights):
+        return numpy.bincount(r[mask] * (time_bins + 1) + cols[mask], weights=weights[mask], 
+                              minlength=nrows * (time_bins + 1)).reshape(nrows, time_bins + 1)
+
+    # Instantaneous intervals fall entirely in their bin
+    point = (duration <= 0) & (ts >= start) & (ts <= end)
+    grid  = numpy.zeros((nrows, time_bins + 1))
+    grid += accumulate(point, ia, values)
+
+    # Intervals within a single bin, then first and last (partial) bins of the others
+    span = duration > 0
+    same = span & (ia == ib)
+    many = span & (ia <  ib)
+    grid += accumulate(same, ia, rate * (b - a))
+    grid += accumulate(many, ia, rate * (start + (ia + 1) * width - a))
+    grid += accumulate(many, ib, rate * (b - (start + ib * width)))
+
+    # Bins fully covered in between, as a difference array along time
+    grid += numpy.cumsum(accumulate(many, ia + 1, rate * width) - accumulate(many, ib, rate * width), axis=1)
+
+    edges = start + width * numpy.arange(time_bins + 1)
+    return grid[:, :time_bins], edges, group
+
+@profiled
+def lod_timeline(frame: pandas.DataFrame, rows: numpy.ndarray, value: str, 
+                 window: tuple[float, float] | None, colorscale) -> plotly.graph_objects.Figure:
+
+    start, end = window if window is not None else (frame["ts"].min(), frame["te"].max())
+    grid, edges, group = lod_grid(frame["ts"].to_numpy(dtype=float), frame["te"].to_numpy(dtype=float), rows, 
+                                  frame[value].to_numpy(dtype=float), start, end)
+
+    # One image-like trace, whatever the number of flows or bins
+    x = pandas.to_datetime((edges[:-1] + edges[1:]) / 2, unit="ms", origin="unix")
+    y = numpy.arange(grid.shape[0]) * group
+
+    # Bytes and packets are counts: integers keep the serialized figure small
+    grid = numpy.rint(grid).astype(numpy.int64)
+
+    figure = plotly.graph_objects.Figure(plotly.graph_objects.Heatmap(z=grid, x=x, y=y, colorscale=colorscale, 
+                                                                      colorbar=dict(title=value),
+                                                                      hovertemplate=f"%{{x}}<br>Rows from %{{y}} ({group} each)<br>{value}: %{{z:.0f}}<extra></extra>"))
+    figure.update_layout(height=800)
+    return figure
+
+@profiled
 def tcp_complete_timeline(tcp_complete: pandas.DataFrame, 
-                          bot_complete: pandas.DataFrame, feature: str | None):
+                          bot_complete: pandas.DataFrame, feature: str | None, window: tuple[float, float] | None = None):
+
+    tcp_complete = select_window(tcp_complete, window)
+    lod = len(tcp_complete) > LOD_THRESHOLD
 
-    if feature:
+    if lod:
+        figure = lod_timeline(tcp_complete, rows=numpy.arange(len(tcp_complete)), value=feature or "s_app_byts", 
+                              window=window, colorscale=plotly.express.colors.sequential.Electric)
+    elif feature:
+        tcp_complete = with_descriptions(tcp_complete, periodic=False)
         figure = plotly.express.timeline(data_frame=tcp_complete, 
                                          x_start="ts_datetime", x_end="te_datetime", y="id",
                                          color=feature,
                                          custom_data=["info"], opacity=1.0, height=800)
     else:
+        tcp_complete = with_descriptions(tcp_complete, periodic=False)
         figure = plotly.express.timeline(data_frame=tcp_complete, 
                                         x_start="ts_datetime", x_end="te_datetime", y="id",
                                         template='plotly_dark',
@@ -156,60 +523,52 @@ def tcp_complete_timeline(tcp_complete: pandas.DataFrame,
                                         color="token",
                                         custom_data=["info"],opacity=1.0, height=800)
     
-    figure.update_traces(hovertemplate="%{customdata[0]}",
-                         hoverlabel=dict(bgcolor='white', font_size=16, font_family="Courier New"), 
-                         opacity=0.7, width=1.0)
+    if not lod:
+        figure.update_traces(hovertemplate="%{customdata[0]}",
+                             hoverlabel=dict(bgcolor='white', font_size=16, font_family="Courier New"), 
+                             opacity=0.7, width=1.0)
 
     # Define the x-axis interval
-    xs = pandas.to_datetime(bot_complete["from"].min(), unit="ms", origin="unix")
-    xe = pandas.to_datetime(bot_complete["from"].max(), unit="ms", origin="unix")
+    xs, xe = window if window is not None else (bot_complete["from"].min(), bot_complete["from"].max())
+    xs = pandas.to_datetime(xs, unit="ms", origin="unix")
+    xe = pandas.to_datetime(xe, unit="ms", origin="unix")
 
     # Define the x-axis range
     xvalues = pandas.date_range(start=xs, end=xe, freq="20s")
     xlabels = [v.strftime("%M:%S") for v in xvalues]
 
-    # Define the y-axis range
-    yvalues = [i for i in range(0, len(tcp_complete))]
-    ylabels = [f"{i}" for i, record in tcp_complete.iterrows()]
+    if lod:
+        figure.update_yaxes(gridwidth=0.03, 
+                            title="Flow Identifier (aggregated)", showgrid=True,
+                            title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    else:
+        # Define the y-axis range
+        yvalues = list(range(0, len(tcp_complete)))
+        ylabels = tcp_complete.index.astype(str).tolist()
 
-    figure.update_yaxes(gridwidth=0.03, 
-                        title="Flow Identifier", showgrid=True,
-                        tickvals=yvalues, ticktext=ylabels, 
-                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+        figure.update_yaxes(gridwidth=0.03, 
+                            title="Flow Identifier", showgrid=True,
+                            tickvals=yvalues, ticktext=ylabels, 
+                            title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
     
     figure.update_xaxes(gridwidth=0.03, 
                         title="Time (minutes:seconds)", showgrid=True,
                         tickvals=xvalues, ticktext=xlabels, 
                         title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10)) 
 
-    n = len(tcp_complete)
-    for _, record in bot_complete.iterrows():
-        x0 = pandas.to_datetime(record["from"], unit="ms", origin="unix")
-
-        # Dotted line
-        figure.add_shape(dict(type="line", 
-                            x0=x0, y0=0, 
-                            x1=x0, y1=n,
-                            line=dict(color="red", width=0.4, dash="dot")))
-
-        # Annotation at the top
-        for y, ay in [(1, -40), (0, 40)]:
-            figure.add_annotation(x=x0, y=y, yref="paper",
-                                text=record["action"],
-                                showarrow=False,
-                                arrowhead=2, 
-                                ax=0, 
-                                ay=ay, 
-                                textangle=90,
-                                xanchor="left" if y == 1  else "right",
-                                yanchor="top"  if y == 1  else "bottom", 
-                                font=dict(family="Courier New", size=10, color="black", weight="bold"))
-            
+    # Keep the axis on the window (markers would otherwise stretch it)
+    if window is not None:
+        figure.update_xaxes(range=[xs, xe])
+
+    add_bot_markers(figure, bot_complete)
     return figure
 
 
+@profiled
 def tcp_periodic_timeline(tcp_periodic: pandas.DataFrame, 
-                          bot_complete: pandas.DataFrame, token: str, id: str | None, feature: str | None):
+                          bot_complete: pandas.DataFrame, token: str, id: str | None, feature: str | None,
+                          window: tuple[float, float] | None = None, index: FlowIndex | None = None,
+                          chunks: pandas.DataFrame | None = None):
     
     def get_line_color(feature):
         if "s_app" in feature:
@@ -222,60 +581,116 @@ def tcp_periodic_timeline(tcp_periodic: pandas.DataFrame,
         #########################################################
         # Periodic all flows that are associated to a given token
         #########################################################
-        data = tcp_periodic.loc[tcp_periodic["token"] == token]
-        figure = plotly.express.timeline(data_frame=data, 
-                                         x_start="ts_datetime", x_end="te_datetime", y="id",
-                                         color_continuous_scale=plotly.express.colors.sequential.Agsunset, 
-                                         #template='plotly_dark', 
-                                         color="id",
-                                         custom_data=["info"], 
-                                         opacity=1.0, height=800)
-
-        figure.update_traces(hovertemplate="%{customdata[0]}", 
-                             hoverlabel=dict(bgcolor='white', font_size=16, font_family="Courier New"), 
-                             opacity=0.7, width=1.0)
+        if index is not None:
+            data = select_window(index.token_bins(token), window)
+            ids  = index.token_ids.get(token, [])
+        else:
+            data = select_window(tcp_periodic.loc[tcp_periodic["token"] == token], window)
+            ids  = list(pandas.unique(data["id"]))
+
+        if len(data) > LOD_THRESHOLD:
+            # Too many bins: aggregate them, one row per connection (in order of start)
+            rows = pandas.Categorical(data["id"], categories=list(dict.fromkeys(ids + list(pandas.unique(data["id"]))))).codes
+            figure = lod_timeline(data, rows=rows, value="s_app_byts", 
+                                  window=window, colorscale=plotly.express.colors.sequential.Agsunset)
+        else:
+            data = with_descriptions(data, periodic=True)
+            figure = plotly.express.timeline(data_frame=data, 
+                                             x_start="ts_datetime", x_end="te_datetime", y="id",
+                                             color_continuous_scale=plotly.express.colors.sequential.Agsunset, 
+                                             #template='plotly_dark', 
+                                             color="id",
+                                             category_orders={"id": ids},
+                                             custom_data=["info"], 
+                                             opacity=1.0, height=800)
+
+            figure.update_traces(hovertemplate="%{customdata[0]}", 
+                                 hoverlabel=dict(bgcolor='white', font_size=16, font_family="Courier New"), 
+                                 opacity=0.7, width=1.0)
         
         # Define the x-axis interval
-        xs = pandas.to_datetime(bot_complete["from"].min(), unit="ms", origin="unix")
-        xe = pandas.to_datetime(bot_complete["from"].max(), unit="ms", origin="unix")
+        xs, xe = window if window is not None else (bot_complete["from"].min(), bot_complete["from"].max())
+        xs = pandas.to_datetime(xs, unit="ms", origin="unix")
+        xe = pandas.to_datetime(xe, unit="ms", origin="unix")
 
         # Define the x-axis range
         xvalues = pandas.date_range(start=xs, end=xe, freq="20s")
         xlabels = [v.strftime("%M:%S") for v in xvalues]
 
-        # Define the y-axis range
-        ylabels: dict[str] = {i: i.replace("#", " ") for i in data["id"].unique()}
-
-        # Update the y-axis description
-        figure.update_yaxes(gridwidth=0.03, 
-                            title="Connection Id", showgrid=True,
-                            tickvals=list(ylabels.keys()), 
-                            ticktext=list(ylabels.values()),
-                            title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10)) 
+        if len(data) > LOD_THRESHOLD:
+            figure.update_yaxes(gridwidth=0.03, 
+                                title="Connection Id (aggregated)", showgrid=True,
+                                title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+        else:
+            # Define the y-axis range
+            ylabels: dict[str] = {i: i.replace("#", " ") for i in data["id"].unique()}
+
+            # Update the y-axis description
+            figure.update_yaxes(gridwidth=0.03, 
+                                title="Connection Id", showgrid=True,
+                                tickvals=list(ylabels.keys()), 
+                                ticktext=list(ylabels.values()),
+                                title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10)) 
+
+        # Keep the axis on the window (markers would otherwise stretch it)
+        if window is not None:
+            figure.update_xaxes(range=[xs, xe])
+
+        add_bot_markers(figure, bot_complete)
         
     else:
         #########################################################
         # Periodic all flows that are associated to a given id
         #########################################################
-        select = tcp_periodic.loc[tcp_periodic["id"] == id]
+        flow   = index.flow_bins(id) if index is not None else tcp_periodic.loc[tcp_periodic["id"] == id]
+        select = select_window(flow, window)
         figure = plotly.graph_objects.Figure()
 
-        for i, record in select.iterrows():
-
-            xs = "ts"
-            xe = "te"
-            ys = feature
-            ye = feature
-
-            trace = plotly.graph_objects.Scatter(x=[record[xs], record[xe]], y=[record[ys], record[ye]],
-                                                 line=dict(color=get_line_color(feature), width=2),
-                                                 name=record["info"], hoverinfo="text", 
-                                                 text=record["info"])
-            figure.add_trace(trace)
+        # Span of the x-axis: the bins drawn, or the window (or the whole flow) when none falls in it
+        if len(select):
+            start, end = select["ts"].min(), select["te"].max()
+        elif window is not None:
+            start, end = window
+        elif len(flow):
+            start, end = flow["ts"].min(), flow["te"].max()
+        else:
+            start, end = bot_complete["from"].min(), bot_complete["from"].max()
+
+        # A single WebGL trace for the whole flow: each bin is a horizontal
+        # segment (ts, value) -> (te, value), segments are split by NaN gaps
+        gaps = numpy.full(len(select), numpy.nan)
+        x = numpy.column_stack([select["ts"].to_numpy(dtype=float), select["te"].to_numpy(dtype=float), gaps]).ravel()
+        y = numpy.column_stack([select[feature].to_numpy(dtype=float), select[feature].to_numpy(dtype=float), gaps]).ravel()
+
+        trace = plotly.graph_objects.Scattergl(x=x, y=y, mode="lines", connectgaps=False, hoverinfo="skip",
+                                               line=dict(color=get_line_color(feature), width=2))
+        figure.add_trace(trace)
+
+        # The hover is on the start of each bin only, with numeric customdata (see flow_hover)
+        template, customdata = flow_hover(select)
+        figure.add_trace(plotly.graph_objects.Scattergl(x=select["ts"].to_numpy(dtype=float), y=select[feature].to_numpy(dtype=float),
+                                                        mode="markers", marker=dict(color=get_line_color(feature), size=3),
+                                                        customdata=customdata, hovertemplate=template))
+
+        if chunks is not None and len(chunks):
+            # Download chunks of the flow (see src.chunks): one segment above the bins for each of them
+            chunks = select_window(chunks.rename(columns={"start": "ts", "end": "te"}), window)
+            top  = 1.05 * float(select[feature].max()) if len(select) else 1.0
+            gaps = numpy.full(len(chunks), numpy.nan)
+            x = numpy.column_stack([chunks["ts"].to_numpy(dtype=float), chunks["te"].to_numpy(dtype=float), gaps]).ravel()
+            y = numpy.column_stack([numpy.full(len(chunks), top), numpy.full(len(chunks), top), gaps]).ravel()
+            info = ("Chunk " + format_plain(chunks["chunk"]) + "<br>Size: " + bytes_to_human_readable_array(chunks["bytes"].to_numpy()) +
+                    "<br>Duration [millis]: " + format_fixed(chunks["duration"].to_numpy(dtype=float), spec="4.2f") +
+                    "<br>Gap [millis]: " + format_plain(chunks["gap"].round(2).astype(object).fillna("-")) +
+                    "<br>Rate: " + bitrate_to_human_readable_array(chunks["bytes"].to_numpy(), chunks["duration"].to_numpy()))
+            text = numpy.column_stack([info, info, numpy.full(len(chunks), "", dtype=object)]).ravel()
+            figure.add_trace(plotly.graph_objects.Scattergl(x=x, y=y, mode="lines+markers", connectgaps=False,
+                                                            line=dict(color="rgba(255, 140, 0, 0.9)", width=4), marker=dict(size=5),
+                                                            customdata=text, hovertemplate="%{customdata}<extra></extra>"))
 
         # Define the x-axis range and ticks
-        xs = pandas.to_datetime(select["ts"].min(), unit="ms", origin="unix")
-        ye = pandas.to_datetime(select["te"].max(), unit="ms", origin="unix")
+        xs = pandas.to_datetime(start, unit="ms", origin="unix")
+        ye = pandas.to_datetime(end, unit="ms", origin="unix")
 
         # Generate x-axis values (timestamps in milliseconds)
         xvalues = pandas.date_range(start=xs, end=ye, freq="15s").astype(int) / 10**6
@@ -285,6 +700,9 @@ def tcp_periodic_timeline(tcp_periodic: pandas.DataFrame,
         figure.update_yaxes(gridwidth=0.03, 
                             title="# Bytes" if "byts" in feature else "# Packets", showgrid=True,
                             title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+
+        # Only the actions that happened during the flow (the x-axis is in milliseconds)
+        add_bot_markers(figure, bot_complete, datetime=False, window=(start, end))
         
     figure.update_xaxes(gridwidth=0.03, 
                         title="Time (minutes:seconds)", showgrid=True,
@@ -0,0 +1,358 @@
+import os
+import io
+import glob
+import json
+import math
+import hashlib
+import threading
+import collections
+import numpy
+import pandas
+import watchdog.events
+import watchdog.observers
+
+from src import tstat
+from src.lib import lod_grid
+from src.lib import prepare_tcp_complete
+from src.lib import prepare_tcp_periodic
+from src.loader import RAW_TCP_COMPLETE
+from src.loader import RAW_TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+
+#################################################################
+# Live mode: the raw Tstat logs and the bot trace of a running
+# experiment are followed while they grow. Only the complete lines
+# appended since the last refresh are parsed; each new chunk is
+# kept in memory, written as a Parquet part and its file offset is
+# persisted, so that a restarted server resumes from where it was
+# instead of reading the whole files again (unless a file was
+# replaced: another inode, or an older modification time). Events
+# of the file system (watchdog) tell when there is something to
+# read. The throughput of the experiment is accumulated on a fixed
+# grid chunk by chunk.
+#
+#   .cache/live/<experiment key>/state.json                    offsets, origin, files
+#   .cache/live/<experiment key>/<frame>-<start>-<end>.parquet  lines in [start, end)
+#################################################################
+
+LIVE_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "live")
+
+# Followed files, in the order they are read (the bot trace gives the origin)
+LIVE_FILES = {"bot_complete": BOT_COMPLETE, "tcp_complete": RAW_TCP_COMPLETE, "tcp_periodic": RAW_TCP_PERIODIC}
+
+# Step of the live throughput grid (milliseconds)
+LIVE_STEP = 1000
+
+# Parts of a frame on disk before they are merged into one
+MAX_PARTS = 64
+
+# Followed experiments, shared by every session (the least recently viewed are stopped)
+MAX_LIVE = 4
+experiments = collections.OrderedDict()
+lock = threading.Lock()
+
+def file_identity(path: str) -> list | None:
+
+    # (inode, modification time) of a followed file
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns]
+
+def replaced(saved: list | None, current: list | None) -> bool:
+
+    # Another file (or no file) where the lines were read: what was read from it is stale
+    return saved is not None and (current is None or current[0] != saved[0] or current[1] < saved[1])
+
+def read_appended(path: str, offset: int):
+
+    # -> (complete lines written after offset, new offset); None if the file was truncated
+    size = os.stat(path).st_size if os.path.exists(path) else 0
+    if size < offset:
+        return None, 0
+    if size == offset:
+        return b"", offset
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+
+    # A line still being written is read at the next refresh
+    data = data[:data.rfind(b"\n") + 1]
+    if offset == 0:
+        header = data.find(b"\n") + 1
+        return data[header:], len(data)
+    return data, offset + len(data)
+
+class LiveThroughput:
+
+    def __init__(self, step: float = LIVE_STEP):
+        self.step = step
+        self.down = numpy.zeros(0)
+        self.up   = numpy.zeros(0)
+
+    def add(self, bins: pandas.DataFrame):
+
+        # Only the grid cells covered by the new bins are computed
+        if len(bins) == 0:
+            return
+        ts = bins["ts"].to_numpy(dtype=float)
+        te = bins["te"].to_numpy(dtype=float)
+        first = max(0, math.floor(ts.min() / self.step))
+        last  = max(first + 1, math.ceil(te.max() / self.step) + 1)
+
+        if last > len(self.down):
+            size = max(last, 2 * len(self.down))
+            self.down = numpy.concatenate([self.down, numpy.zeros(size - len(self.down))])
+            self.up   = numpy.concatenate([self.up, numpy.zeros(size - len(self.up))])
+
+        rows = numpy.zeros(len(bins), dtype=numpy.int64)
+        for value, grid in (("s_app_byts", self.down), ("c_app_byts", self.up)):
+            part, _, _ = lod_grid(ts, te, rows, bins[value].to_numpy(dtype=float), first * self.step, last * self.step,
+                                  time_bins=last - first, row_bins=1)
+            grid[first:last] += part[0]
+
+    def curves(self, end: float | None = None):
+
+        # -> (left edge of each cell, [(name, bit/s)]) up to end (milliseconds)
+        cells = len(self.down) if end is None else min(len(self.down), math.ceil(end / self.step))
+        scale = 8 / (self.step / 1000)
+        return self.step * numpy.arange(cells), [("Downlink", self.down[:cells] * scale), ("Uplink", self.up[:cells] * scale)]
+
+class LiveWatcher(watchdog.events.FileSystemEventHandler):
+
+    def __init__(self, live):
+        self.live = live
+
+    def on_any_event(self, event):
+        if os.path.basename(event.src_path) in LIVE_FILES.values():
+            self.live.dirty.set()
+
+class LiveExperiment:
+
+    def __init__(self, path: str, folder: str = LIVE_FOLDER, step: float = LIVE_STEP):
+
+        self.path   = os.path.abspath(path)
+        self.folder = os.path.join(folder, hashlib.sha1(self.path.encode()).hexdigest()[:16])
+        self.lock   = threading.Lock()
+        self.dirty  = threading.Event()
+        self.dirty.set()
+        self.observer = None
+        self.step = step
+
+        self.reset(remove=False)
+        self.restore()
+
+    def reset(self, remove: bool = True):
+
+        # Back to empty frames (the files were truncated or replaced)
+        if remove:
+            for part in glob.glob(os.path.join(self.folder, "*.parquet")) + glob.glob(os.path.join(self.folder, "state.json")):
+                os.remove(part)
+        self.origin  = None
+        self.offsets = {name: 0 for name in LIVE_FILES}
+        self.files   = {name: None for name in LIVE_FILES}
+        self.chunks  = {name: [] for name in LIVE_FILES}
+        self.parts   = {name: [] for name in LIVE_FILES}
+        self.throughput = LiveThroughput(self.step)
+        self.cached = dict()
+
+        # Running values shown at every refresh (the whole frames are assembled only on demand)
+        self.counts = {name: 0 for name in LIVE_FILES}
+        self.now    = 0.0
+        self.last_action = None
+
+    def account(self, name: str, chunk: pandas.DataFrame):
+
+        # The running values, updated with a new chunk only
+        self.counts[name] += len(chunk)
+        self.cached.pop(name, None)
+        if len(chunk) == 0:
+            return
+        if name == "bot_complete":
+            self.last_action = chunk["action"].iloc[-1]
+        else:
+            self.now = max(self.now, float(chunk["te"].max()))
+        if name == "tcp_periodic":
+            self.throughput.add(chunk)
+
+    def restore(self):
+
+        # Parts and offsets of a former run on the same experiment
+        target = os.path.join(self.folder, "state.json")
+        if not os.path.exists(target):
+            return
+        with open(target, "r") as f:
+            state = json.load(f)
+
+        # Parts named by their start offset only (an older layout) are read again from the files
+        if any(os.path.basename(part).count("-") != 2 for part in glob.glob(os.path.join(self.folder, "*.parquet"))):
+            self.reset()
+            return
+
+        # So is a capture whose files were replaced since (even by larger ones)
+        files = state.get("files")
+        if files is None or any(replaced(files.get(name), file_identity(os.path.join(self.path, file))) for name, file in LIVE_FILES.items()):
+            self.reset()
+            return
+
+        self.origin  = state["origin"]
+        self.offsets = state["offsets"]
+        self.files   = files
+        for name in LIVE_FILES:
+            parts = []
+            for part in glob.glob(os.path.join(self.folder, f"{name}-*-*.parquet")):
+                start, end = os.path.basename(part)[len(name) + 1:-len(".parquet")].split("-")
+                parts.append((int(start), int(end), part))
+
+            # A part past the saved offset, or covered by a merged part, was left by an
+            # interrupted refresh: its lines are read again (or are already in the merged part)
+            covered = 0
+            for start, end, part in sorted(parts, key=lambda p: (p[0], -p[1])):
+                if end > self.offsets[name] or end <= covered:
+                    os.remove(part)
+                    continue
+                covered = end
+                chunk = pandas.read_parquet(part)
+                self.parts[name].append(part)
+                self.chunks[name].append(chunk)
+                self.account(name, chunk)
+
+    def save_state(self):
+        partial = os.path.join(self.folder, f"state.json.{os.getpid()}.tmp")
+        with open(partial, "w") as f:
+            json.dump({"origin": self.origin, "offsets": self.offsets, "files": self.files}, f)
+        os.replace(partial, os.path.join(self.folder, "state.json"))
+
+    def persist(self, name: str, chunk: pandas.DataFrame, end: int, identity: list):
+
+        # The part is written before the offset is saved: a part past the saved
+        # offset (the state was not written) is dropped by restore
+        os.makedirs(self.folder, exist_ok=True)
+        target = os.path.join(self.folder, f"{name}-{self.offsets[name]:016d}-{end:016d}.parquet")
+        chunk.to_parquet(target + ".tmp", index=False)
+        os.replace(target + ".tmp", target)
+        self.parts[name].append(target)
+        self.chunks[name].append(chunk)
+        self.offsets[name] = end
+        self.files[name] = identity
+        self.save_state()
+
+        # Many small parts are merged into one (and so are the chunks in memory); the
+        # merged part covers the others, which restore drops if they are still there
+        if len(self.parts[name]) > MAX_PARTS:
+            merged = pandas.concat(self.chunks[name], ignore_index=True)
+            start  = os.path.basename(self.parts[name][0])[len(name) + 1:].split("-")[0]
+            target = os.path.join(self.folder, f"{name}-{start}-{end:016d}.parquet")
+            merged.to_parquet(target + ".tmp", index=False)
+            os.replace(target + ".tmp", target)
+            for part in self.parts[name]:
+                os.remove(part)
+            self.parts[name]  = [target]
+            self.chunks[name] = [merged]
+
+    def parse(self, name: str, data: bytes) -> pandas.DataFrame:
+
+        path = os.path.join(self.path, LIVE_FILES[name])
+        if name == "bot_complete":
+            return pandas.read_csv(io.BytesIO(data), delimiter=" ", names=tstat.read_header(path))
+        if name == "tcp_complete":
+            frame = tstat.concat_chunks(tstat.iter_tcp_complete(path, origin=self.origin, data=data))
+            prepare_tcp_complete(complete=frame)
+            return frame
+
+        # Tokens of the bins are resolved when the frames are assembled (their flows may not be complete yet)
+        flows = pandas.DataFrame(columns=["id", "token", "proto"])
+        frame = tstat.concat_chunks(tstat.iter_tcp_periodic(path, origin=self.origin, flows=flows, data=data))
+        prepare_tcp_periodic(periodic=frame)
+        return frame
+
+    def refresh(self) -> int:
+
+        # -> number of new rows; nothing is read when no file changed since the last refresh
+        if self.observer is not None and not self.dirty.is_set():
+            return 0
+
+        with self.lock:
+            self.dirty.clear()
+            rows = 0
+            for name, file in LIVE_FILES.items():
+                if self.origin is None and name != "bot_complete":
+                    break
+
+                target = os.path.join(self.path, file)
+                identity = file_identity(target)
+                data, offset = read_appended(target, self.offsets[name])
+                if data is None or replaced(self.files[name], identity):
+                    self.reset()
+                    self.dirty.set()
+                    return rows
+                if not data:
+                    continue
+
+                chunk = self.parse(name, data)
+                if name == "bot_complete" and self.origin is None:
+                    origin = chunk.loc[chunk["action"] == "origin", "now"]
+                    self.origin = float(origin.iloc[0]) if len(origin) else None
+
+                self.persist(name, chunk, offset, identity)
+                self.account(name, chunk)
+                rows += len(chunk)
+
+            return rows
+
+    def frame(self, name: str) -> pandas.DataFrame:
+
+        # One followed frame, assembled again only after a refresh that added to it
+        with self.lock:
+            if name not in self.cached:
+                self.cached[name] = tstat.concat_chunks(self.chunks[name])
+            return self.cached[name]
+
+    def recent_flows(self, since: float) -> pandas.DataFrame:
+
+        # Complete flows that ended after since, from the newest chunks only
+        chunks = []
+        for chunk in reversed(self.chunks["tcp_complete"]):
+            if len(chunk) and chunk["te"].max() < since:
+                break
+            chunks.append(chunk.loc[chunk["te"] >= since])
+        return tstat.concat_chunks(reversed(chunks))
+
+    def start(self):
+
+        # Without file system notifications every refresh checks the sizes of the files
+        try:
+            observer = watchdog.observers.Observer()
+            observer.schedule(LiveWatcher(self), self.path, recursive=False)
+            observer.daemon = True
+            observer.start()
+            self.observer = observer
+        except OSError:
+            self.observer = None
+
+    def stop(self):
+
+        # A session still holding the follower checks the sizes of the files again
+        observer, self.observer = self.observer, None
+        if observer is not None:
+            observer.stop()
+        self.dirty.set()
+
+def live_experiment(path: str) -> LiveExperiment:
+
+    # One follower per experiment folder, whatever the number of sessions viewing it
+    path = os.path.abspath(path)
+    with lock:
+        if path in experiments:
+            experiments.move_to_end(path)
+            return experiments[path]
+
+        live = LiveExperiment(path)
+        live.start()
+        experiments[path] = live
+        while len(experiments) > MAX_LIVE:
+            _, evicted = experiments.popitem(last=False)
+            evicted.stop()
+        return live
@@ -0,0 +1,195 @@
+import os
+import functools
+import concurrent.futures
+import pandas
+
+from src.lib import prepare_tcp_complete
+from src.lib import prepare_tcp_periodic
+from src import tstat
+from src.index import FlowIndex
+from src.index import sort_flows
+from src.dns import dns_resolutions
+from src.dns import attach_resolutions
+from src.profiler import profiled
+from src.shared import shared_paths
+from src.shared import publish_frame
+from src.shared import remove_stale
+from src.shared import map_frame
+from src.schema import apply_schema
+from src.schema import TCP_COMPLETE_SCHEMA
+from src.schema import TCP_PERIODIC_SCHEMA
+from src.schema import BOT_COMPLETE_SCHEMA
+from src.schema import UDP_COMPLETE_SCHEMA
+from src.schema import UDP_PERIODIC_SCHEMA
+
+# Files that make up a single experiment
+TCP_COMPLETE = "log_tcp_complete.csv"
+TCP_PERIODIC = "log_tcp_periodic.csv"
+BOT_COMPLETE = "streambot_trace.csv"
+
+# Raw Tstat logs, used when the .csv files have not been derived
+RAW_TCP_COMPLETE = "log_tcp_complete"
+RAW_TCP_PERIODIC = "log_tcp_periodic"
+RAW_DNS_COMPLETE = "log_dns_complete"
+RAW_UDP_COMPLETE = "log_udp_complete"
+RAW_UDP_PERIODIC = "log_udp_periodic"
+
+# Maximum number of experiments kept in memory
+CACHE_SIZE = 8
+
+# ... and of their views (each maps only the columns it uses, see load_shared)
+VIEW_CACHE_SIZE = 8 * CACHE_SIZE
+
+# Frames published as memory-mapped Arrow files
+SHARED_FRAMES = ("tcp_complete", "tcp_periodic", "bot_complete")
+UDP_FRAMES    = ("udp_complete", "udp_periodic")
+
+# Columns of the flows and bins the token/flow index is built on (see src.index)
+INDEX_COLUMNS = ("token", "id", "ts")
+
+def read_frame(path: str) -> pandas.DataFrame:
+    return pandas.read_csv(path, delimiter=" ", engine="pyarrow")
+
+def file_stamp(path: str) -> int:
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+def experiment_stamps(path: str) -> tuple:
+
+    # The modification time of each file is part of the cache key,
+    # so that a re-generated experiment is never served stale
+    return tuple(file_stamp(os.path.join(path, name)) for name in (TCP_COMPLETE, TCP_PERIODIC, BOT_COMPLETE,
+                                                                   RAW_TCP_COMPLETE, RAW_TCP_PERIODIC, RAW_DNS_COMPLETE,
+                                                                   RAW_UDP_COMPLETE, RAW_UDP_PERIODIC))
+
+@profiled
+def read_experiment(path: str):
+
+    names = (TCP_COMPLETE, TCP_PERIODIC, BOT_COMPLETE)
+
+    if all(os.path.exists(os.path.join(path, name)) for name in names):
+        # Parse the three files concurrently (pyarrow releases the GIL)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(names)) as pool:
+            return tuple(pool.map(read_frame, [os.path.join(path, name) for name in names]))
+
+    # Fall back to the raw Tstat logs (periodic bins take the token of their flow)
+    bot_complete = read_frame(os.path.join(path, BOT_COMPLETE))
+    origin = tstat.read_origin(os.path.join(path, BOT_COMPLETE))
+
+    tcp_complete = tstat.read_tcp_complete(os.path.join(path, RAW_TCP_COMPLETE), origin=origin)
+    tcp_periodic = tstat.read_tcp_periodic(os.path.join(path, RAW_TCP_PERIODIC), origin=origin, flows=tcp_complete)
+
+    return tcp_complete, tcp_periodic, bot_complete
+
+def build_experiment(path: str):
+
+    tcp_complete, tcp_periodic, bot_complete = read_experiment(path)
+
+    prepare_tcp_complete(complete=tcp_complete)
+    prepare_tcp_periodic(periodic=tcp_periodic)
+
+    # Compact dtypes (see src.schema), then bins of the same token/flow are contiguous (see src.index)
+    tcp_complete = apply_schema(tcp_complete, TCP_COMPLETE_SCHEMA)
+    tcp_periodic = sort_flows(apply_schema(tcp_periodic, TCP_PERIODIC_SCHEMA))
+    bot_complete = apply_schema(bot_complete, BOT_COMPLETE_SCHEMA)
+
+    return tcp_complete, tcp_periodic, bot_complete
+
+def build_udp(path: str):
+
+    # UDP (and QUIC) flows are only in the raw Tstat logs: experiments without them have none
+    origin = tstat.read_origin(os.path.join(path, BOT_COMPLETE))
+    if os.path.exists(os.path.join(path, RAW_UDP_COMPLETE)):
+        udp_complete = tstat.read_udp_complete(os.path.join(path, RAW_UDP_COMPLETE), origin=origin)
+    else:
+        udp_complete = pandas.DataFrame(columns=list(tstat.UDP_COMPLETE_COLUMNS.values()) + ["ts", "te", "id", "token", "proto"])
+    if os.path.exists(os.path.join(path, RAW_UDP_PERIODIC)):
+        udp_periodic = tstat.read_udp_periodic(os.path.join(path, RAW_UDP_PERIODIC), origin=origin, flows=udp_complete)
+    else:
+        udp_periodic = pandas.DataFrame(columns=list(tstat.UDP_PERIODIC_COLUMNS.values()) + ["id", "te", "token", "proto"])
+
+    # Same derived columns, schema and sorting of the TCP frames
+    prepare_tcp_complete(complete=udp_complete)
+    prepare_tcp_periodic(periodic=udp_periodic)
+
+    udp_complete = apply_schema(udp_complete, UDP_COMPLETE_SCHEMA)
+    udp_periodic = sort_flows(apply_schema(udp_periodic, UDP_PERIODIC_SCHEMA))
+
+    return udp_complete, udp_periodic
+
+def load_shared(path: str, stamps: tuple, names: tuple, build, columns: tuple | None = None):
+
+    # Built by the first process that needs it, then mapped by all of them (see src.shared).
+    # Only the columns of the flows and bins a view uses are converted (the bot trace is small)
+    targets = shared_paths(path, stamps, names)
+    if not all(os.path.exists(target) for target in targets):
+        for frame, target in zip(build(path), targets):
+            publish_frame(frame, target)
+        remove_stale(targets)
+
+    return tuple(map_frame(target, None if name == "bot_complete" else columns) for name, target in zip(names, targets))
+
+def view_columns(columns, index: bool = False) -> tuple | None:
+
+    # Hashable key of a view (with the columns of the index when it is built on it)
+    if columns is None:
+        return None
+    return tuple(columns) + tuple(c for c in INDEX_COLUMNS if index and c not in columns)
+
+@functools.lru_cache(maxsize=VIEW_CACHE_SIZE)
+def _load_experiment(path: str, stamps: tuple, columns: tuple | None = None):
+    return load_shared(path, stamps, SHARED_FRAMES, build_experiment, columns)
+
+@functools.lru_cache(maxsize=VIEW_CACHE_SIZE)
+def _load_udp(path: str, stamps: tuple, columns: tuple | None = None):
+    return load_shared(path, stamps, UDP_FRAMES, build_udp, columns)
+
+@functools.lru_cache(maxsize=VIEW_CACHE_SIZE)
+def _load_udp_index(path: str, stamps: tuple, columns: tuple | None = None) -> FlowIndex:
+    return FlowIndex(*_load_udp(path, stamps, columns))
+
+@functools.lru_cache(maxsize=VIEW_CACHE_SIZE)
+def _load_index(path: str, stamps: tuple, columns: tuple | None = None) -> FlowIndex:
+    tcp_complete, tcp_periodic, _ = _load_experiment(path, stamps, columns)
+    return FlowIndex(tcp_complete, tcp_periodic)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_resolutions(path: str, stamps: tuple) -> pandas.DataFrame:
+
+    # Experiments without a DNS log have no resolution for any flow
+    tcp_complete, _, _ = _load_experiment(path, stamps, ("id", "token", "c_ip", "s_ip", "ts"))
+    target = os.path.join(path, RAW_DNS_COMPLETE)
+    if os.path.exists(target):
+        dns_complete = tstat.read_dns_complete(target, origin=tstat.read_origin(os.path.join(path, BOT_COMPLETE)))
+    else:
+        dns_complete = pandas.DataFrame(columns=tstat.DNS_COLUMNS)
+    return attach_resolutions(tcp_complete, dns_resolutions(dns_complete))
+
+def load_experiment(path: str, columns: tuple | None = None):
+
+    # The returned frames are shared among every session that
+    # is viewing the same experiment: do not modify them in place.
+    # columns: the ones of the flows and bins the caller uses (all of them by default)
+    path = os.path.abspath(path)
+    return _load_experiment(path, experiment_stamps(path), view_columns(columns))
+
+def load_index(path: str, columns: tuple | None = None) -> FlowIndex:
+
+    # Built once per loaded experiment, on top of the same (shared) frames
+    path = os.path.abspath(path)
+    return _load_index(path, experiment_stamps(path), view_columns(columns, index=True))
+
+def load_resolutions(path: str) -> pandas.DataFrame:
+
+    # One row per flow of tcp_complete, with the DNS resolution of its server (see src.dns)
+    path = os.path.abspath(path)
+    return _load_resolutions(path, experiment_stamps(path))
+
+def load_udp(path: str, columns: tuple | None = None):
+
+    # UDP/QUIC flows and bins, loaded and shared as the TCP ones (read-only as well)
+    path = os.path.abspath(path)
+    return _load_udp(path, experiment_stamps(path), view_columns(columns))
+
+def load_udp_index(path: str, columns: tuple | None = None) -> FlowIndex:
+    path = os.path.abspath(path)
+    return _load_udp_index(path, experiment_stamps(path), view_columns(columns, index=True))
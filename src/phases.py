@@ -0,0 +1,108 @@
+import numpy
+import pandas
+import plotly.express
+
+#################################################################
+# Attribution of the periodic bins to the phases of the bot. A
+# phase goes from an action of streambot_trace.csv to the next
+# one. Every bin [ts, te] spreads its bytes and packets uniformly
+# over time, and is split across the phases it overlaps: the
+# phases are located with searchsorted on the sorted action
+# times, and the phases fully covered by a long bin are filled
+# with a difference array, so there is no loop over the bins.
+#################################################################
+
+PHASE_COUNTERS = ["c_app_byts", "s_app_byts", "c_app_pkts", "s_app_pkts"]
+
+# Tokens drawn on their own in the stacked chart (the others are summed)
+TOP_TOKENS = 12
+
+def bot_phases(bot_complete: pandas.DataFrame) -> pandas.DataFrame:
+
+    # A phase goes from an action to the following one
+    bot = bot_complete.sort_values(by="from", kind="stable", ignore_index=True)
+    return pandas.DataFrame({"phase": bot["action"].iloc[:-1].to_numpy(dtype=object),
+                             "start": bot["from"].iloc[:-1].to_numpy(dtype=float),
+                             "end":   bot["from"].iloc[1:].to_numpy(dtype=float)})
+
+def split_by_phase(ts: numpy.ndarray, te: numpy.ndarray, values: numpy.ndarray, groups: numpy.ndarray,
+                   ngroups: int, bounds: numpy.ndarray) -> numpy.ndarray:
+
+    # values: (bins x counters), bounds: the k + 1 sorted edges of k phases
+    # -> (groups x phases x counters), the parts of the bins outside every phase are dropped
+    nphases = len(bounds) - 1
+    a = numpy.clip(ts, bounds[0], bounds[-1])
+    b = numpy.clip(te, bounds[0], bounds[-1])
+    ia = numpy.clip(numpy.searchsorted(bounds, a, side="right") - 1, 0, nphases - 1)
+    ib = numpy.clip(numpy.searchsorted(bounds, b, side="left") - 1, 0, nphases - 1)
+
+    duration = te - ts
+    span = duration > 0
+    rate = numpy.divide(values, duration[:, None], out=numpy.zeros_like(values), where=span[:, None])
+
+    def accumulate(mask, phases, weights):
+        flat = groups[mask] * (nphases + 1) + phases[mask]
+        return numpy.stack([numpy.bincount(flat, weights=weights[mask, j], minlength=ngroups * (nphases + 1))
+                            for j in range(values.shape[1])], axis=-1).reshape(ngroups, nphases + 1, values.shape[1])
+
+    # Instantaneous bins belong to the phase they fall in
+    # (bincount gives integers when no bin is selected: the total starts as floats, as in lib.lod_grid)
+    point = ~span & (ts >= bounds[0]) & (ts <= bounds[-1])
+    total = numpy.zeros((ngroups, nphases + 1, values.shape[1]))
+    total += accumulate(point, ia, values)
+
+    # Bins within a phase, then the first and last (partial) phases of the others
+    same = span & (ia == ib)
+    many = span & (ia < ib)
+    total += accumulate(same, ia, rate * (b - a)[:, None])
+    total += accumulate(many, ia, rate * (bounds[ia + 1] - a)[:, None])
+    total += accumulate(many, ib, rate * (b - bounds[ib])[:, None])
+
+    # Phases fully covered in between: the rate, as a difference array along the phases
+    covered = numpy.cumsum(accumulate(many, ia + 1, rate) - accumulate(many, ib, rate), axis=1)
+    total += covered * numpy.append(numpy.diff(bounds), 0)[None, :, None]
+
+    return total[:, :nphases, :]
+
+def phase_volumes(tcp_periodic: pandas.DataFrame, bot_complete: pandas.DataFrame) -> pandas.DataFrame:
+
+    # Volume and bitrate of each (phase, token); bins without a token are "unknown"
+    phases = bot_phases(bot_complete)
+    if len(phases) == 0:
+        return pandas.DataFrame(columns=["phase", "start", "end", "token"] + PHASE_COUNTERS + ["c_bitrate", "s_bitrate"])
+
+    bounds = numpy.append(phases["start"].to_numpy(), phases["end"].iloc[-1])
+    codes, tokens = pandas.factorize(tcp_periodic["token"].astype(object).fillna("unknown"))
+
+    total = split_by_phase(tcp_periodic["ts"].to_numpy(dtype=float), tcp_periodic["te"].to_numpy(dtype=float),
+                           tcp_periodic[PHASE_COUNTERS].to_numpy(dtype=float), codes, len(tokens), bounds)
+
+    # One row per (phase, token), in order of phase
+    table = pandas.DataFrame(total.transpose(1, 0, 2).reshape(-1, len(PHASE_COUNTERS)), columns=PHASE_COUNTERS)
+    table.insert(0, "token", numpy.tile(numpy.asarray(tokens, dtype=object), len(phases)))
+    for column in ("end", "start", "phase"):
+        table.insert(0, column, numpy.repeat(phases[column].to_numpy(), len(tokens)))
+
+    # Bitrate in bit/s over the duration of the phase
+    duration = (table["end"] - table["start"]).to_numpy() / 1000
+    for side in ("c", "s"):
+        table[f"{side}_bitrate"] = numpy.divide(table[f"{side}_app_byts"].to_numpy() * 8, duration,
+                                                out=numpy.full(len(table), numpy.nan), where=duration > 0)
+
+    return table.loc[table[PHASE_COUNTERS].to_numpy().any(axis=1)].reset_index(drop=True)
+
+def phase_chart(volumes: pandas.DataFrame, value: str = "s_bitrate"):
+
+    # The largest tokens on their own, the others summed as "other"
+    top = volumes.groupby("token")[value].sum().nlargest(TOP_TOKENS).index
+    data = volumes.assign(token=volumes["token"].where(volumes["token"].isin(top), "other"))
+    data = data.groupby(["phase", "start", "token"], as_index=False, sort=False)[value].sum().sort_values(by="start", kind="stable")
+
+    figure = plotly.express.bar(data_frame=data, x="phase", y=value, color="token", barmode="stack",
+                                category_orders={"phase": list(dict.fromkeys(data["phase"])),
+                                                 "token": list(top) + ["other"]},
+                                height=500)
+    figure.update_yaxes(title="Bitrate [bit/s]" if "bitrate" in value else ("# Bytes" if "byts" in value else "# Packets"),
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    figure.update_xaxes(title="Bot phase", title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    return figure
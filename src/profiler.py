@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+import contextlib
+import tracemalloc
+import pandas
+import streamlit
+import plotly.io
+
+#################################################################
+# Opt-in profiling of a page run. Stages of a page and figure
+# builders are timed (wall time and tracemalloc peak), and the
+# serialized size of every chart sent to the browser is recorded.
+# The records of a run are shown in the sidebar and appended to
+# a JSONL log, one line per record.
+#
+# Profiling is off unless PORTAL_PROFILE is set, or it is turned
+# on from the sidebar. Memory is traced process-wide, and only while
+# a profiled run is in progress: with several sessions running at
+# once the peaks are only indicative.
+#
+# A fragment that reruns alone (start_run is not called) is a run
+# of its own, shown at the bottom of the fragment (a fragment can
+# not write to the sidebar); in a full run it is one of its stages.
+#################################################################
+
+LOG_PATH = os.environ.get("PORTAL_PROFILE_LOG", os.path.join(os.path.dirname(__file__), "..", "logs", "profile.jsonl"))
+
+# Records of the run in progress (every session runs its script in its own thread)
+state = threading.local()
+
+# Session state keys of the sidebar toggle and of the page of the last full run
+TOGGLE_KEY = "profiling"
+PAGE_KEY   = "profiling_page"
+
+# Threads with a profiled run in progress: memory is traced while there is at least one
+tracing = set()
+tracing_lock = threading.Lock()
+
+def is_enabled() -> bool:
+    return getattr(state, "records", None) is not None
+
+def start_run(page: str):
+
+    enabled = streamlit.sidebar.toggle("Profiling", value=bool(os.environ.get("PORTAL_PROFILE")), key=TOGGLE_KEY,
+                                       help="Time each stage of the page and measure the charts sent to the browser")
+    streamlit.session_state[PAGE_KEY] = page
+    begin_run(page, enabled)
+
+def trace_memory(enabled: bool):
+
+    # The threads of runs that never reached end_run (their script stopped) are dropped as well
+    with tracing_lock:
+        tracing.intersection_update(thread.ident for thread in threading.enumerate())
+        if enabled:
+            tracing.add(threading.get_ident())
+        else:
+            tracing.discard(threading.get_ident())
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+def begin_run(page: str, enabled: bool):
+
+    state.records = [] if enabled else None
+    state.peaks = []
+    state.page = page
+    state.run = uuid.uuid4().hex
+    trace_memory(enabled)
+
+def record(kind: str, name: str, **values):
+    state.records.append(dict(kind=kind, name=name, **values))
+
+@contextlib.contextmanager
+def stage(name: str, kind: str = "stage"):
+
+    if not is_enabled():
+        yield
+        return
+
+    # Stages can be nested: the peak of the enclosing ones is saved before resetting it
+    peaks = state.peaks
+    if peaks:
+        peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    peaks.append(base)
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        record(kind, name, depth=len(peaks), seconds=round(elapsed, 6), peak_bytes=peak - base)
+
+def profiled(function):
+
+    # Functions (figure builders, loaders) are recorded by their name
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(function.__name__, kind="function"):
+            return function(*args, **kwargs)
+    return wrapper
+
+def plotly_chart(figure_or_data, name: str | None = None, **kwargs):
+
+    # Size of the figure once serialized (what travels to the browser)
+    if is_enabled():
+        name = name or f"chart-{sum(r['kind'] == 'chart' for r in state.records)}"
+        with stage(name, kind="chart"):
+            size = len(plotly.io.to_json(figure_or_data, validate=False))
+        state.records[-1]["json_bytes"] = size
+    return streamlit.plotly_chart(figure_or_data=figure_or_data, **kwargs)
+
+def profiled_fragment(function):
+
+    # Goes below the fragment decorator: the fragment body is the run (or a stage of the full run)
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if is_enabled() or not streamlit.session_state.get(TOGGLE_KEY, False):
+            with stage(function.__name__):
+                return function(*args, **kwargs)
+
+        begin_run(f"{streamlit.session_state.get(PAGE_KEY)}/{function.__name__}", enabled=True)
+        try:
+            with stage(function.__name__):
+                return function(*args, **kwargs)
+        finally:
+            end_run(panel=streamlit.expander("Profiling"))
+    return wrapper
+
+def end_run(panel=None):
+
+    if not is_enabled():
+        return
+
+    # The run is over even if showing or logging it fails
+    try:
+        frame = pandas.DataFrame(state.records)
+        with panel or streamlit.sidebar:
+            streamlit.markdown("#### Profiling")
+            streamlit.caption(f"Total: {frame.loc[frame['depth'] == 0, 'seconds'].sum():.3f} s, "
+                              f"charts: {frame.get('json_bytes', pandas.Series(dtype=float)).sum() / 1024:.0f} KB")
+            streamlit.dataframe(frame, hide_index=True)
+
+        now = time.time()
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        with open(LOG_PATH, "a") as f:
+            for r in state.records:
+                f.write(json.dumps(dict(time=now, page=state.page, run=state.run, **r)) + "\n")
+    finally:
+        state.records = None
+        trace_memory(False)
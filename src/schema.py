@@ -0,0 +1,90 @@
+import numpy
+import pandas
+
+#################################################################
+# Compact in-memory schema of the loaded frames. Repeated strings
+# (addresses, tokens, protocols, flow identifiers of the bins) are
+# categoricals, strings that are unique per row are Arrow strings,
+# and counters are downcast to the declared integer type whenever
+# their values fit in it (otherwise they are left as they are).
+# Integers are signed: plotly express takes unsigned columns for
+# discrete values. Timestamps stay float64: hover texts print them
+# with 2 decimals.
+#################################################################
+
+CATEGORY = "category"
+STRING   = "string[pyarrow]"
+
+TCP_COUNTERS = ["all_pkts", "rst_pkts", "ack_pkts", "pure_ack_pkts", "app_byts", "app_pkts",
+                "rxt_pkts", "rxt_byts", "ooo_pkts", "syn_pkts", "fin_pkts"]
+
+TCP_COMMON = {
+    "c_ip": CATEGORY, "c_pt": "int32",
+    "s_ip": CATEGORY, "s_pt": "int32",
+    **{f"{side}_{name}": "int32" for side in ("c", "s") for name in TCP_COUNTERS},
+    "token": CATEGORY,
+    "proto": CATEGORY,
+}
+
+TCP_COMPLETE_SCHEMA = {
+    **TCP_COMMON,
+    "protocol": "int32",
+    "s_origin_tls_chello": CATEGORY,
+    "s_origin_tls_shello": CATEGORY,
+    "c_http_version": "int16",
+    "s_http_version": "int16",
+    "s_origin_dns_request": CATEGORY,
+    "s_hostname": CATEGORY,
+    "id": STRING,
+}
+
+TCP_PERIODIC_SCHEMA = {
+    **TCP_COMMON,
+    "id": CATEGORY,
+}
+
+UDP_COMMON = {
+    "c_ip": CATEGORY, "c_pt": "int32",
+    "s_ip": CATEGORY, "s_pt": "int32",
+    **{f"{side}_{name}": "int32" for side in ("c", "s") for name in ("app_byts", "app_pkts")},
+    "token": CATEGORY,
+    "proto": CATEGORY,
+}
+
+UDP_COMPLETE_SCHEMA = {
+    **UDP_COMMON,
+    "s_origin_quic_sni": CATEGORY,
+    "c_quic_version": CATEGORY,
+    "s_origin_dns_request": CATEGORY,
+    "id": STRING,
+}
+
+UDP_PERIODIC_SCHEMA = {
+    **UDP_COMMON,
+    "id": CATEGORY,
+}
+
+BOT_COMPLETE_SCHEMA = {
+    "action": STRING,
+}
+
+def narrow(series: pandas.Series, dtype: str) -> pandas.Series:
+
+    if dtype in (CATEGORY, STRING):
+        return series.astype(dtype)
+
+    # Integer columns only, and only if no value would overflow
+    if not pandas.api.types.is_integer_dtype(series.dtype) or len(series) == 0:
+        return series
+    info = numpy.iinfo(dtype)
+    if series.min() < info.min or series.max() > info.max:
+        return series
+    return series.astype(dtype)
+
+def apply_schema(frame: pandas.DataFrame, schema: dict) -> pandas.DataFrame:
+
+    # Columns that are not in the schema (or not in the frame) are left untouched
+    return frame.assign(**{c: narrow(frame[c], dtype) for c, dtype in schema.items() if c in frame.columns})
+
+def memory_usage(frame: pandas.DataFrame) -> int:
+    return int(frame.memory_usage(deep=True).sum())
@@ -0,0 +1,94 @@
+import os
+import glob
+import json
+import hashlib
+import functools
+import pandas
+import pyarrow
+import pyarrow.ipc
+
+#################################################################
+# Loaded experiments are published once as Arrow IPC files and
+# memory-mapped by every process that needs them. Columns are
+# wrapped by pandas without copying, so the pages of a file are
+# read from disk only when a column is used, and they are shared
+# (page cache) among all the server processes viewing the same
+# experiment instead of being parsed and held by each of them.
+# A view maps only the columns it uses: each column is converted
+# once per process (categories and strings are the only ones that
+# are not zero-copy) and shared by every view that has it.
+# Mapped frames are read-only.
+#
+#   .cache/arrow/<experiment key>-<version key>.<frame>.arrow
+#################################################################
+
+SHARED_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "arrow")
+
+def source_version(names: tuple) -> str:
+
+    # Hash of the source files that produce a cached artifact
+    digest = hashlib.sha1()
+    for name in names:
+        with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Code that shapes the loaded frames (parsing, derived columns, schema, sorting)
+VERSION = source_version(("loader.py", "lib.py", "schema.py", "index.py", "tstat.py", "shared.py"))
+
+def shared_paths(path: str, stamps: tuple, names: tuple, folder: str = SHARED_FOLDER) -> list[str]:
+    key   = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    stamp = hashlib.sha1(json.dumps([stamps, VERSION]).encode()).hexdigest()[:16]
+    return [os.path.join(folder, f"{key}-{stamp}.{name}.arrow") for name in names]
+
+def publish_frame(frame: pandas.DataFrame, target: str):
+
+    # Uncompressed IPC file (compressed buffers could not be mapped),
+    # written to a temporary file first so readers never see a partial one
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    partial = f"{target}.{os.getpid()}.tmp"
+    with pyarrow.OSFile(partial, "wb") as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, target)
+
+def remove_stale(targets: list[str]):
+
+    # Files of former versions of the same experiment
+    for target in targets:
+        key = os.path.basename(target).split("-")[0]
+        name = os.path.basename(target).split(".", 1)[1]
+        for old in glob.glob(os.path.join(os.path.dirname(target), f"{key}-*.{name}")):
+            if old != target:
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
+# Strings stay Arrow strings over the mapped buffers (instead of Python objects)
+STRING_TYPES = {pyarrow.string(): pandas.StringDtype("pyarrow"), pyarrow.large_string(): pandas.StringDtype("pyarrow")}
+
+# Converted columns kept per process (a few experiments of a few frames each)
+COLUMN_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=64)
+def map_table(target: str) -> pyarrow.Table:
+    return pyarrow.ipc.open_file(pyarrow.memory_map(target, "r")).read_all()
+
+@functools.lru_cache(maxsize=COLUMN_CACHE_SIZE)
+def map_column(target: str, column: str) -> pandas.Series:
+
+    # Zero-copy: numeric columns point into the mapped file
+    series = map_table(target).column(column).to_pandas(types_mapper=STRING_TYPES.get)
+    series.name = column
+    return series
+
+def map_frame(target: str, columns: list[str] | None = None) -> pandas.DataFrame:
+
+    # The columns asked for (all of them by default), put side by side without copying
+    table = map_table(target)
+    names = table.column_names if columns is None else [c for c in columns if c in table.column_names]
+    if not names:
+        return pandas.DataFrame(index=pandas.RangeIndex(table.num_rows))
+    return pandas.concat([map_column(target, name) for name in names], axis=1, copy=False)
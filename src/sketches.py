@@ -0,0 +1,229 @@
+import os
+import json
+import hashlib
+import multiprocessing
+import concurrent.futures
+import numpy
+import pandas
+import pyarrow
+import pyarrow.csv
+
+from src import tstat
+from src.loader import TCP_COMPLETE
+from src.loader import TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+from src.loader import RAW_TCP_COMPLETE
+from src.loader import RAW_TCP_PERIODIC
+from src.catalog import load_catalog
+from src.catalog import DATA_FOLDER
+from src.shared import source_version
+
+#################################################################
+# Distributions over the whole archive, in bounded memory. Values
+# are counted in logarithmic buckets (bucket i holds the values in
+# (MIN_VALUE * GAMMA^(i-1), MIN_VALUE * GAMMA^i]), so any quantile
+# is known within a relative error of (GAMMA - 1) / 2 and two
+# sketches merge exactly by adding their counts. A sketch is a
+# long table (token, metric, bucket, count): the files of an
+# experiment are read block by block, every block is reduced to
+# its counts, and experiments are merged by a groupby sum.
+#
+#   duration    complete flows, te - ts [ms]
+#   bytes       complete flows, server bytes
+#   throughput  periodic bins with server bytes, bit/s
+#
+#   .cache/sketches/<experiment key>-<version key>.parquet   one experiment
+#   .cache/sketches/archive.parquet (+ .json)                  all of them
+#################################################################
+
+SKETCH_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "sketches")
+VERSION = source_version(("sketches.py", "tstat.py"))
+
+METRICS = ("duration", "bytes", "throughput")
+
+# ~1% relative accuracy; values down to MIN_VALUE (smaller ones, and zeros, are in bucket 0)
+GAMMA     = 1.02
+MIN_VALUE = 1e-3
+
+BLOCK_SIZE = 16 << 20
+
+KEYS = ["service", "device", "qos"]
+
+def bucket_of(values: numpy.ndarray) -> numpy.ndarray:
+    values = numpy.asarray(values, dtype=float)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        buckets = numpy.ceil(numpy.log(values / MIN_VALUE) / numpy.log(GAMMA))
+    return numpy.where(values > MIN_VALUE, buckets, 0).astype(numpy.int32)
+
+def bucket_value(buckets: numpy.ndarray) -> numpy.ndarray:
+
+    # Value with the smallest relative error over the bucket
+    buckets = numpy.asarray(buckets, dtype=float)
+    return numpy.where(buckets > 0, MIN_VALUE * 2 * GAMMA ** buckets / (GAMMA + 1), 0.0)
+
+def count_values(tokens: numpy.ndarray, metric: str, values: numpy.ndarray) -> pandas.DataFrame:
+
+    # One block -> its (token, bucket) counts
+    keep = numpy.isfinite(values)
+    frame = pandas.DataFrame({"token": tokens[keep], "bucket": bucket_of(values[keep])})
+    table = frame.groupby(["token", "bucket"], sort=False, dropna=False).size().reset_index(name="count")
+    table.insert(1, "metric", metric)
+    return table
+
+def merge_sketches(tables: list[pandas.DataFrame], by: list[str]) -> pandas.DataFrame:
+    tables = [t for t in tables if len(t)]
+    if not tables:
+        return pandas.DataFrame(columns=by + ["token", "metric", "bucket", "count"])
+    merged = pandas.concat(tables, ignore_index=True)
+    return merged.groupby(by + ["token", "metric", "bucket"], sort=True, dropna=False)["count"].sum().reset_index()
+
+def iter_csv(path: str, columns: list[str], block_size: int = BLOCK_SIZE):
+
+    # The derived .csv files, block by block (only the columns needed)
+    types = {c: pyarrow.string() if c == "token" else pyarrow.float64() for c in columns}
+    reader = pyarrow.csv.open_csv(path, read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+                                  parse_options=pyarrow.csv.ParseOptions(delimiter=" "),
+                                  convert_options=pyarrow.csv.ConvertOptions(include_columns=columns, column_types=types))
+    for batch in reader:
+        yield batch.to_pandas()
+
+def experiment_blocks(path: str, block_size: int = BLOCK_SIZE):
+
+    # -> ("complete" | "periodic", block) pairs, from the .csv files or from the raw logs
+    if all(os.path.exists(os.path.join(path, name)) for name in (TCP_COMPLETE, TCP_PERIODIC)):
+        for block in iter_csv(os.path.join(path, TCP_COMPLETE), ["ts", "te", "s_app_byts", "token"], block_size):
+            yield "complete", block
+        for block in iter_csv(os.path.join(path, TCP_PERIODIC), ["size", "s_app_byts", "token"], block_size):
+            yield "periodic", block
+        return
+
+    origin = tstat.read_origin(os.path.join(path, BOT_COMPLETE))
+    flows = []
+    for block in tstat.iter_tcp_complete(os.path.join(path, RAW_TCP_COMPLETE), origin, block_size):
+        flows.append(block[["id", "token", "proto"]])
+        yield "complete", block
+    for block in tstat.iter_tcp_periodic(os.path.join(path, RAW_TCP_PERIODIC), origin, tstat.concat_chunks(flows), block_size):
+        yield "periodic", block
+
+def experiment_sketch(path: str, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+
+    tables = []
+    for kind, block in experiment_blocks(path, block_size):
+        tokens = block["token"].astype(object).fillna("unknown").to_numpy()
+        byts = block["s_app_byts"].to_numpy(dtype=float)
+        if kind == "complete":
+            tables.append(count_values(tokens, "duration", (block["te"] - block["ts"]).to_numpy(dtype=float)))
+            tables.append(count_values(tokens, "bytes", byts))
+        else:
+            size = block["size"].to_numpy(dtype=float)
+            busy = (size > 0) & (byts > 0)
+            tables.append(count_values(tokens[busy], "throughput", byts[busy] * 8 / (size[busy] / 1000)))
+
+        # Blocks are merged as they come: memory is bounded by the number of buckets
+        if len(tables) > 16:
+            tables = [merge_sketches(tables, by=[])]
+
+    return merge_sketches(tables, by=[])
+
+def sketch_path(entry: dict, folder: str = SKETCH_FOLDER) -> str:
+    key   = entry["path"].replace(os.sep, "_")
+    stamp = hashlib.sha1(json.dumps([entry["files"], VERSION], sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(folder, f"{key}-{stamp}.parquet")
+
+def compute_sketch(path: str, target: str) -> str | None:
+
+    # Runs in a worker process: the sketch is written there, only errors travel back
+    try:
+        table = experiment_sketch(path)
+    except Exception as e:
+        # Any failure (a missing column, a malformed line, a capture without its origin yet)
+        # is recorded, so that the experiment is not tried again until its files change
+        error = f"missing column {e}" if isinstance(e, KeyError) else f"{type(e).__name__}: {e}"
+        with open(f"{target}.error", "w") as f:
+            f.write(error)
+        return error
+
+    partial = f"{target}.{os.getpid()}.tmp"
+    table.to_parquet(partial, index=False)
+    os.replace(partial, target)
+    return None
+
+def sketch_archive(data: str = DATA_FOLDER, workers: int | None = None, folder: str = SKETCH_FOLDER):
+
+    # -> (sketch of every experiment by service/device/qos/token/metric, errors)
+    catalog = load_catalog(data)
+    os.makedirs(folder, exist_ok=True)
+    targets = {key: sketch_path(entry, folder) for key, entry in catalog.items()}
+    errors  = dict()
+    missing = dict()
+    for key, target in targets.items():
+        if os.path.exists(f"{target}.error"):
+            with open(f"{target}.error", "r") as f:
+                errors[key] = f.read()
+        elif not os.path.exists(target):
+            missing[key] = target
+
+    if missing:
+        # Spawned workers: forking a multi-threaded server process is not safe
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {key: pool.submit(compute_sketch, os.path.join(data, key), target) for key, target in missing.items()}
+            for key, future in futures.items():
+                error = future.result()
+                if error is not None:
+                    errors[key] = error
+
+    # The merged sketch is kept with the parts it is made of: new experiments are
+    # added to it, it is built again from the parts only when one was changed or removed
+    parts = sorted(target for key, target in targets.items() if key not in errors and os.path.exists(target))
+    merged, manifest = os.path.join(folder, "archive.parquet"), os.path.join(folder, "archive.json")
+    included = []
+    if os.path.exists(merged) and os.path.exists(manifest):
+        with open(manifest, "r") as f:
+            included = json.load(f)
+
+    if included == parts:
+        return pandas.read_parquet(merged), errors
+
+    if set(included) <= set(parts) and included:
+        base, pending = [pandas.read_parquet(merged)], [p for p in parts if p not in set(included)]
+    else:
+        base, pending = [], parts
+
+    keys = {target: key for key, target in targets.items()}
+    tables = []
+    for part in pending:
+        table = pandas.read_parquet(part)
+        for k in reversed(KEYS):
+            table.insert(0, k, catalog[keys[part]][k])
+        tables.append(table)
+    table = merge_sketches(base + tables, by=KEYS)
+
+    table.to_parquet(f"{merged}.{os.getpid()}.tmp", index=False)
+    os.replace(f"{merged}.{os.getpid()}.tmp", merged)
+    with open(f"{manifest}.{os.getpid()}.tmp", "w") as f:
+        json.dump(parts, f)
+    os.replace(f"{manifest}.{os.getpid()}.tmp", manifest)
+    return table, errors
+
+def sketch_cdf(sketch: pandas.DataFrame, by: list[str]) -> pandas.DataFrame:
+
+    # -> (by..., value, cdf): the share of values up to each bucket
+    table = sketch.groupby(by + ["bucket"], sort=True)["count"].sum().reset_index()
+    counts = table.groupby(by, sort=False)["count"]
+    table["cdf"] = counts.cumsum() / counts.transform("sum")
+    table["value"] = bucket_value(table["bucket"].to_numpy())
+    return table
+
+def sketch_quantiles(sketch: pandas.DataFrame, by: list[str], qs: tuple = (0.5, 0.9, 0.99)) -> pandas.DataFrame:
+
+    # -> one row per group, one column per quantile (the first bucket whose CDF reaches q)
+    cdf = sketch_cdf(sketch, by)
+    rows = []
+    for key, group in cdf.groupby(by, sort=True):
+        values = group["value"].to_numpy()
+        found = numpy.searchsorted(group["cdf"].to_numpy(), numpy.asarray(qs) - 1e-12)
+        rows.append(dict(zip(by, key if isinstance(key, tuple) else (key,))) | \
+                    {f"p{int(q * 100)}": values[min(i, len(values) - 1)] for q, i in zip(qs, found)} | \
+                    {"count": int(group["count"].sum())})
+    return pandas.DataFrame(rows)
@@ -0,0 +1,103 @@
+import os
+import pandas
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
+import pyarrow.parquet
+
+from src.loader import TCP_COMPLETE
+from src.loader import TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+from src.loader import read_frame
+from src.index import SORTING
+
+#################################################################
+# Experiments are stored as one Parquet dataset per Tstat table,
+# Hive-partitioned as in the data folder:
+#
+#   <store>/<table>/service=<s>/device=<d>/qos=<q>/experiment=<e>/part-0.parquet
+#
+# Rows are sorted by (token, id, ts) and written in small row
+# groups, so that the min/max statistics of each row group let
+# pyarrow skip everything but the selected token or flow.
+#################################################################
+
+TABLES = {
+    "tcp_complete": TCP_COMPLETE,
+    "tcp_periodic": TCP_PERIODIC,
+    "bot_complete": BOT_COMPLETE,
+}
+
+PARTITIONS = pyarrow.schema([("service", pyarrow.string()),
+                             ("device",  pyarrow.string()),
+                             ("qos",     pyarrow.string()),
+                             ("experiment", pyarrow.string())])
+
+ROW_GROUP_SIZE = 16384
+COMPRESSION = "zstd"
+
+def partition_path(store: str, table: str, service: str, device: str, qos: str, experiment: str) -> str:
+    return os.path.join(store, table, f"service={service}", f"device={device}", f"qos={qos}", f"experiment={experiment}")
+
+def is_ingested(path: str, store: str, service: str, device: str, qos: str, experiment: str) -> bool:
+
+    # An experiment is up to date when every table is newer than its source file
+    # (without the source it is not: ingesting it reports the missing file)
+    for table, name in TABLES.items():
+        source = os.path.join(path, name)
+        target = os.path.join(partition_path(store, table, service, device, qos, experiment), "part-0.parquet")
+        if not os.path.exists(source) or not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+            return False
+    return True
+
+def ingest_experiment(path: str, store: str, service: str, device: str, qos: str, experiment: str):
+
+    for table, name in TABLES.items():
+        frame = read_frame(os.path.join(path, name))
+
+        # Keep rows of the same token/flow together
+        if table != "bot_complete":
+            if not set(SORTING).issubset(frame.columns):
+                raise ValueError(f"{os.path.join(path, name)} does not have the {SORTING} columns")
+            frame = frame.sort_values(by=SORTING, kind="stable", ignore_index=True)
+
+        folder = partition_path(store, table, service, device, qos, experiment)
+        os.makedirs(folder, exist_ok=True)
+
+        # Write to a temporary file first, so readers never see a partial partition
+        target = os.path.join(folder, "part-0.parquet")
+        partial = os.path.join(folder, ".part-0.parquet")
+        pyarrow.parquet.write_table(pyarrow.Table.from_pandas(frame, preserve_index=False), partial,
+                                    compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+        os.replace(partial, target)
+
+def open_table(store: str, table: str) -> pyarrow.dataset.Dataset:
+    return pyarrow.dataset.dataset(os.path.join(store, table), format="parquet",
+                                   partitioning=pyarrow.dataset.partitioning(PARTITIONS, flavor="hive"),
+                                   ignore_prefixes=[".", "_"], exclude_invalid_files=False)
+
+def query_table(store: str, table: str,
+                service: str | None = None, device: str | None = None, qos: str | None = None, experiment: str | None = None,
+                token: str | None = None, id: str | None = None, columns: list[str] | None = None) -> pandas.DataFrame:
+
+    # Partition keys prune whole directories, token/id prune row groups
+    conditions = [(pyarrow.compute.field(key) == value) for key, value in [("service", service),  ("device", device),
+                                                                          ("qos", qos), ("experiment", experiment),
+                                                                          ("token", token), ("id", id)] if value is not None]
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    dataset = open_table(store, table)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+def list_experiments(store: str) -> pandas.DataFrame:
+
+    # Only the partition columns are needed: no data page is read
+    dataset = open_table(store, "bot_complete")
+    return (dataset.to_table(columns=PARTITIONS.names).to_pandas()
+                   .drop_duplicates()
+                   .sort_values(by=PARTITIONS.names, ignore_index=True))
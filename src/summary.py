@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import multiprocessing
+import concurrent.futures
+import pandas
+
+from src.loader import read_experiment
+from src.catalog import load_catalog
+from src.catalog import DATA_FOLDER
+from src.shared import source_version
+from src.phases import phase_volumes
+from src.phases import PHASE_COUNTERS
+
+#################################################################
+# Per-experiment aggregates, computed for every experiment of the
+# catalog by a pool of processes and cached on disk (one Parquet
+# file per experiment and table), so that a new experiment is the
+# only one computed when it is added to the archive.
+#
+#   tokens      bytes, packets, flows and retransmissions per token
+#   experiment  the same totals for the whole experiment
+#   phases      server/client volume and bitrate between two bot actions
+#################################################################
+
+SUMMARY_FOLDER = os.path.join(os.path.dirname(__file__), "..", ".cache", "summary")
+TABLES  = ("tokens", "experiment", "phases")
+VERSION = source_version(("summary.py", "phases.py", "loader.py", "tstat.py"))
+
+KEYS = ["service", "device", "qos", "experiment"]
+
+COUNTERS = ["c_app_byts", "s_app_byts", "c_app_pkts", "s_app_pkts",
+            "c_all_pkts", "s_all_pkts", "c_rxt_pkts", "s_rxt_pkts", "s_rxt_byts"]
+
+def volume_table(frame: pandas.DataFrame, by: list[str]) -> pandas.DataFrame:
+
+    if by:
+        grouped = frame.groupby(by, sort=True, observed=True)
+        table = grouped[COUNTERS].sum()
+        table["flows"] = grouped.size()
+        table = table.reset_index()
+    else:
+        table = frame[COUNTERS].sum().to_frame().T
+        table["flows"] = len(frame)
+
+    table["rxt_ratio"] = (table["c_rxt_pkts"] + table["s_rxt_pkts"]) / (table["c_all_pkts"] + table["s_all_pkts"])
+    return table
+
+def phase_table(tcp_periodic: pandas.DataFrame, bot_complete: pandas.DataFrame) -> pandas.DataFrame:
+
+    # Bins are split across the phases they overlap (see src.phases)
+    volumes = phase_volumes(tcp_periodic, bot_complete)
+    table = volumes.groupby(["phase", "start", "end"], as_index=False, sort=False)[PHASE_COUNTERS + ["c_bitrate", "s_bitrate"]].sum()
+    return table.sort_values(by="start", kind="stable", ignore_index=True)
+
+def summarize_experiment(path: str) -> dict:
+
+    tcp_complete, tcp_periodic, bot_complete = read_experiment(path)
+
+    experiment = volume_table(tcp_complete, by=[])
+    experiment["span"] = float(bot_complete["from"].max() - bot_complete["from"].min())
+    experiment["s_bitrate"] = experiment["s_app_byts"] * 8 / (experiment["span"] / 1000)
+    experiment["c_bitrate"] = experiment["c_app_byts"] * 8 / (experiment["span"] / 1000)
+
+    return dict(tokens=volume_table(tcp_complete, by=["token"]), experiment=experiment,
+                phases=phase_table(tcp_periodic, bot_complete))
+
+def summary_paths(entry: dict, folder: str = SUMMARY_FOLDER) -> dict:
+
+    # Keyed by the experiment and by the stamps of its files (as in the catalog)
+    key   = entry["path"].replace(os.sep, "_")
+    stamp = hashlib.sha1(json.dumps([entry["files"], VERSION], sort_keys=True).encode()).hexdigest()[:16]
+    return {table: os.path.join(folder, f"{key}-{stamp}.{table}.parquet") for table in TABLES} | \
+           {"error": os.path.join(folder, f"{key}-{stamp}.error")}
+
+def compute_summary(path: str, targets: dict) -> str | None:
+
+    # Runs in a worker process: the tables are written there, only errors travel back
+    try:
+        tables = summarize_experiment(path)
+    except Exception as e:
+        # A missing column or file, a log that cannot be parsed, a capture without its origin yet...
+        # Recorded as well, so that the experiment is not tried again until its files change
+        error = f"missing column {e}" if isinstance(e, KeyError) else f"{type(e).__name__}: {e}"
+        with open(targets["error"], "w") as f:
+            f.write(error)
+        return error
+
+    for table, frame in tables.items():
+        partial = f"{targets[table]}.{os.getpid()}.tmp"
+        frame.to_parquet(partial, index=False)
+        os.replace(partial, targets[table])
+    return None
+
+def summarize_archive(data: str = DATA_FOLDER, workers: int | None = None, folder: str = SUMMARY_FOLDER):
+
+    catalog = load_catalog(data)
+    os.makedirs(folder, exist_ok=True)
+
+    # Only the experiments without a summary for their current files are computed
+    pending = {key: summary_paths(entry, folder) for key, entry in catalog.items()}
+    errors  = {}
+    missing = {}
+    for key, targets in pending.items():
+        if os.path.exists(targets["error"]):
+            with open(targets["error"], "r") as f:
+                errors[key] = f.read()
+        elif not all(os.path.exists(targets[table]) for table in TABLES):
+            missing[key] = targets
+
+    if missing:
+        # Spawned workers: forking a multi-threaded server process is not safe
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {key: pool.submit(compute_summary, os.path.join(data, key), targets) for key, targets in missing.items()}
+            for key, future in futures.items():
+                error = future.result()
+                if error is not None:
+                    errors[key] = error
+
+    tables = {table: [] for table in TABLES}
+    for key, targets in pending.items():
+        if key in errors or not all(os.path.exists(targets[table]) for table in TABLES):
+            continue
+        for table in TABLES:
+            frame = pandas.read_parquet(targets[table])
+            for k in reversed(KEYS):
+                frame.insert(0, k, catalog[key][k])
+            tables[table].append(frame)
+
+    result = {table: pandas.concat(frames, ignore_index=True) if frames else pandas.DataFrame(columns=KEYS)
+              for table, frames in tables.items()}
+    return result, errors
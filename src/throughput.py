@@ -0,0 +1,91 @@
+import math
+import numpy
+import pandas
+import plotly.graph_objects
+
+from src.lib import lod_grid
+from src.lib import add_bot_markers
+
+#################################################################
+# Throughput curves from the periodic bins. The bytes of every bin
+# are spread uniformly over [ts, te] and redistributed onto a fixed
+# time grid (see lib.lod_grid: bincount plus a cumulative-sum
+# difference array), so the cost is linear in the number of bins.
+# Each curve (total, token or flow) is a single trace.
+#################################################################
+
+STEPS = {"100 ms": 100, "1 s": 1000, "5 s": 5000}
+
+# Largest grid: coarser steps are used beyond it
+MAX_BINS = 20000
+
+# Tokens drawn on their own (the others are summed)
+TOP_TOKENS = 8
+
+def throughput_grid(frame: pandas.DataFrame, value: str, groups: numpy.ndarray, ngroups: int,
+                    start: float, end: float, step: float):
+
+    # (groups x time bins) in bit/s, with the left edge of each bin (milliseconds)
+    nbins = max(1, math.ceil((end - start) / step))
+    if nbins > MAX_BINS:
+        step  = step * math.ceil(nbins / MAX_BINS)
+        nbins = max(1, math.ceil((end - start) / step))
+
+    grid, edges, _ = lod_grid(frame["ts"].to_numpy(dtype=float), frame["te"].to_numpy(dtype=float), groups,
+                              frame[value].to_numpy(dtype=float), start, start + nbins * step,
+                              time_bins=nbins, row_bins=max(ngroups, 1))
+
+    # Groups past the largest code seen have no traffic
+    full = numpy.zeros((ngroups, nbins))
+    full[:grid.shape[0]] = grid[:ngroups]
+    return full * 8 / (step / 1000), edges[:-1], step
+
+def throughput_timeline(tcp_periodic: pandas.DataFrame, bot_complete: pandas.DataFrame, step: float,
+                        by: str | None = None, window: tuple[float, float] | None = None) -> plotly.graph_objects.Figure:
+
+    # The bins given (all of them, a token or a flow) over the window or their own span
+    if window is not None:
+        start, end = window
+    elif len(tcp_periodic):
+        start = min(tcp_periodic["ts"].min(), bot_complete["from"].min())
+        end   = max(tcp_periodic["te"].max(), bot_complete["from"].max())
+    else:
+        start, end = bot_complete["from"].min(), bot_complete["from"].max()
+
+    if by is None:
+        # Downlink and uplink of all the bins
+        curves = []
+        for value, name in (("s_app_byts", "Downlink"), ("c_app_byts", "Uplink")):
+            grid, times, used = throughput_grid(tcp_periodic, value, numpy.zeros(len(tcp_periodic), dtype=numpy.int64), 1,
+                                                start, end, step)
+            curves.append((name, grid[0]))
+    else:
+        # Downlink of the largest tokens, the others summed as "other"
+        labels = tcp_periodic[by].astype(object).fillna("unknown")
+        top = tcp_periodic.groupby(labels)["s_app_byts"].sum().nlargest(TOP_TOKENS).index
+        names = list(top) + ["other"]
+        codes = pandas.Categorical(labels.where(labels.isin(top), "other"), categories=names).codes
+        grid, times, used = throughput_grid(tcp_periodic, "s_app_byts", codes, len(names), start, end, step)
+        curves = [(name, grid[i]) for i, name in enumerate(names) if grid[i].any()]
+
+    return throughput_figure(times, curves, used, bot_complete, window)
+
+def throughput_figure(times: numpy.ndarray, curves: list, step: float, bot_complete: pandas.DataFrame,
+                      window: tuple[float, float] | None = None) -> plotly.graph_objects.Figure:
+
+    # curves: (name, bit/s at each of the times) pairs, one trace each
+    x = pandas.to_datetime(times, unit="ms", origin="unix")
+
+    figure = plotly.graph_objects.Figure()
+    for name, y in curves:
+        figure.add_trace(plotly.graph_objects.Scattergl(x=x, y=y, mode="lines", line=dict(shape="hv", width=1.5), name=name,
+                                                        hovertemplate="%{x|%M:%S.%L}<br>%{y:.3s}bps<extra>%{fullData.name}</extra>"))
+
+    figure.update_layout(height=450, title=f"Throughput (step {step / 1000:g} s)")
+    figure.update_xaxes(gridwidth=0.03, title="Time (minutes:seconds)", showgrid=True, tickformat="%M:%S",
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+    figure.update_yaxes(gridwidth=0.03, title="Bitrate [bit/s]", showgrid=True,
+                        title_font=dict(family="Courier New"), tickfont=dict(family="Courier New", size=10))
+
+    add_bot_markers(figure, bot_complete, window=window)
+    return figure
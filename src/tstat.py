@@ -0,0 +1,270 @@
+import re
+import numpy
+import pandas
+import pyarrow
+import pyarrow.csv
+import pyarrow.compute
+
+#################################################################
+# Streaming parser for the raw Tstat logs (log_tcp_complete,
+# log_tcp_nocomplete, log_tcp_periodic, log_udp_complete,
+# log_udp_periodic, log_dns_complete). The numbered header
+# ("#31#c_ip:1 c_port:2 ...") is used to name the columns, which
+# are then renamed onto the schema of the derived .csv files.
+# Files are read block by block, so memory stays bounded by the
+# block size and not by the size of the log.
+#################################################################
+
+BLOCK_SIZE = 64 << 20
+
+# Raw Tstat name -> portal name (same order of the .csv files)
+TCP_COUNTERS = {
+    "pkts_all":  "all_pkts",
+    "rst_cnt":   "rst_pkts",
+    "ack_cnt":   "ack_pkts",
+    "ack_cnt_p": "pure_ack_pkts",
+    "bytes_uniq": "app_byts",
+    "pkts_data": "app_pkts",
+    "pkts_retx": "rxt_pkts",
+    "bytes_retx": "rxt_byts",
+    "pkts_ooo":  "ooo_pkts",
+    "syn_cnt":   "syn_pkts",
+    "fin_cnt":   "fin_pkts",
+}
+
+TCP_COMPLETE_COLUMNS = {
+    "c_ip": "c_ip", "c_port": "c_pt", **{f"c_{k}": f"c_{v}" for k, v in TCP_COUNTERS.items()},
+    "s_ip": "s_ip", "s_port": "s_pt", **{f"s_{k}": f"s_{v}" for k, v in TCP_COUNTERS.items()},
+    "first": "ts",
+    "last": "te",
+    "con_t": "protocol",
+    "c_tls_SNI": "s_origin_tls_chello",
+    "s_tls_SCN": "s_origin_tls_shello",
+    "c_npnalpn": "c_http_version",
+    "s_npnalpn": "s_http_version",
+    "fqdn": "s_origin_dns_request",
+    "http_hostname": "s_hostname",
+}
+
+TCP_PERIODIC_COLUMNS = {
+    "c_ip": "c_ip", "c_port": "c_pt",
+    "s_ip": "s_ip", "s_port": "s_pt",
+    "time_abs_start": "ts",
+    "bin_duration": "size",
+    **{f"c_{k}": f"c_{v}" for k, v in TCP_COUNTERS.items()},
+    **{f"s_{k}": f"s_{v}" for k, v in TCP_COUNTERS.items()},
+}
+
+# Raw columns that have no counterpart in the .csv files, kept as they are
+TCP_COMPLETE_EXTRA = [f"{side}_{name}" for side in ("c", "s") for name in ("rtt_avg", "rtt_min", "rtt_max", "rtt_std", "rtt_cnt",
+                                                                           "cwin_max", "cwin_min", "cwin_ini",
+                                                                           "sack_opt", "sack_cnt", "mss", "win_max", "win_min")]
+TCP_PERIODIC_EXTRA = [f"{side}_{name}" for side in ("c", "s") for name in ("rtt_avg", "rtt_cnt", "cwin_min", "cwin_max", "sack_cnt")]
+
+# UDP flows carry bytes and packets only; they are named as the
+# application counters of TCP, so that the same views apply
+UDP_COMPLETE_COLUMNS = {
+    "c_ip": "c_ip", "c_port": "c_pt", "c_bytes_all": "c_app_byts", "c_pkts_all": "c_app_pkts",
+    "s_ip": "s_ip", "s_port": "s_pt", "s_bytes_all": "s_app_byts", "s_pkts_all": "s_app_pkts",
+    "quic_SNI": "s_origin_quic_sni",
+    "quic_c_vers": "c_quic_version",
+    "fqdn": "s_origin_dns_request",
+}
+
+UDP_PERIODIC_COLUMNS = {
+    "c_ip": "c_ip", "c_port": "c_pt",
+    "s_ip": "s_ip", "s_port": "s_pt",
+    "time_abs_start": "ts",
+    "bin_duration": "size",
+    "c_bytes_all": "c_app_byts", "c_pkts_all": "c_app_pkts",
+    "s_bytes_all": "s_app_byts", "s_pkts_all": "s_app_pkts",
+}
+
+# Start and duration of each side of a UDP flow (durations are in seconds)
+UDP_TIMING = ["c_first_abs", "c_durat", "s_first_abs", "s_durat"]
+
+# One row per DNS request (REQ) and per record of each response (RESP)
+DNS_COLUMNS = ["c_ip", "c_port", "time", "entry", "trans_id", "query", "ttl", "type", "answer"]
+
+STRING_COLUMNS = ["c_ip", "s_ip", "c_tls_SNI", "s_tls_SCN", "fqdn", "http_hostname",
+                  "entry", "trans_id", "query", "ttl", "type", "answer", "quic_SNI", "quic_c_vers"]
+FLOAT_COLUMNS  = ["first", "last", "time_abs_start", "bin_duration", "time", "c_first_abs", "c_durat", "s_first_abs", "s_durat", "c_rtt_avg", "c_rtt_min", "c_rtt_max", "c_rtt_std",
+                  "s_rtt_avg", "s_rtt_min", "s_rtt_max", "s_rtt_std"]
+
+# Tstat con_t values, the TLS one is described by its NPN/ALPN bitmasks instead
+CON_T_TLS = 8192
+CON_T_NAMES = {0: "UNKNOWN", 1: "HTTP", 2: "RTSP", 4: "RTP", 8: "ICY", 16: "RTCP", 32: "MSN", 64: "YMSG", 128: "XMPP",
+               256: "P2P", 512: "SKYPE", 1024: "SMTP", 2048: "POP3", 4096: "IMAP4", 16384: "ED2K", 32768: "SSH",
+               65536: "RTMP", 131072: "BITTORRENT_MSE/PE"}
+
+# NPN (low nibble) and ALPN (high nibble) bits
+NPNALPN_BITS = [(0x11, "spdy (*)"), (0x22, "http/1.x"), (0x88, "http/2")]
+
+def npnalpn_name(value: int) -> str:
+    names = [name for bits, name in NPNALPN_BITS if value & bits]
+    return str(names) if names else "None"
+
+NPNALPN_NAMES = numpy.array([npnalpn_name(v) for v in range(256)], dtype=object)
+
+def read_header(path: str) -> list[str]:
+
+    # "#31#c_ip:1 c_port:2 ..." -> ["c_ip", "c_port", ...]
+    with open(path, "r") as f:
+        header = f.readline()
+    return [re.sub(r":\d+$", "", name) for name in header.strip().split("#")[-1].split()]
+
+def read_origin(path: str) -> float:
+
+    # Absolute time (in milliseconds) all relative timestamps refer to
+    bot = pandas.read_csv(path, delimiter=" ")
+    return float(bot.loc[bot["action"] == "origin", "now"].iloc[0])
+
+def open_log(path: str, columns: list[str], block_size: int, data: bytes | None = None):
+
+    # data: lines appended to the log (without its header), parsed instead of the whole file
+
+    names = read_header(path)
+    columns = [c for c in columns if c in names]
+
+    types = {c: pyarrow.string()  for c in STRING_COLUMNS if c in columns}
+    types.update({c: pyarrow.float64() for c in FLOAT_COLUMNS if c in columns})
+    types.update({c: pyarrow.int64() for c in columns if c not in types})
+
+    source = path if data is None else pyarrow.BufferReader(data)
+    return pyarrow.csv.open_csv(source,
+                                read_options=pyarrow.csv.ReadOptions(column_names=names, skip_rows=int(data is None),
+                                                                     block_size=block_size),
+                                parse_options=pyarrow.csv.ParseOptions(delimiter=" ", quote_char=False),
+                                convert_options=pyarrow.csv.ConvertOptions(include_columns=columns, column_types=types,
+                                                                           strings_can_be_null=False))
+
+def flow_id(batch: pyarrow.RecordBatch) -> pyarrow.Array:
+    return pyarrow.compute.binary_join_element_wise(batch["c_ip"], pyarrow.compute.cast(batch["c_port"], pyarrow.string()),
+                                                    batch["s_ip"], pyarrow.compute.cast(batch["s_port"], pyarrow.string()), "#")
+
+def flow_token(server: pyarrow.Array) -> pyarrow.Array:
+
+    # Drop everything up to the first "-", keep the last three labels and
+    # hide the numbers (linear309-it-hls1-prd-msp1.cdn13.skycdp.com -> cdn#.skycdp.com)
+    token = pyarrow.compute.replace_substring_regex(server, pattern=r"^[^-]*-", replacement="", max_replacements=1)
+    token = pyarrow.compute.replace_substring_regex(token, pattern=r"^.*\.([^.]*\.[^.]*\.[^.]*)$", replacement=r"\1")
+    return pyarrow.compute.replace_substring_regex(token, pattern=r"\d+", replacement="#")
+
+def flow_proto(con_t: numpy.ndarray, c_npnalpn: numpy.ndarray, s_npnalpn: numpy.ndarray) -> numpy.ndarray:
+
+    tls = NPNALPN_NAMES[c_npnalpn & 0xFF] + "#" + NPNALPN_NAMES[s_npnalpn & 0xFF]
+
+    # con_t values are few: name the distinct ones only
+    values, codes = numpy.unique(con_t, return_inverse=True)
+    oth = numpy.array([CON_T_NAMES.get(v, "UNKNOWN") for v in values.tolist()], dtype=object)[codes]
+
+    return numpy.where(con_t == CON_T_TLS, tls, oth)
+
+def iter_tcp_complete(path: str, origin: float, block_size: int = BLOCK_SIZE, data: bytes | None = None):
+
+    columns = list(TCP_COMPLETE_COLUMNS.keys()) + TCP_COMPLETE_EXTRA
+
+    for batch in open_log(path, columns, block_size, data):
+
+        # The server name is the TLS SNI, or the DNS request that resolved the server
+        sni = batch["c_tls_SNI"]
+        server = pyarrow.compute.if_else(pyarrow.compute.equal(sni, "-"), batch["fqdn"], sni)
+
+        frame = batch.to_pandas().rename(columns=TCP_COMPLETE_COLUMNS)
+        frame["ts"] = frame["ts"] - origin
+        frame["te"] = frame["te"] - origin
+        frame["id"] = flow_id(batch).to_pandas()
+        frame["token"] = flow_token(server).to_pandas()
+        frame["proto"] = flow_proto(frame["protocol"].to_numpy(), frame["c_http_version"].to_numpy(), frame["s_http_version"].to_numpy())
+
+        yield frame[list(TCP_COMPLETE_COLUMNS.values()) + ["id", "token", "proto"] + [c for c in TCP_COMPLETE_EXTRA if c in frame.columns]]
+
+def iter_tcp_periodic(path: str, origin: float, flows: pandas.DataFrame, block_size: int = BLOCK_SIZE,
+                      data: bytes | None = None):
+
+    # Token and proto of each bin are the ones of its flow (missing for incomplete flows)
+    flows = flows.drop_duplicates(subset="id").set_index("id")
+    columns = list(TCP_PERIODIC_COLUMNS.keys()) + TCP_PERIODIC_EXTRA
+
+    for batch in open_log(path, columns, block_size, data):
+
+        frame = batch.to_pandas().rename(columns=TCP_PERIODIC_COLUMNS)
+        frame["ts"] = frame["ts"] - origin
+        frame["id"] = flow_id(batch).to_pandas()
+        frame["te"] = frame["ts"] + frame["size"]
+        frame["token"] = frame["id"].map(flows["token"])
+        frame["proto"] = frame["id"].map(flows["proto"])
+
+        yield frame[list(TCP_PERIODIC_COLUMNS.values()) + ["id", "te", "token", "proto"] + [c for c in TCP_PERIODIC_EXTRA if c in frame.columns]]
+
+def iter_udp_complete(path: str, origin: float, block_size: int = BLOCK_SIZE):
+
+    for batch in open_log(path, list(UDP_COMPLETE_COLUMNS.keys()) + UDP_TIMING, block_size):
+
+        # The server name is the QUIC SNI, or the DNS request that resolved the server
+        sni = batch["quic_SNI"]
+        server = pyarrow.compute.if_else(pyarrow.compute.equal(sni, "-"), batch["fqdn"], sni)
+
+        frame = batch.to_pandas().rename(columns=UDP_COMPLETE_COLUMNS)
+
+        # A side without packets does not bound the flow
+        c_first, s_first = frame["c_first_abs"].to_numpy(), frame["s_first_abs"].to_numpy()
+        c_last = c_first + frame["c_durat"].to_numpy() * 1000
+        s_last = s_first + frame["s_durat"].to_numpy() * 1000
+        c_seen, s_seen = frame["c_app_pkts"].to_numpy() > 0, frame["s_app_pkts"].to_numpy() > 0
+        frame["ts"] = numpy.fmin(numpy.where(c_seen, c_first, numpy.nan), numpy.where(s_seen, s_first, numpy.nan)) - origin
+        frame["te"] = numpy.fmax(numpy.where(c_seen, c_last, numpy.nan), numpy.where(s_seen, s_last, numpy.nan)) - origin
+
+        # Flows named neither by the SNI nor by a DNS request ("-") are gathered under "unknown"
+        token = flow_token(server)
+        frame["id"] = flow_id(batch).to_pandas()
+        frame["token"] = pyarrow.compute.if_else(pyarrow.compute.equal(token, ""), "unknown", token).to_pandas()
+        frame["proto"] = numpy.where(frame["c_quic_version"] == "-", "UDP", "QUIC " + frame["c_quic_version"])
+
+        yield frame[list(UDP_COMPLETE_COLUMNS.values()) + ["ts", "te", "id", "token", "proto"]]
+
+def iter_udp_periodic(path: str, origin: float, flows: pandas.DataFrame, block_size: int = BLOCK_SIZE):
+
+    # Token and proto of each bin are the ones of its flow
+    flows = flows.drop_duplicates(subset="id").set_index("id")
+
+    for batch in open_log(path, list(UDP_PERIODIC_COLUMNS.keys()), block_size):
+
+        frame = batch.to_pandas().rename(columns=UDP_PERIODIC_COLUMNS)
+        frame["ts"] = frame["ts"] - origin
+        frame["id"] = flow_id(batch).to_pandas()
+        frame["te"] = frame["ts"] + frame["size"]
+        frame["token"] = frame["id"].map(flows["token"])
+        frame["proto"] = frame["id"].map(flows["proto"])
+
+        yield frame[list(UDP_PERIODIC_COLUMNS.values()) + ["id", "te", "token", "proto"]]
+
+def concat_chunks(chunks) -> pandas.DataFrame:
+    chunks = list(chunks)
+    return pandas.concat(chunks, ignore_index=True) if chunks else pandas.DataFrame()
+
+def read_tcp_complete(path: str, origin: float, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+    return concat_chunks(iter_tcp_complete(path, origin, block_size))
+
+def read_tcp_periodic(path: str, origin: float, flows: pandas.DataFrame, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+    return concat_chunks(iter_tcp_periodic(path, origin, flows, block_size))
+
+def read_udp_complete(path: str, origin: float, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+    return concat_chunks(iter_udp_complete(path, origin, block_size))
+
+def read_udp_periodic(path: str, origin: float, flows: pandas.DataFrame, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+    return concat_chunks(iter_udp_periodic(path, origin, flows, block_size))
+
+def read_dns_complete(path: str, origin: float, block_size: int = BLOCK_SIZE) -> pandas.DataFrame:
+
+    # Requests and A/AAAA answers only (CNAME records are the steps of a chain)
+    def chunks():
+        for batch in open_log(path, DNS_COLUMNS, block_size):
+            keep = pyarrow.compute.or_(pyarrow.compute.equal(batch["entry"], "REQ"),
+                                       pyarrow.compute.is_in(batch["type"], value_set=pyarrow.array(["A", "AAAA"])))
+            frame = batch.filter(keep).to_pandas()
+            frame["time"] = frame["time"] - origin
+            frame["ttl"] = pandas.to_numeric(frame["ttl"], errors="coerce")
+            yield frame
+
+    return concat_chunks(chunks())
@@ -0,0 +1,129 @@
+import os
+import numpy
+import pandas
+import pytest
+
+from src.chunks import detect_chunks
+from src.chunks import compute_chunks
+from src.chunks import chunks_path
+from src.chunks import flow_chunks
+from src.chunks import CHUNK_COLUMNS
+from src.loader import load_experiment
+from src.loader import experiment_stamps
+from src.lib import tcp_periodic_timeline
+
+#################################################################
+# ON/OFF download chunks: runs of bins with at least CHUNK_BYTES
+# server bytes, split by an OFF bin, by an idle time longer than
+# the gap or by a change of flow, with their size, gap and rate.
+#################################################################
+
+EXPERIMENT = os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop", "1mbits", "experiment-0")
+
+def bins(rows: list[tuple]) -> pandas.DataFrame:
+
+    # (id, ts, te, s_app_byts) -> bins of the token "cdn", in the order of the loader
+    frame = pandas.DataFrame(rows, columns=["id", "ts", "te", "s_app_byts"])
+    frame.insert(0, "token", "cdn")
+    return frame
+
+def test_chunk_size_gap_and_rate():
+
+    # Two chunks of a flow: [0, 300] with 3 ON bins, then [1300, 1500] after an idle time of 1000 ms
+    table = detect_chunks(bins([("a", 0.0, 100.0, 2000.0), ("a", 100.0, 200.0, 3000.0), ("a", 200.0, 300.0, 1000.0),
+                                ("a", 1300.0, 1400.0, 4000.0), ("a", 1400.0, 1500.0, 4000.0)]))
+    assert table.columns.tolist() == CHUNK_COLUMNS
+    assert table["chunk"].tolist() == [0, 1]
+    assert table["start"].tolist() == [0.0, 1300.0]
+    assert table["end"].tolist() == [300.0, 1500.0]
+    assert table["bytes"].tolist() == [6000.0, 8000.0]
+    assert table["bins"].tolist() == [3, 2]
+    assert table["duration"].tolist() == [300.0, 200.0]
+
+    # No gap before the first chunk of a flow; the rate in bit/s over the chunk
+    assert numpy.isnan(table["gap"].iloc[0]) and table["gap"].iloc[1] == 1000.0
+    assert table["bitrate"].tolist() == pytest.approx([6000 * 8 / 0.3, 8000 * 8 / 0.2])
+
+def test_off_bins_split_the_runs():
+
+    # Below the threshold (999 bytes) a bin is OFF, even without any idle time around it
+    table = detect_chunks(bins([("a", 0.0, 100.0, 1000.0), ("a", 100.0, 200.0, 999.0), ("a", 200.0, 300.0, 5000.0),
+                                ("a", 300.0, 400.0, 0.0), ("a", 400.0, 500.0, 0.0), ("a", 500.0, 600.0, 1000.0)]))
+    assert table["start"].tolist() == [0.0, 200.0, 500.0]
+    assert table["gap"].tolist()[1:] == [100.0, 200.0]
+
+    # A lower threshold joins them back, except for the bins without traffic
+    table = detect_chunks(bins([("a", 0.0, 100.0, 1000.0), ("a", 100.0, 200.0, 999.0), ("a", 200.0, 300.0, 5000.0),
+                                ("a", 300.0, 400.0, 0.0), ("a", 400.0, 500.0, 0.0), ("a", 500.0, 600.0, 1000.0)]), threshold=1)
+    assert table["bytes"].tolist() == [6999.0, 1000.0]
+
+def test_idle_time_longer_than_the_gap():
+
+    # 500 ms of idle time still belong to the chunk, 501 ms split it
+    table = detect_chunks(bins([("a", 0.0, 100.0, 1000.0), ("a", 600.0, 700.0, 1000.0), ("a", 1201.0, 1300.0, 1000.0)]))
+    assert table["start"].tolist() == [0.0, 1201.0]
+    assert table["bins"].tolist() == [2, 1]
+    assert table["gap"].iloc[1] == 501.0
+
+    # A wider gap keeps a single chunk
+    assert len(detect_chunks(bins([("a", 0.0, 100.0, 1000.0), ("a", 600.0, 700.0, 1000.0), ("a", 1201.0, 1300.0, 1000.0)]),
+                             gap=1000)) == 1
+
+def test_runs_do_not_cross_flows():
+
+    # Consecutive ON bins of two flows are two chunks; the chunk numbers and gaps restart with each flow
+    table = detect_chunks(bins([("a", 0.0, 100.0, 1000.0), ("a", 1000.0, 1100.0, 1000.0), ("b", 1100.0, 1200.0, 1000.0),
+                                ("b", 1200.0, 1300.0, 1000.0)]))
+    assert table["id"].tolist() == ["a", "a", "b"]
+    assert table["chunk"].tolist() == [0, 1, 0]
+    assert numpy.isnan(table["gap"].iloc[2])
+    assert table["bins"].tolist() == [1, 1, 2]
+
+def test_instantaneous_and_silent_flows():
+
+    # A chunk of a single instantaneous bin has no rate; a flow without ON bins has no chunk
+    table = detect_chunks(bins([("a", 50.0, 50.0, 1500.0), ("b", 0.0, 100.0, 10.0)]))
+    assert table["id"].tolist() == ["a"]
+    assert table["duration"].iloc[0] == 0.0 and numpy.isnan(table["bitrate"].iloc[0])
+
+    empty = detect_chunks(bins([("b", 0.0, 100.0, 10.0)]))
+    assert len(empty) == 0 and empty.columns.tolist() == CHUNK_COLUMNS
+
+def test_chunks_overlaid_on_the_flow():
+    _, tcp_periodic, bot_complete = load_experiment(EXPERIMENT)
+    table = detect_chunks(tcp_periodic)
+    id = table["id"].value_counts().index[0]
+    chunks = table.loc[table["id"] == id]
+    token = chunks["token"].iloc[0]
+
+    # One segment per chunk (start, end, break), above every bin of the flow
+    figure = tcp_periodic_timeline(tcp_periodic, bot_complete, token, id=id, feature="s_app_byts", chunks=chunks)
+    overlay = figure.data[-1]
+    assert len(overlay.x) == 3 * len(chunks)
+    assert list(overlay.x[0::3]) == chunks["start"].tolist()
+    assert list(overlay.x[1::3]) == chunks["end"].tolist()
+    top = tcp_periodic.loc[tcp_periodic["id"] == id, "s_app_byts"].max()
+    assert overlay.y[0] > top
+
+    # Without chunks, no overlay
+    assert len(tcp_periodic_timeline(tcp_periodic, bot_complete, token, id=id, feature="s_app_byts").data) == len(figure.data) - 1
+
+def test_table_stored_per_experiment(tmp_path):
+    path = os.path.abspath(EXPERIMENT)
+    target = chunks_path(path, experiment_stamps(path), str(tmp_path))
+
+    # Written once, then read back as it is
+    table = compute_chunks(path, folder=str(tmp_path))
+    assert os.path.exists(target)
+    assert os.listdir(tmp_path) == [os.path.basename(target)]
+    stored = compute_chunks(path, folder=str(tmp_path))
+    pandas.testing.assert_frame_equal(stored.fillna({"token": "unknown"}), table.fillna({"token": "unknown"}))
+
+    # Other stamps (a re-generated experiment) give another table
+    assert chunks_path(path, experiment_stamps(path) + ((0, 0),), str(tmp_path)) != target
+
+    # The chunks of a flow are the slice of its rows
+    id = stored["id"].iloc[-1]
+    pandas.testing.assert_frame_equal(flow_chunks(path, id).reset_index(drop=True),
+                                      stored.loc[stored["id"] == id].reset_index(drop=True))
+    assert len(flow_chunks(path, "no-such-flow")) == 0
@@ -0,0 +1,72 @@
+import numpy
+import pandas
+
+from src.concurrency import open_connections
+from src.concurrency import connection_counts
+from src.concurrency import connections_timeline
+
+#################################################################
+# Open connections over time from the sorted ts/te events: after
+# the events at time t, the open connections are the flows with
+# ts <= t < te, overall or per token, drawn as one step trace.
+#################################################################
+
+BOT = pandas.DataFrame({"action": ["origin", "play", "stop"], "from": [0.0, 50.0, 400.0]})
+
+def test_hand_counted_sweep():
+
+    # Two parallel fetches after a third one: 1 at 0, 3 at 100, 2 at 150, a flow of no duration at 200, 0 at 300
+    ts = numpy.array([0.0, 100.0, 100.0, 200.0])
+    te = numpy.array([300.0, 150.0, 300.0, 200.0])
+    _, times, counts = open_connections(ts, te)
+    assert times.tolist() == [0.0, 100.0, 150.0, 200.0, 300.0]
+    assert counts.tolist() == [1, 3, 2, 2, 0]
+
+def test_groups_restart_from_zero():
+    ts = numpy.array([0.0, 10.0, 5.0])
+    te = numpy.array([20.0, 30.0, 15.0])
+    owners, times, counts = open_connections(ts, te, numpy.array([1, 1, 0]))
+    assert list(zip(owners.tolist(), times.tolist(), counts.tolist())) == \
+           [(0, 5.0, 1), (0, 15.0, 0), (1, 0.0, 1), (1, 10.0, 2), (1, 20.0, 1), (1, 30.0, 0)]
+
+def test_counts_per_token_match_direct_count():
+
+    # Many flows on a coarse time grid (events at the same time), "unknown" for flows without a token
+    rng = numpy.random.default_rng(0)
+    ts = rng.integers(0, 200, 2000).astype(float)
+    te = ts + rng.choice([0, 1, 5, 50], 2000)
+    frame = pandas.DataFrame({"ts": ts, "te": te, "token": rng.choice(numpy.array(["a", "b", None], dtype=object), 2000)})
+
+    counts = connection_counts(frame, by="token")
+    assert set(counts["token"]) == {"a", "b", "unknown"}
+    for token, group in counts.groupby("token"):
+        flows = frame.loc[frame["token"].fillna("unknown") == token]
+        assert group["time"].tolist() == sorted(set(flows["ts"]) | set(flows["te"]))
+        expected = ((flows["ts"].to_numpy()[None, :] <= group["time"].to_numpy()[:, None]) &
+                    (flows["te"].to_numpy()[None, :] >  group["time"].to_numpy()[:, None])).sum(axis=1)
+        assert group["open"].tolist() == expected.tolist()
+
+    # The overall count is the sum of the tokens at every time
+    overall = connection_counts(frame).set_index("time")["open"]
+    per_token = counts.pivot(index="time", columns="token", values="open").sort_index().ffill().fillna(0).sum(axis=1)
+    assert overall.tolist() == per_token.loc[overall.index].astype(int).tolist()
+
+def test_timeline_is_one_step_trace_with_markers():
+    frame = pandas.DataFrame({"ts": [0.0, 100.0, 100.0], "te": [300.0, 150.0, 300.0], "token": ["a", "b", "b"]})
+
+    figure = connections_timeline(frame, BOT)
+    assert len(figure.data) == 1 and figure.data[0].line.shape == "hv"
+    assert list(figure.data[0].y) == [0, 1, 3, 2, 0]
+    assert len(figure.layout.shapes) == len(BOT)
+
+    figure = connections_timeline(frame, BOT, token="b", window=(0.0, 200.0))
+    assert list(figure.data[0].y) == [0, 2, 1, 0]
+    assert len(figure.layout.shapes) == 2
+
+def test_without_flows():
+    owners, times, counts = open_connections(numpy.zeros(0), numpy.zeros(0))
+    assert len(owners) == len(times) == len(counts) == 0
+
+    frame = pandas.DataFrame({"ts": [0.0], "te": [10.0], "token": ["a"]})
+    figure = connections_timeline(frame, BOT, token="zzz")
+    assert len(figure.data) == 1 and len(figure.data[0].x) == 0
@@ -0,0 +1,68 @@
+import os
+import glob
+import numpy
+import pandas
+import pytest
+
+from src.lib import tcp_description
+from src.lib import tcp_descriptions
+from src.lib import format_fixed
+from src.lib import bytes_to_human_readable
+from src.lib import bytes_to_human_readable_array
+from src.lib import bitrate_to_human_readable
+from src.lib import bitrate_to_human_readable_array
+
+#################################################################
+# The columnar hover text (tcp_descriptions) against the row-wise
+# reference (tcp_description), character by character, on every
+# experiment of the data folder (see scripts.check_descriptions),
+# and the columnar formatters against the scalar ones.
+#################################################################
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "data")
+EXPERIMENTS = sorted(glob.glob(os.path.join(DATA_FOLDER, "*", "*", "*", "*")))
+
+def read_derived(path: str, name: str) -> pandas.DataFrame:
+    target = os.path.join(path, name)
+    if not os.path.exists(target):
+        pytest.skip(f"no {name}")
+    frame = pandas.read_csv(target, delimiter=" ")
+    if not {"ts", "te", "token"}.issubset(frame.columns):
+        pytest.skip("legacy column names")
+    return frame
+
+@pytest.mark.parametrize("periodic", [False, True], ids=["complete", "periodic"])
+@pytest.mark.parametrize("path", EXPERIMENTS, ids=[os.path.relpath(p, DATA_FOLDER) for p in EXPERIMENTS])
+def test_descriptions_match_rows(path, periodic):
+    frame = read_derived(path, "log_tcp_periodic.csv" if periodic else "log_tcp_complete.csv")
+
+    expected = frame.apply(lambda record: tcp_description(record, periodic=periodic), axis=1)
+    obtained = tcp_descriptions(frame, periodic=periodic)
+
+    mismatch = frame.index[expected != obtained]
+    assert len(mismatch) == 0, f"row {mismatch[0]}: {expected[mismatch[0]]!r} != {obtained[mismatch[0]]!r}"
+
+def special_values(rng) -> numpy.ndarray:
+
+    # Rounding ties, values around the unit changes, huge ones and non finite ones
+    return numpy.concatenate([
+        rng.uniform(-1e6, 1e6, 2000),
+        numpy.round(rng.uniform(0, 1e4, 1000), 3),
+        numpy.arange(0, 10, 0.005),
+        (1024.0 ** numpy.arange(10)[:, None] * [0.999, 1.0, 1.001]).ravel(),
+        (1000.0 ** numpy.arange(10)[:, None] * [0.999, 1.0, 1.001]).ravel(),
+        [0.0, -0.0, 0.005, 0.015, 0.125, 2.675, 1e20, -1e20, 2.0 ** 60, numpy.nan, numpy.inf, -numpy.inf],
+    ])
+
+def test_format_fixed():
+    values = special_values(numpy.random.default_rng(0))
+    for spec in (".2f", "2.2f", "4.2f"):
+        assert format_fixed(values, spec=spec).tolist() == [format(v, spec) for v in values.tolist()]
+
+def test_human_readable():
+    values = numpy.abs(special_values(numpy.random.default_rng(1)))
+    assert bytes_to_human_readable_array(values).tolist() == [str(bytes_to_human_readable(v)) for v in values.tolist()]
+
+    milliseconds = numpy.random.default_rng(2).choice([0.0, 1.0, 250.0, 1000.0, 1234.5], size=len(values))
+    assert bitrate_to_human_readable_array(values, milliseconds).tolist() == \
+           [bitrate_to_human_readable(v, milliseconds=m) for v, m in zip(values.tolist(), milliseconds.tolist())]
@@ -0,0 +1,100 @@
+import os
+import shutil
+import numpy
+import pandas
+import pytest
+
+from src.dns import dns_resolutions
+from src.dns import attach_resolutions
+from src.dns import token_latency
+from src.dns import latency_chart
+from src.dns import RESOLUTION_COLUMNS
+from src.loader import load_resolutions
+from src.loader import RAW_DNS_COMPLETE
+
+#################################################################
+# As-of join of the DNS answers onto the TCP flows: each flow takes
+# the last answer for its (c_ip, s_ip) received before it opened,
+# with the name the client asked for; flows of an experiment
+# without any resolution (no DNS log, or its header only) have none.
+#################################################################
+
+EXPERIMENT = os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop", "infinite", "experiment-1")
+
+def dns(rows: list[tuple]) -> pandas.DataFrame:
+
+    # (c_port, time, entry, trans_id, query, ttl, type, answer) of the client 10.0.0.1
+    frame = pandas.DataFrame(rows, columns=["c_port", "time", "entry", "trans_id", "query", "ttl", "type", "answer"])
+    frame.insert(0, "c_ip", "10.0.0.1")
+    return frame
+
+def flows(rows: list[tuple]) -> pandas.DataFrame:
+
+    # (id, token, s_ip, ts) of the same client
+    frame = pandas.DataFrame(rows, columns=["id", "token", "s_ip", "ts"])
+    frame.insert(2, "c_ip", "10.0.0.1")
+    return frame
+
+def test_answers_take_the_name_of_their_request():
+
+    # The transaction id is reused: each answer belongs to the last request before it
+    resolutions = dns_resolutions(dns([(1000, 0.0, "REQ", "0x01", "cdn.example.", numpy.nan, "A", "-"),
+                                       (1000, 10.0, "RESP", "0x01", "cdn.example.", 60.0, "A", "1.1.1.1"),
+                                       (1000, 50.0, "REQ", "0x01", "api.example.", numpy.nan, "A", "-"),
+                                       (1000, 80.0, "RESP", "0x01", "api.example.", 30.0, "A", "2.2.2.2")]))
+    assert resolutions.columns.tolist() == RESOLUTION_COLUMNS
+    assert resolutions["s_ip"].tolist() == ["1.1.1.1", "2.2.2.2"]
+    assert resolutions["hostname"].tolist() == ["cdn.example", "api.example"]
+    assert resolutions["dns_request"].tolist() == [0.0, 50.0]
+    assert resolutions["dns_response"].tolist() == [10.0, 80.0]
+
+def test_flows_take_the_last_resolution_before_they_open():
+    resolutions = dns_resolutions(dns([(1000, 0.0, "REQ", "0x01", "cdn.example.", numpy.nan, "A", "-"),
+                                       (1000, 10.0, "RESP", "0x01", "cdn.example.", 1.0, "A", "1.1.1.1"),
+                                       (1001, 500.0, "REQ", "0x02", "cdn.example.", numpy.nan, "A", "-"),
+                                       (1001, 520.0, "RESP", "0x02", "cdn.example.", 1.0, "A", "1.1.1.1")]))
+
+    # Before any answer, after the first one, after the second one (past the TTL of the first), another server
+    table = attach_resolutions(flows([("a", "cdn", "1.1.1.1", 5.0), ("b", "cdn", "1.1.1.1", 2000.0),
+                                      ("c", "cdn", "1.1.1.1", 100.0), ("d", "api", "9.9.9.9", 100.0)]),
+                               resolutions)
+    assert table["id"].tolist() == ["a", "b", "c", "d"]
+    assert numpy.isnan(table["dns_response"].iloc[0]) and numpy.isnan(table["dns_response"].iloc[3])
+    assert table["dns_response"].iloc[1:3].tolist() == [520.0, 10.0]
+    assert table["dns_latency"].iloc[1:3].tolist() == [1480.0, 90.0]
+    assert table["dns_duration"].iloc[1:3].tolist() == [20.0, 10.0]
+    assert table["dns_expired"].tolist() == [False, True, False, False]
+
+def test_no_resolution():
+
+    # A missing or header-only log gives no line at all: every flow is left without a resolution
+    table = attach_resolutions(flows([("a", "cdn", "1.1.1.1", 5.0), ("b", "api", "2.2.2.2", 7.0)]),
+                               dns_resolutions(pandas.DataFrame()))
+    assert table["hostname"].isna().all() and table["dns_latency"].isna().all()
+    assert not table["dns_expired"].any()
+    assert token_latency(table)["resolved"].tolist() == [0, 0]
+    latency_chart(table)
+
+@pytest.mark.parametrize("log", ["missing", "header"])
+def test_experiment_without_dns(tmp_path, log):
+    path = str(tmp_path / "experiment")
+    shutil.copytree(EXPERIMENT, path)
+    target = os.path.join(path, RAW_DNS_COMPLETE)
+    with open(target, "r") as f:
+        header = f.readline()
+    os.remove(target)
+    if log == "header":
+        with open(target, "w") as f:
+            f.write(header)
+
+    table = load_resolutions(path)
+    assert len(table) > 0 and table["dns_response"].isna().all()
+    assert table["dns_response"].dtype == float
+
+def test_experiment_with_dns():
+    table = load_resolutions(EXPERIMENT)
+    assert table["dns_response"].notna().any()
+
+    # Resolved flows opened after their answer
+    resolved = table.dropna(subset=["dns_response"])
+    assert (resolved["dns_latency"] >= 0).all()
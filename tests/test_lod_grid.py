@@ -0,0 +1,103 @@
+import os
+import numpy
+import pandas
+import pytest
+import plotly.io
+
+import src.lib
+from src.lib import lod_grid
+from src.lib import tcp_periodic_timeline
+from src.lib import tcp_complete_timeline
+from src.loader import load_experiment
+from src.lib import LOD_ROW_BINS
+from src.lib import LOD_TIME_BINS
+
+#################################################################
+# Level-of-detail timelines: past the threshold the rows are drawn
+# as one heatmap whose size does not depend on the number of rows
+# (lod_grid spreads every interval over the time bins it covers),
+# below it, or once the window or the token is narrowed, as bars.
+#################################################################
+
+EXPERIMENT = os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop", "1mbits", "experiment-0")
+
+@pytest.fixture(scope="module")
+def experiment():
+    return load_experiment(EXPERIMENT)
+
+def test_interval_spread_over_its_bins():
+
+    # 4 bins of 250 ms over [0, 1000]
+    ts = numpy.array([0.0, 100.0, 900.0, 600.0, -500.0])
+    te = numpy.array([250.0, 350.0, 1400.0, 600.0, 500.0])
+    values = numpy.array([100.0, 250.0, 500.0, 7.0, 1000.0])
+    grid, edges, group = lod_grid(ts, te, numpy.zeros(5, dtype=numpy.int64), values, 0.0, 1000.0, time_bins=4, row_bins=1)
+
+    numpy.testing.assert_allclose(edges, [0, 250, 500, 750, 1000])
+    # [0, 250] -> bin 0; [100, 350] -> 150 + 100; [900, 1400] -> 100 in the last bin (the rest is past the end);
+    # the instantaneous 600 -> bin 2; [-500, 500] -> 250 in each of bins 0 and 1
+    numpy.testing.assert_allclose(grid[0], [100 + 150 + 250, 100 + 250, 7, 100])
+
+def test_rows_grouped_to_the_row_bins():
+
+    # 10 rows onto 4 row bins: 3 rows each (the last group has a single row)
+    rows = numpy.arange(10)
+    grid, _, group = lod_grid(numpy.zeros(10), numpy.full(10, 10.0), rows, numpy.ones(10), 0.0, 10.0, time_bins=1, row_bins=4)
+    assert group == 3
+    assert grid[:, 0].tolist() == [3, 3, 3, 1]
+
+def test_grid_matches_overlaps():
+
+    # Many intervals at once, against the overlap of every interval with every bin
+    rng = numpy.random.default_rng(0)
+    ts = rng.uniform(-200, 1200, 3000)
+    te = ts + rng.choice([0.5, 5.0, 50.0, 500.0], 3000)
+    rows = rng.integers(0, 50, 3000)
+    values = rng.uniform(0, 1e4, 3000)
+    grid, edges, group = lod_grid(ts, te, rows, values, 0.0, 1000.0, time_bins=37, row_bins=7)
+
+    overlap = numpy.clip(numpy.minimum(te[:, None], edges[None, 1:]) - numpy.maximum(ts[:, None], edges[None, :-1]), 0, None)
+    spread = overlap * (values / (te - ts))[:, None]
+    expected = numpy.stack([spread[rows // group == g].sum(axis=0) for g in range(grid.shape[0])])
+    numpy.testing.assert_allclose(grid, expected, rtol=1e-9, atol=1e-6)
+
+def figure_traces(figure) -> set[str]:
+    return {trace.type for trace in figure.data}
+
+def test_heatmap_past_the_threshold_bars_below(experiment, monkeypatch):
+    _, tcp_periodic, bot_complete = experiment
+    token = tcp_periodic["token"].value_counts().index[0]
+    bins = (tcp_periodic["token"] == token).sum()
+    monkeypatch.setattr(src.lib, "LOD_THRESHOLD", bins - 1)
+
+    # The whole token: aggregated
+    assert figure_traces(tcp_periodic_timeline(tcp_periodic, bot_complete, token, id=None, feature=None)) == {"heatmap"}
+
+    # A narrower window, or a smaller token: exact bars again
+    start = tcp_periodic.loc[tcp_periodic["token"] == token, "ts"].min()
+    window = (start, start + 10_000)
+    assert figure_traces(tcp_periodic_timeline(tcp_periodic, bot_complete, token, id=None, feature=None, window=window)) == {"bar"}
+    other = tcp_periodic["token"].value_counts().index[1]
+    assert figure_traces(tcp_periodic_timeline(tcp_periodic, bot_complete, other, id=None, feature=None)) == {"bar"}
+
+def test_complete_timeline_threshold(experiment, monkeypatch):
+    tcp_complete, _, bot_complete = experiment
+    monkeypatch.setattr(src.lib, "LOD_THRESHOLD", len(tcp_complete) - 1)
+    assert figure_traces(tcp_complete_timeline(tcp_complete, bot_complete, feature=None)) == {"heatmap"}
+    monkeypatch.setattr(src.lib, "LOD_THRESHOLD", len(tcp_complete))
+    assert "heatmap" not in figure_traces(tcp_complete_timeline(tcp_complete, bot_complete, feature=None))
+
+def test_payload_bounded_by_the_grid(experiment):
+    tcp_complete, _, bot_complete = experiment
+
+    # The flows replicated up to 200 times (a different id each): the heatmap keeps the same size,
+    # and the payload is bounded by its cells (each an integer count) whatever the number of rows
+    copies = pandas.concat([tcp_complete.assign(id=tcp_complete["id"].astype(str) + f"#{k}") for k in range(200)],
+                           ignore_index=True)
+    for frame in (copies.iloc[:len(copies) // 10], copies):
+        figure = tcp_complete_timeline(frame, bot_complete, feature="s_app_byts")
+        z = numpy.asarray(figure.data[0].z)
+        assert z.shape[0] <= LOD_ROW_BINS and z.shape[1] == LOD_TIME_BINS
+
+        cell = len(str(int(z.max()))) + 2
+        assert len(plotly.io.to_json(figure, validate=False)) < z.size * cell + 200_000
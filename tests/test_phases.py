@@ -0,0 +1,103 @@
+import numpy
+import pandas
+import pytest
+
+from src.phases import bot_phases
+from src.phases import split_by_phase
+from src.phases import phase_volumes
+from src.phases import PHASE_COUNTERS
+
+#################################################################
+# Attribution of the periodic bins to the bot phases: a bin is
+# split across the phases it overlaps in proportion to the time
+# it spends in each, the parts outside every phase are dropped,
+# and the table has one row per (phase, token) with its bitrate.
+#################################################################
+
+BOT = pandas.DataFrame({"action": ["origin", "skysportuno-on", "skysportuno-off", "end"], "from": [0.0, 1000.0, 3000.0, 4000.0]})
+
+def periodic(rows: list[tuple]) -> pandas.DataFrame:
+
+    # (ts, te, token, s_app_byts) -> bins with every counter
+    frame = pandas.DataFrame(rows, columns=["ts", "te", "token", "s_app_byts"])
+    frame["c_app_byts"] = frame["s_app_byts"] / 10
+    frame["s_app_pkts"] = frame["s_app_byts"] / 1000
+    frame["c_app_pkts"] = frame["s_app_pkts"] / 2
+    return frame
+
+def volume(volumes: pandas.DataFrame, phase: str, token: str, column: str = "s_app_byts") -> float:
+    select = volumes.loc[(volumes["phase"] == phase) & (volumes["token"] == token), column]
+    return float(select.sum())
+
+def test_phases_follow_the_actions():
+    phases = bot_phases(BOT.iloc[::-1])
+    assert phases["phase"].tolist() == ["origin", "skysportuno-on", "skysportuno-off"]
+    assert phases["start"].tolist() == [0.0, 1000.0, 3000.0]
+    assert phases["end"].tolist() == [1000.0, 3000.0, 4000.0]
+
+def test_bin_split_across_the_phases_it_overlaps():
+
+    # 8000 bytes over [500, 3500]: 500 ms in origin, 2000 in skysportuno-on, 500 in skysportuno-off
+    volumes = phase_volumes(periodic([(500.0, 3500.0, "cdn", 8000.0)]), BOT)
+    assert volume(volumes, "origin", "cdn") == pytest.approx(8000 * 500 / 3000)
+    assert volume(volumes, "skysportuno-on", "cdn") == pytest.approx(8000 * 2000 / 3000)
+    assert volume(volumes, "skysportuno-off", "cdn") == pytest.approx(8000 * 500 / 3000)
+
+    # Packets are split the same way, and the bitrate is over the whole phase
+    assert volume(volumes, "skysportuno-on", "cdn", "s_app_pkts") == pytest.approx(8 * 2000 / 3000)
+    assert volume(volumes, "skysportuno-on", "cdn", "s_bitrate") == pytest.approx(8000 * 2000 / 3000 * 8 / 2)
+
+def test_parts_outside_the_phases_are_dropped():
+
+    # Before the first action, after the last one, and half inside
+    volumes = phase_volumes(periodic([(-500.0, -100.0, "cdn", 1000.0), (4100.0, 4200.0, "cdn", 1000.0),
+                                      (3500.0, 4500.0, "cdn", 1000.0)]), BOT)
+    assert volumes["s_app_byts"].sum() == pytest.approx(500.0)
+    assert volume(volumes, "skysportuno-off", "cdn") == pytest.approx(500.0)
+
+def test_tokens_and_instantaneous_bins():
+
+    # An instantaneous bin belongs to the phase it falls in; bins without a token are "unknown"
+    volumes = phase_volumes(periodic([(1500.0, 1500.0, "cdn", 700.0), (1500.0, 1600.0, None, 300.0),
+                                      (2000.0, 2100.0, "api", 100.0)]), BOT)
+    assert volume(volumes, "skysportuno-on", "cdn") == pytest.approx(700.0)
+    assert volume(volumes, "skysportuno-on", "unknown") == pytest.approx(300.0)
+    assert volume(volumes, "skysportuno-on", "api") == pytest.approx(100.0)
+
+    # (phase, token) pairs without traffic are not listed
+    assert len(volumes) == 3
+
+def test_without_instantaneous_bins():
+
+    # bincount gives integers when no bin is selected: the split must still be in floats
+    volumes = phase_volumes(periodic([(100.0, 200.0, "cdn", 1000.0), (1100.0, 2900.0, "cdn", 50.0)]), BOT)
+    assert volumes["s_app_byts"].sum() == pytest.approx(1050.0)
+
+def test_actions_at_the_same_time():
+
+    # A phase of zero duration gets no bytes and no bitrate
+    bot = pandas.DataFrame({"action": ["origin", "pause", "play", "end"], "from": [0.0, 1000.0, 1000.0, 2000.0]})
+    volumes = phase_volumes(periodic([(500.0, 1500.0, "cdn", 1000.0)]), bot)
+    assert volume(volumes, "pause", "cdn") == 0.0
+    assert volume(volumes, "origin", "cdn") == pytest.approx(500.0)
+    assert volume(volumes, "play", "cdn") == pytest.approx(500.0)
+
+def test_split_by_phase_matches_overlaps():
+
+    # Many bins and phases at once, against the overlap of every bin with every phase
+    rng = numpy.random.default_rng(0)
+    n = 2000
+    bounds = numpy.sort(rng.uniform(0, 1000, 30))
+    ts = rng.uniform(-100, 1100, n)
+    te = ts + rng.choice([0.0, 1.0, 20.0, 400.0], n)
+    values = rng.uniform(0, 1e4, (n, len(PHASE_COUNTERS)))
+    groups = rng.integers(0, 3, n)
+
+    overlap = numpy.clip(numpy.minimum(te[:, None], bounds[None, 1:]) - numpy.maximum(ts[:, None], bounds[None, :-1]), 0, None)
+    share = numpy.divide(overlap, (te - ts)[:, None], out=numpy.zeros_like(overlap), where=(te > ts)[:, None])
+    inside = (te <= ts) & (ts >= bounds[0]) & (ts <= bounds[-1])
+    point = numpy.clip(numpy.searchsorted(bounds, ts, side="right") - 1, 0, len(bounds) - 2)
+    share[inside, point[inside]] = 1.0
+
+    expected = numpy.stack([(share * (groups == g)[:, None]).T @ values for g in range(3)])
+    numpy.testing.assert_allclose(split_by_phase(ts, te, values, groups, 3, bounds), expected, rtol=1e-9, atol=1e-6)
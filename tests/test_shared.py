@@ -0,0 +1,73 @@
+import os
+import numpy
+import pandas
+import plotly.io
+
+import src.loader
+import src.figures
+from src.shared import map_frame
+from src.shared import shared_paths
+from src.loader import load_experiment
+from src.loader import load_index
+from src.loader import experiment_stamps
+from src.loader import SHARED_FRAMES
+
+#################################################################
+# Memory-mapped experiments: the frames published once as Arrow
+# files, and the views that map only the columns they draw (the
+# others are never converted) giving the same figures as the
+# whole frames.
+#################################################################
+
+EXPERIMENT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "sky", "desktop", "1mbits", "experiment-0"))
+
+def test_columns_of_a_view():
+    tcp_complete, tcp_periodic, bot_complete = load_experiment(EXPERIMENT)
+    targets = shared_paths(EXPERIMENT, experiment_stamps(EXPERIMENT), SHARED_FRAMES)
+
+    # The columns asked for, in that order (those a frame does not have are skipped)
+    frame = map_frame(targets[1], ["ts", "token", "no_such_column"])
+    assert frame.columns.tolist() == ["ts", "token"]
+    pandas.testing.assert_frame_equal(frame, tcp_periodic[["ts", "token"]])
+
+    # The bot trace is always whole
+    view = load_experiment(EXPERIMENT, columns=("ts", "te"))
+    assert view[0].columns.tolist() == view[1].columns.tolist() == ["ts", "te"]
+    assert view[2].columns.tolist() == bot_complete.columns.tolist()
+
+    # A column is converted once, whatever the number of views that have it
+    tokens = [load_experiment(EXPERIMENT, columns=columns)[1]["token"].array for columns in (("token",), ("ts", "token"))]
+    assert numpy.shares_memory(tokens[0].codes, tokens[1].codes) and tokens[0].categories is tokens[1].categories
+
+    # A view is mapped once per process, and the index has the columns it is built on
+    assert load_experiment(EXPERIMENT, columns=["ts", "te"]) is view
+    index = load_index(EXPERIMENT, columns=("s_app_byts",))
+    assert index.tcp_periodic.columns.tolist() == ["s_app_byts", "token", "id", "ts"]
+    assert index.tokens == load_index(EXPERIMENT).tokens
+
+def figures(experiment: str) -> list:
+    _, tcp_periodic, _ = load_experiment(experiment)
+    token = tcp_periodic["token"].value_counts().index[0]
+    id = tcp_periodic.loc[tcp_periodic["token"] == token, "id"].iloc[0]
+    window = (float(tcp_periodic["ts"].min()), float(tcp_periodic["ts"].min()) + 60_000)
+    return [src.figures.complete_timeline(experiment, feature=None),
+            src.figures.complete_timeline(experiment, feature="s_app_byts", window=window),
+            src.figures.complete_timeline(experiment, feature=None, transport="udp"),
+            src.figures.periodic_timeline(experiment, token=token, id=None, feature=None),
+            src.figures.periodic_timeline(experiment, token=token, id=id, feature="s_app_byts"),
+            src.figures.periodic_timeline(experiment, token=token, id=id, feature="c_app_pkts", window=window),
+            src.figures.phases_chart(experiment, value="s_bitrate"),
+            src.figures.throughput_chart(experiment, step=1000, by="token"),
+            src.figures.throughput_chart(experiment, step=1000, id=id),
+            src.figures.connections_chart(experiment, token=token),
+            src.figures.delivery_chart(experiment, value="rxt_ratio", by="id")]
+
+def test_views_draw_the_same_figures(monkeypatch):
+
+    # Built every time (not read back from the figure cache)
+    monkeypatch.setattr(src.figures, "cached_figure", lambda path, view, params, build: build())
+    views = [plotly.io.to_json(figure, validate=False) for figure in figures(EXPERIMENT)]
+
+    # ... from the whole frames
+    monkeypatch.setattr(src.loader, "view_columns", lambda columns, index=False: None)
+    assert [plotly.io.to_json(figure, validate=False) for figure in figures(EXPERIMENT)] == views
@@ -0,0 +1,153 @@
+import os
+import json
+import shutil
+import numpy
+import pandas
+import pytest
+
+from src.sketches import bucket_of
+from src.sketches import count_values
+from src.sketches import merge_sketches
+from src.sketches import experiment_sketch
+from src.sketches import sketch_archive
+from src.sketches import sketch_quantiles
+from src.sketches import sketch_cdf
+from src.sketches import GAMMA
+from src.sketches import MIN_VALUE
+from src.sketches import KEYS
+from src.loader import TCP_COMPLETE
+from src.loader import TCP_PERIODIC
+from src.loader import BOT_COMPLETE
+from src.loader import RAW_TCP_COMPLETE
+from src.loader import RAW_TCP_PERIODIC
+
+#################################################################
+# Distribution sketches: quantiles within the relative error of
+# a bucket, sketches that merge exactly by service, QoS and token,
+# and an archive sketch merged incrementally and kept on disk,
+# equal to the one built again from every experiment.
+#################################################################
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# Experiments copied to a temporary data folder (the .csv files and the bot trace only)
+EXPERIMENTS = ("sky/desktop/1mbits/experiment-0", "sky/desktop/infinite/experiment-1", "dazn/desktop/2mbits/experiment-1")
+
+def copy_experiment(data: str, key: str):
+    os.makedirs(os.path.join(data, key))
+    for name in (TCP_COMPLETE, TCP_PERIODIC, BOT_COMPLETE):
+        shutil.copy2(os.path.join(DATA, key, name), os.path.join(data, key, name))
+
+def test_bucket_bounds():
+
+    # Bucket i holds (MIN_VALUE * GAMMA^(i-1), MIN_VALUE * GAMMA^i]; zeros and tiny values are in bucket 0
+    assert bucket_of(numpy.array([0.0, MIN_VALUE / 2, MIN_VALUE])).tolist() == [0, 0, 0]
+    assert bucket_of(numpy.array([MIN_VALUE * GAMMA, MIN_VALUE * GAMMA * 1.001])).tolist() == [1, 2]
+    values = numpy.array([1.0, 1234.5, 1e9])
+    buckets = bucket_of(values)
+    assert numpy.all(MIN_VALUE * GAMMA ** (buckets - 1) < values) and numpy.all(values <= MIN_VALUE * GAMMA ** buckets * (1 + 1e-12))
+
+def test_non_finite_values_are_dropped():
+    table = count_values(numpy.array(["a"] * 4, dtype=object), "throughput", numpy.array([1.0, numpy.nan, numpy.inf, 0.0]))
+    assert table["count"].sum() == 2
+
+def test_quantiles_of_an_experiment():
+
+    # Flow durations of an experiment, per token, against the exact quantiles
+    path = os.path.join(DATA, EXPERIMENTS[0])
+    sketch = experiment_sketch(path)
+    flows = pandas.read_csv(os.path.join(path, TCP_COMPLETE), delimiter=" ", usecols=["ts", "te", "token"])
+    flows["token"] = flows["token"].fillna("unknown")
+
+    qs = (0.1, 0.5, 0.9, 0.99)
+    table = sketch_quantiles(sketch.loc[sketch["metric"] == "duration"], by=["token"], qs=qs).set_index("token")
+    for token, group in flows.groupby("token"):
+        duration = (group["te"] - group["ts"]).to_numpy()
+        assert table.loc[token, "count"] == len(duration)
+        for q in qs:
+            exact = numpy.quantile(duration, q, method="inverted_cdf")
+            assert table.loc[token, f"p{int(q * 100)}"] == pytest.approx(exact, rel=(GAMMA - 1) / 2 + 1e-9, abs=MIN_VALUE)
+
+    # The CDF of every token ends at 1
+    cdf = sketch_cdf(sketch.loc[sketch["metric"] == "bytes"], by=["token"])
+    assert cdf.groupby("token")["cdf"].last().tolist() == pytest.approx([1.0] * flows["token"].nunique())
+
+def test_blocks_merge_exactly():
+
+    # Read in small blocks, the sketch of an experiment is the same as read at once
+    path = os.path.join(DATA, EXPERIMENTS[0])
+    pandas.testing.assert_frame_equal(experiment_sketch(path, block_size=4096), experiment_sketch(path))
+
+    # Merges are associative: sketches of the parts of a metric merge to the sketch of all its values
+    values = numpy.r_[numpy.arange(1.0, 2000.0), 0.0]
+    tokens = numpy.where(numpy.arange(len(values)) % 3 == 0, "a", "b").astype(object)
+    parts = [count_values(tokens[part], "bytes", values[part]) for part in numpy.array_split(numpy.arange(len(values)), 5)]
+    whole = merge_sketches([count_values(tokens, "bytes", values)], by=[])
+    pandas.testing.assert_frame_equal(merge_sketches(parts, by=[]), whole)
+    pandas.testing.assert_frame_equal(merge_sketches([merge_sketches(parts[:2], by=[]), merge_sketches(parts[2:], by=[])], by=[]), whole)
+
+def test_archive_by_service_qos_and_token(tmp_path):
+    data, folder = str(tmp_path / "data"), str(tmp_path / "sketches")
+    for key in EXPERIMENTS:
+        copy_experiment(data, key)
+
+    table, errors = sketch_archive(data, workers=2, folder=folder)
+    assert errors == {}
+    assert table.columns.tolist() == KEYS + ["token", "metric", "bucket", "count"]
+    assert set(zip(table["service"], table["qos"])) == {("sky", "1mbits"), ("sky", "infinite"), ("dazn", "2mbits")}
+
+    # One count per flow of each experiment, under its service, QoS and token
+    for key in EXPERIMENTS:
+        service, _, qos, _ = key.split("/")
+        flows = pandas.read_csv(os.path.join(data, key, TCP_COMPLETE), delimiter=" ", usecols=["token"])["token"].fillna("unknown")
+        select = table.loc[(table["service"] == service) & (table["qos"] == qos) & (table["metric"] == "duration")]
+        assert select.groupby("token")["count"].sum().to_dict() == flows.value_counts().to_dict()
+
+def test_archive_merged_incrementally(tmp_path):
+    data, folder = str(tmp_path / "data"), str(tmp_path / "sketches")
+
+    # The first two experiments, then the third one is added (another data folder with the
+    # same files: the sketches of the first two are found on disk and not computed again)
+    for key in EXPERIMENTS[:2]:
+        copy_experiment(data, key)
+    sketch_archive(data, workers=1, folder=folder)
+    parts = sorted(p for p in os.listdir(folder) if p.endswith(".parquet") and p != "archive.parquet")
+    stamps = {p: os.stat(os.path.join(folder, p)).st_mtime_ns for p in parts}
+
+    more = str(tmp_path / "more")
+    shutil.copytree(data, more)
+    copy_experiment(more, EXPERIMENTS[2])
+    table, _ = sketch_archive(more, workers=1, folder=folder)
+    assert {p: os.stat(os.path.join(folder, p)).st_mtime_ns for p in parts} == stamps
+    with open(os.path.join(folder, "archive.json"), "r") as f:
+        assert len(json.load(f)) == 3
+
+    # Equal to the archive built again from every experiment
+    rebuilt, _ = sketch_archive(more, workers=1, folder=str(tmp_path / "rebuilt"))
+    pandas.testing.assert_frame_equal(table, rebuilt)
+
+    # Read back as it is when nothing changed
+    pandas.testing.assert_frame_equal(sketch_archive(more, workers=1, folder=folder)[0], table)
+
+def test_failed_experiments_are_recorded(tmp_path):
+    data, folder = str(tmp_path / "data"), str(tmp_path / "sketches")
+    copy_experiment(data, EXPERIMENTS[0])
+
+    # A capture that has just started: raw logs with their header only, and no origin yet
+    started = os.path.join(data, "sky", "desktop", "2mbits", "experiment-9")
+    os.makedirs(started)
+    for name in (RAW_TCP_COMPLETE, RAW_TCP_PERIODIC, BOT_COMPLETE):
+        with open(os.path.join(DATA, EXPERIMENTS[0], name), "r") as f:
+            header = f.readline()
+        with open(os.path.join(started, name), "w") as f:
+            f.write(header)
+
+    # The other experiments are still merged, the failure is kept with its experiment
+    table, errors = sketch_archive(data, workers=1, folder=folder)
+    assert list(errors) == ["sky/desktop/2mbits/experiment-9"]
+    assert errors["sky/desktop/2mbits/experiment-9"].startswith("IndexError")
+    assert set(table["qos"]) == {"1mbits"}
+    assert len([p for p in os.listdir(folder) if p.endswith(".error")]) == 1
+
+    # ... and read from disk next time, without running it again
+    assert sketch_archive(data, workers=1, folder=folder)[1] == errors